@@ -11,10 +11,42 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                             QSpinBox, QCheckBox, QLineEdit, QComboBox, QScrollArea, 
                             QMessageBox, QGroupBox, QRadioButton, QSplitter, QFrame,
                             QListWidgetItem, QMenu, QDialog, QSystemTrayIcon, QStyle,
-                            QToolButton, QSlider, QTabBar, QTextEdit, QColorDialog, QStyleOptionTab)
+                            QToolButton, QSlider, QTabBar, QTextEdit, QColorDialog, QStyleOptionTab,
+                            QProgressBar, QPlainTextEdit, QGridLayout, QTreeView)
 from PyQt6.QtGui import QPixmap, QIcon, QFont, QAction, QColor, QPalette, QMovie, QPainter
-from PyQt6.QtCore import Qt, QSize, QTimer, QPoint, QEvent
+from PyQt6.QtCore import (Qt, QSize, QTimer, QPoint, QEvent, QThread, pyqtSignal, QObject, QFileSystemWatcher,
+                          QAbstractItemModel, QModelIndex)
 import hashlib
+import zlib
+import io
+import struct
+import difflib
+import tempfile
+import collections
+import re
+import stat as stat_module
+import time
+import errno
+import threading
+import mmap
+import tarfile
+import gzip
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, reflinks are simply never attempted there
+    fcntl = None
+try:
+    # Optional: recursive change notifications that also see in-place edits
+    from watchdog.observers import Observer as WatchdogObserver
+except ImportError:
+    WatchdogObserver = None
+try:
+    # Optional: faster and stronger compression than zlib for stored files
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -950,10 +982,42 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                             QSpinBox, QCheckBox, QLineEdit, QComboBox, QScrollArea, 
                             QMessageBox, QGroupBox, QRadioButton, QSplitter, QFrame,
                             QListWidgetItem, QMenu, QDialog, QSystemTrayIcon, QStyle,
-                            QToolButton, QSlider, QTabBar, QTextEdit, QColorDialog, QStyleOptionTab)
+                            QToolButton, QSlider, QTabBar, QTextEdit, QColorDialog, QStyleOptionTab,
+                            QProgressBar, QPlainTextEdit, QGridLayout, QTreeView)
 from PyQt6.QtGui import QPixmap, QIcon, QFont, QAction, QColor, QPalette, QMovie, QPainter
-from PyQt6.QtCore import Qt, QSize, QTimer, QPoint, QEvent
+from PyQt6.QtCore import (Qt, QSize, QTimer, QPoint, QEvent, QThread, pyqtSignal, QObject, QFileSystemWatcher,
+                          QAbstractItemModel, QModelIndex)
 import hashlib
+import zlib
+import io
+import struct
+import difflib
+import tempfile
+import collections
+import re
+import stat as stat_module
+import time
+import errno
+import threading
+import mmap
+import tarfile
+import gzip
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, reflinks are simply never attempted there
+    fcntl = None
+try:
+    # Optional: recursive change notifications that also see in-place edits
+    from watchdog.observers import Observer as WatchdogObserver
+except ImportError:
+    WatchdogObserver = None
+try:
+    # Optional: faster and stronger compression than zlib for stored files
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -5261,10 +5325,42 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                             QSpinBox, QCheckBox, QLineEdit, QComboBox, QScrollArea, 
                             QMessageBox, QGroupBox, QRadioButton, QSplitter, QFrame,
                             QListWidgetItem, QMenu, QDialog, QSystemTrayIcon, QStyle,
-                            QToolButton, QSlider, QTabBar, QTextEdit, QColorDialog, QStyleOptionTab)
+                            QToolButton, QSlider, QTabBar, QTextEdit, QColorDialog, QStyleOptionTab,
+                            QProgressBar, QPlainTextEdit, QGridLayout, QTreeView)
 from PyQt6.QtGui import QPixmap, QIcon, QFont, QAction, QColor, QPalette, QMovie, QPainter
-from PyQt6.QtCore import Qt, QSize, QTimer, QPoint, QEvent
+from PyQt6.QtCore import (Qt, QSize, QTimer, QPoint, QEvent, QThread, pyqtSignal, QObject, QFileSystemWatcher,
+                          QAbstractItemModel, QModelIndex)
 import hashlib
+import zlib
+import io
+import struct
+import difflib
+import tempfile
+import collections
+import re
+import stat as stat_module
+import time
+import errno
+import threading
+import mmap
+import tarfile
+import gzip
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, reflinks are simply never attempted there
+    fcntl = None
+try:
+    # Optional: recursive change notifications that also see in-place edits
+    from watchdog.observers import Observer as WatchdogObserver
+except ImportError:
+    WatchdogObserver = None
+try:
+    # Optional: faster and stronger compression than zlib for stored files
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -6154,6 +6250,3859 @@ class ProjectTabWidget(QTabWidget):
             # Removing the + tab itself or we don't have add_tab_is_visible
             super().removeTab(index)
 
+# Hidden folder kept inside each destination for snapshot metadata and stored objects
+META_DIR_NAME = ".versiondiving"
+VERSION_MANIFEST_NAME = "version_manifest.json"
+ARCHIVE_INDEX_NAME = "archive_index.json"
+# Versions are written here first and renamed into the destination once complete
+STAGING_DIR_NAME = "staging"
+# Deleted versions are renamed here and removed in the background
+TRASH_DIR_NAME = "trash"
+
+# How auto-create decides when to create a version
+TRIGGER_INTERVAL = 0
+TRIGGER_ON_CHANGE = 1
+
+# Auto-delete policies, indexed like the project setting
+RETENTION_KEEP_RECENT = 0
+RETENTION_TIERED = 1
+RETENTION_POLICIES = ["Keep the most recent versions", "Tiered (hourly, daily, weekly)"]
+
+# Compression of stored files, indexed like the project setting
+COMPRESSION_CODECS = [None, "zlib", "zstd"]
+COMPRESSION_LABELS = ["None", "zlib", "zstd"]
+DEFAULT_COMPRESSION_LEVEL = 3
+
+# Storage modes offered in the project settings (index is saved with the project)
+STORAGE_MODE_FULL_COPY = 0
+STORAGE_MODE_STORE = 1
+STORAGE_MODE_HARDLINK = 2
+STORAGE_MODE_ARCHIVE = 3
+STORAGE_MODES = [
+    "Full Copy (plain folders)",
+    "Deduplicated Store (content-addressed)",
+    "Hardlink Unchanged Files (plain folders)",
+    "Single Archive (one tar file per version)"
+]
+
+# Archive file name of an archive version for each compression codec
+ARCHIVE_FILE_NAMES = {None: "archive.tar", "zlib": "archive.tar.gz", "zstd": "archive.tar.zst"}
+
+# ioctl request number for cloning a whole file (Linux FICLONE, used by btrfs/XFS reflinks)
+FICLONE = 0x40049409
+
+class CopyBackend:
+    """Copies files with the fastest method the destination filesystem supports.
+
+    Tries reflinks (FICLONE) first, then os.copy_file_range, then os.sendfile,
+    and finally falls back to shutil. The working method is probed once per
+    destination and cached for the lifetime of the app.
+    """
+    METHOD_REFLINK = "reflink"
+    METHOD_COPY_FILE_RANGE = "copy_file_range"
+    METHOD_SENDFILE = "sendfile"
+    METHOD_SHUTIL = "shutil"
+
+    # Errors meaning "this method can't copy these two files", as opposed to a real I/O failure
+    FALLBACK_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS, errno.ENOTTY,
+                       errno.EBADF, errno.ETXTBSY, errno.EPERM}
+
+    _probe_cache = {}
+    _probe_lock = threading.Lock()
+
+    def __init__(self, probe_dir):
+        self.method = self.probe(probe_dir)
+        # Source devices where reflinks failed (usually another filesystem), so we don't retry them per file
+        self._no_reflink_devices = set()
+
+    @classmethod
+    def available_methods(cls):
+        methods = []
+        if fcntl is not None and sys.platform.startswith('linux'):
+            methods.append(cls.METHOD_REFLINK)
+        if hasattr(os, 'copy_file_range'):
+            methods.append(cls.METHOD_COPY_FILE_RANGE)
+        if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            methods.append(cls.METHOD_SENDFILE)
+        return methods
+
+    @classmethod
+    def probe(cls, probe_dir):
+        """Find the fastest copy method that works inside probe_dir"""
+        probe_dir = os.path.abspath(probe_dir)
+        # Copy threads may all ask at once, only one of them should probe
+        with cls._probe_lock:
+            if probe_dir not in cls._probe_cache:
+                cls._probe_cache[probe_dir] = cls._probe_methods(probe_dir)
+            return cls._probe_cache[probe_dir]
+
+    @classmethod
+    def _probe_methods(cls, probe_dir):
+        method = cls.METHOD_SHUTIL
+        token = uuid.uuid4().hex
+        source = os.path.join(probe_dir, f".vd-probe-{token}.src")
+        target = os.path.join(probe_dir, f".vd-probe-{token}.dst")
+        data = os.urandom(64 * 1024)
+        try:
+            os.makedirs(probe_dir, exist_ok=True)
+            with open(source, 'wb') as f:
+                f.write(data)
+            for candidate in cls.available_methods():
+                try:
+                    cls._copy_with(candidate, source, target)
+                    with open(target, 'rb') as f:
+                        if f.read() == data:
+                            method = candidate
+                            break
+                except OSError:
+                    pass
+        except OSError as e:
+            print(f"Could not probe copy methods in {probe_dir}: {str(e)}")
+        finally:
+            for path in (source, target):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        print(f"Using {method} copies for {probe_dir}")
+        return method
+
+    @classmethod
+    def _copy_with(cls, method, source_path, target_path):
+        """Copy file contents using a single method, raising OSError if it isn't supported"""
+        with open(source_path, 'rb') as fsrc, open(target_path, 'wb') as fdst:
+            if method == cls.METHOD_REFLINK:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            while offset < size:
+                if method == cls.METHOD_COPY_FILE_RANGE:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                else:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                if sent == 0:
+                    # The file shrank while copying
+                    break
+                offset += sent
+
+    def copy_file(self, source_path, target_path):
+        """Copy file contents, falling back to slower methods for files the fast ones can't handle"""
+        methods = self.available_methods()
+        if self.method in methods:
+            methods = methods[methods.index(self.method):]
+        else:
+            methods = []
+
+        if self.METHOD_REFLINK in methods and self._no_reflink_devices:
+            if os.stat(source_path).st_dev in self._no_reflink_devices:
+                methods.remove(self.METHOD_REFLINK)
+
+        for method in methods:
+            try:
+                self._copy_with(method, source_path, target_path)
+                return target_path
+            except OSError as e:
+                if e.errno not in self.FALLBACK_ERRNOS:
+                    raise
+                if method == self.METHOD_REFLINK:
+                    self._no_reflink_devices.add(os.stat(source_path).st_dev)
+        shutil.copyfile(source_path, target_path)
+        return target_path
+
+    def copy2(self, source_path, target_path):
+        """Drop-in replacement for shutil.copy2 (also usable as a copytree copy_function).
+
+        The copy is written under a temporary name and renamed over the
+        target, so an existing target, possibly a hardlink shared with older
+        versions, is replaced and never written into.
+        """
+        if os.path.isdir(target_path):
+            target_path = os.path.join(target_path, os.path.basename(source_path))
+        self._copy_replacing(source_path, target_path, self.copy_file)
+        return target_path
+
+    def copy2_checksum(self, source_path, target_path):
+        """Like copy2, but return the checksum of the contents, or None for a reflinked copy.
+
+        Fast copies never pass the data through the page cache, so hashing
+        the copy afterwards would read every file a second time. Files are
+        hashed on their way through instead, and reflinks, which read
+        nothing at all, are not hashed.
+        """
+        return self._copy_replacing(source_path, target_path, self.copy_file_checksum)
+
+    def _copy_replacing(self, source_path, target_path, copy):
+        temp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            result = copy(source_path, temp_path)
+            shutil.copystat(source_path, temp_path)
+            os.replace(temp_path, target_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return result
+
+    def copy_file_checksum(self, source_path, target_path):
+        """Reflink the file contents if possible, otherwise copy them through a hash and return it"""
+        if self.method == self.METHOD_REFLINK and os.stat(source_path).st_dev not in self._no_reflink_devices:
+            try:
+                self._copy_with(self.METHOD_REFLINK, source_path, target_path)
+                return None
+            except OSError as e:
+                if e.errno not in self.FALLBACK_ERRNOS:
+                    raise
+                self._no_reflink_devices.add(os.stat(source_path).st_dev)
+        hasher = hashlib.blake2b(digest_size=32)
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+            for block in iter(lambda: source.read(ContentStore.HASH_BLOCK_SIZE), b''):
+                hasher.update(block)
+                target.write(block)
+        return hasher.hexdigest()
+
+class IgnoreRules:
+    """Exclude patterns with .gitignore semantics, compiled once for fast matching.
+
+    Paths are matched relative to the origin folder with '/' separators. As in
+    git, the last matching pattern wins, '!' re-includes, a trailing '/' only
+    matches folders and a pattern without an inner '/' matches at any depth.
+    """
+    COMMON_PATTERNS = [".git/", "node_modules/", "__pycache__/", "*.pyc", "venv/", ".venv/", "build/", "dist/"]
+
+    def __init__(self, patterns):
+        self.patterns = []
+        rules = []
+        for line in patterns:
+            parsed = self._parse(line)
+            if parsed:
+                self.patterns.append(line.strip())
+                rules.append(parsed)
+        self.rules = rules
+        self.key = hashlib.blake2b("\n".join(self.patterns).encode('utf-8'), digest_size=8).hexdigest()
+
+        # Without negations any match means ignored, so everything fits into one regex per kind
+        self.has_negations = any(negated for _, negated, _ in rules)
+        if not self.has_negations:
+            self.dir_regex = self._combine([regex for regex, _, _ in rules])
+            self.file_regex = self._combine([regex for regex, _, dir_only in rules if not dir_only])
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @staticmethod
+    def _combine(regexes):
+        if not regexes:
+            return None
+        return re.compile("|".join(f"(?:{regex.pattern})" for regex in regexes))
+
+    @classmethod
+    def _parse(cls, line):
+        """Turn one .gitignore line into (regex, negated, dir_only), or None for blanks and comments"""
+        line = line.rstrip("\n\r")
+        # Trailing spaces are ignored unless escaped
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+        if not line or line.startswith("#"):
+            return None
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # A slash anywhere but the end anchors the pattern to the origin folder
+        anchored = "/" in line
+        line = line.lstrip("/")
+
+        regex = cls._translate(line)
+        regex = ("^" if anchored else "^(?:.*/)?") + regex + "$"
+        return re.compile(regex), negated, dir_only
+
+    @staticmethod
+    def _translate(pattern):
+        """Translate the glob part of a pattern into a regex"""
+        parts = []
+        i = 0
+        n = len(pattern)
+        while i < n:
+            at_segment_start = i == 0 or pattern[i - 1] == "/"
+            if pattern.startswith("**/", i) and at_segment_start:
+                parts.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("**", i) and at_segment_start and i + 2 == n:
+                parts.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                parts.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                parts.append("[^/]")
+                i += 1
+            elif pattern[i] == "[":
+                end = pattern.find("]", i + 2)
+                if end == -1:
+                    parts.append(re.escape("["))
+                    i += 1
+                    continue
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end + 1
+            elif pattern[i] == "\\" and i + 1 < n:
+                parts.append(re.escape(pattern[i + 1]))
+                i += 2
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        return "".join(parts)
+
+    def ignores(self, rel_path, is_dir):
+        """Check a single path, assuming its parent folders are not ignored"""
+        if not self.has_negations:
+            regex = self.dir_regex if is_dir else self.file_regex
+            return regex is not None and regex.match(rel_path) is not None
+        for regex, negated, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                return not negated
+        return False
+
+    def ignores_path(self, rel_path, is_dir):
+        """Check a path and each of its parent folders"""
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.ignores("/".join(parts[:depth]), True):
+                return True
+        return self.ignores(rel_path, is_dir)
+
+    @classmethod
+    def for_origins(cls, origin_paths, patterns, use_gitignore=False):
+        """Build the rules of every origin folder, returns {origin_path: IgnoreRules} without empty ones"""
+        rules = {}
+        for origin_path in origin_paths:
+            origin_patterns = []
+            if use_gitignore:
+                # Only the origin's top-level .gitignore is read, nested ones are not
+                try:
+                    with open(os.path.join(origin_path, ".gitignore"), 'r', encoding='utf-8', errors='replace') as f:
+                        origin_patterns.extend(f.read().splitlines())
+                except OSError:
+                    pass
+            # Project patterns come last so they can override the .gitignore
+            origin_patterns.extend(patterns)
+            origin_rules = cls(origin_patterns)
+            if origin_rules:
+                rules[origin_path] = origin_rules
+        return rules
+
+    @staticmethod
+    def rules_key(ignore_rules):
+        """Identify a set of origin rules, so snapshots taken with other rules are not reused"""
+        return {origin_path: rules.key for origin_path, rules in sorted(ignore_rules.items())}
+
+def scan_origins(origin_paths, ignore_rules=None):
+    """Walk the origin paths once with os.scandir and return (dirs, files) for a snapshot.
+
+    dirs is a list of (source_dir, relative_path) with parents before their
+    children, files a list of (source_path, relative_path, stat_result).
+    ignore_rules maps origin folders to their IgnoreRules.
+    """
+    dirs = []
+    files = []
+    for source_path in origin_paths:
+        if not os.path.isdir(source_path):
+            files.append((source_path, os.path.basename(source_path), os.stat(source_path)))
+            continue
+        ignore = ignore_rules.get(source_path) if ignore_rules else None
+        scan_tree(source_path, os.path.basename(source_path), dirs, files, ignore)
+    return dirs, files
+
+def origin_relative(rel_path):
+    """Strip the origin folder name from a snapshot path and use '/' like .gitignore does"""
+    return rel_path.partition(os.sep)[2].replace(os.sep, "/")
+
+def scan_tree(source_dir, rel_dir, dirs, files, ignore=None):
+    """Append every folder and file below source_dir (inclusive) to dirs and files.
+
+    Folders matched by ignore are pruned without being entered.
+    """
+    # Symlinked folders are followed like copytree does, but each real folder is only visited once
+    visited = set()
+    stack = [(source_dir, rel_dir)]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        dir_stat = os.stat(dir_path)
+        if (dir_stat.st_dev, dir_stat.st_ino) in visited:
+            continue
+        visited.add((dir_stat.st_dev, dir_stat.st_ino))
+        dirs.append((dir_path, rel_dir))
+
+        subdirs = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                is_dir = entry.is_dir()
+                if ignore and ignore.ignores(origin_relative(rel_path), is_dir):
+                    continue
+                if is_dir:
+                    subdirs.append((entry.path, rel_path))
+                else:
+                    files.append((entry.path, rel_path, entry.stat()))
+        # Reversed so folders are visited in listing order
+        stack.extend(reversed(subdirs))
+
+# Stands in for os.stat_result for files the change journal says are untouched
+ManifestStat = collections.namedtuple('ManifestStat', ['st_size', 'st_mtime_ns', 'st_ino', 'st_mode'])
+
+def scan_changes(origin_paths, manifest, changed_paths, ignore_rules=None):
+    """Rebuild (dirs, files) like scan_origins from the last snapshot's manifest plus changed paths.
+
+    Only the changed paths are visited: a changed file is stat'ed again, a
+    changed folder has its entries compared, new folders are scanned fully
+    and vanished paths are dropped with everything below them.
+    """
+    origins = {os.path.basename(path): path for path in origin_paths}
+
+    def source_for(rel_path):
+        top, _, rest = rel_path.partition(os.sep)
+        return os.path.join(origins[top], rest) if rest else origins[top]
+
+    def rel_for(path):
+        for top, origin in origins.items():
+            if path == origin:
+                return top
+            if path.startswith(origin + os.sep):
+                return os.path.join(top, os.path.relpath(path, origin))
+        return None
+
+    dir_set = set(manifest.dirs)
+    file_stats = {}
+    for rel_path, entry in manifest.entries.items():
+        file_stats[rel_path] = ManifestStat(entry['size'], entry['mtime_ns'], entry['ino'], entry.get('mode', 0o100644))
+
+    def forget(rel_path):
+        """Drop rel_path and, for folders, everything below it"""
+        file_stats.pop(rel_path, None)
+        if rel_path in dir_set:
+            prefix = rel_path + os.sep
+            for rel_dir in [d for d in dir_set if d == rel_path or d.startswith(prefix)]:
+                dir_set.discard(rel_dir)
+            for rel_file in [f for f in file_stats if f.startswith(prefix)]:
+                del file_stats[rel_file]
+
+    def ignored(rel_path, is_dir):
+        ignore = ignore_rules.get(origins[rel_path.partition(os.sep)[0]]) if ignore_rules else None
+        return bool(ignore) and ignore.ignores_path(origin_relative(rel_path), is_dir)
+
+    def add_tree(source_dir, rel_dir):
+        new_dirs, new_files = [], []
+        ignore = ignore_rules.get(origins[rel_dir.partition(os.sep)[0]]) if ignore_rules else None
+        scan_tree(source_dir, rel_dir, new_dirs, new_files, ignore)
+        dir_set.update(rel for _, rel in new_dirs)
+        for _, rel_path, stat in new_files:
+            file_stats[rel_path] = stat
+
+    # Entries seen in each changed folder, used afterwards to drop whatever was removed from them
+    listed = {}
+
+    # Parents first, so a rescanned folder already covers the changes below it
+    for rel_path in sorted({rel for rel in map(rel_for, changed_paths) if rel is not None}):
+        if ignored(rel_path, os.path.isdir(source_for(rel_path))):
+            forget(rel_path)
+            continue
+        parent = os.path.dirname(rel_path)
+        if parent and parent not in dir_set:
+            # Inside a folder the last snapshot didn't have: scan it whole if it exists now
+            while os.path.dirname(parent) and os.path.dirname(parent) not in dir_set:
+                parent = os.path.dirname(parent)
+            if os.path.dirname(parent) and os.path.isdir(source_for(parent)):
+                forget(parent)
+                add_tree(source_for(parent), parent)
+            continue
+        source_path = source_for(rel_path)
+        try:
+            stat = os.stat(source_path)
+        except FileNotFoundError:
+            forget(rel_path)
+            continue
+
+        if not stat_module.S_ISDIR(stat.st_mode):
+            forget(rel_path)
+            file_stats[rel_path] = stat
+        elif rel_path not in dir_set:
+            forget(rel_path)
+            add_tree(source_path, rel_path)
+        else:
+            # Compare the folder's entries, files inside it may have been added or removed
+            seen = listed.setdefault(rel_path, set())
+            with os.scandir(source_path) as entries:
+                for entry in entries:
+                    child = os.path.join(rel_path, entry.name)
+                    if ignored(child, entry.is_dir()):
+                        continue
+                    seen.add(child)
+                    if entry.is_dir():
+                        if child not in dir_set:
+                            forget(child)
+                            add_tree(entry.path, child)
+                    else:
+                        forget(child)
+                        file_stats[child] = entry.stat()
+
+    if listed:
+        for rel_path in [p for p in list(dir_set) + list(file_stats)
+                         if os.path.dirname(p) in listed and p not in listed[os.path.dirname(p)]]:
+            forget(rel_path)
+
+    # Sorting puts parents before their children, which snapshot modes rely on
+    dirs = [(source_for(rel_dir), rel_dir) for rel_dir in sorted(dir_set)]
+    files = [(source_for(rel_path), rel_path, stat) for rel_path, stat in sorted(file_stats.items())]
+    return dirs, files
+
+def tree_fingerprint(origin_paths, dirs, files, hash_contents=False):
+    """Cheap fingerprint of a scanned origin tree built from paths, sizes and mtimes.
+
+    With hash_contents the file contents are hashed too, which catches edits
+    that keep size and mtime but costs a full read of the tree.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for source_path in origin_paths:
+        hasher.update(f"origin\0{source_path}\n".encode('utf-8', 'surrogateescape'))
+    for _, rel_dir in sorted(dirs, key=lambda d: d[1]):
+        hasher.update(f"dir\0{rel_dir}\n".encode('utf-8', 'surrogateescape'))
+    for source_path, rel_path, stat in sorted(files, key=lambda f: f[1]):
+        hasher.update(f"file\0{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+        if hash_contents:
+            hasher.update(ContentStore.hash_file(source_path).encode('ascii'))
+    return hasher.hexdigest()
+
+def is_store_version(version_path):
+    """Check whether a version folder holds a manifest instead of plain files"""
+    return os.path.isfile(os.path.join(version_path, VERSION_MANIFEST_NAME))
+
+def load_version_manifest(version_path):
+    """Load the manifest of a store version"""
+    with open(os.path.join(version_path, VERSION_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def is_archive_version(version_path):
+    """Check whether a version folder holds a single archive with a sidecar index"""
+    return os.path.isfile(os.path.join(version_path, ARCHIVE_INDEX_NAME))
+
+def load_archive_index(version_path):
+    """Load the sidecar index of an archive version, listing members without opening the archive"""
+    with open(os.path.join(version_path, ARCHIVE_INDEX_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def open_archive_stream(archive_path, codec):
+    """Open an archive version's tar stream for reading, decompressing on the fly"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Restoring this version needs the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(archive_path, 'rb'), closefd=True)
+    if codec == "zlib":
+        return gzip.open(archive_path, 'rb')
+    return open(archive_path, 'rb')
+
+class ContentChunker:
+    """Splits large files into content-defined chunks, so an edit only changes the chunks around it.
+
+    Cut points depend on the bytes around them rather than on file offsets,
+    so inserting or deleting data shifts the following cuts along with it.
+    A gear hash is rolled over every byte, a block at a time with big-int
+    shifts so it runs at C speed in pure Python. Positions where it is zero
+    are candidates, and a CRC of the bytes before them decides the cut.
+    Like FastCDC, cuts are harder to hit before the average size and easier
+    after it, which keeps chunk sizes close to the average.
+    """
+    MIN_SIZE = 512 * 1024
+    AVG_SIZE = 2 * 1024 * 1024
+    MAX_SIZE = 8 * 1024 * 1024
+    READ_SIZE = 4 * 1024 * 1024
+    # A random byte for every byte value, the gear hash XORs them shifted by one more bit per byte back
+    GEAR = hashlib.shake_256(b"VersionDiving chunk gear").digest(256)
+    GEAR_HISTORY = 8
+    SCAN_SIZE = 256 * 1024
+    WINDOW = 48
+    # Candidates show up every 256 bytes, one in 2**13 of them cuts before AVG_SIZE and one in 2**11 after
+    MASK_STRICT = (1 << 13) - 1
+    MASK_LOOSE = (1 << 11) - 1
+
+    @classmethod
+    def gear_hashes(cls, data, start, stop):
+        """Return a byte per position of data[start:stop], the gear hash of the bytes up to it"""
+        first = start - cls.GEAR_HISTORY
+        values = int.from_bytes(data[first:stop].translate(cls.GEAR), 'little')
+        # Each byte lands on the bytes after it shifted by 1 bit more per position: lags 0 to 7 in three steps
+        hashes = values ^ (values << 9)
+        hashes ^= hashes << 18
+        hashes ^= hashes << 36
+        return hashes.to_bytes(stop - first + 8, 'little')[cls.GEAR_HISTORY:stop - first]
+
+    @classmethod
+    def find_cut(cls, data, length):
+        """Return the length of the first chunk in data[:length]"""
+        if length <= cls.MIN_SIZE:
+            return length
+        end = min(length, cls.MAX_SIZE)
+        normal = min(cls.AVG_SIZE, end)
+        # Hash a block at a time, most cuts come long before MAX_SIZE
+        for start in range(cls.MIN_SIZE, end, cls.SCAN_SIZE):
+            hashes = cls.gear_hashes(data, start, min(start + cls.SCAN_SIZE, end))
+            offset = hashes.find(b"\x00")
+            while offset != -1:
+                pos = start + offset
+                mask = cls.MASK_STRICT if pos < normal else cls.MASK_LOOSE
+                if zlib.crc32(data[pos - cls.WINDOW:pos + 1]) & mask == 0:
+                    return pos + 1
+                offset = hashes.find(b"\x00", offset + 1)
+        return end
+
+    @classmethod
+    def iter_chunks(cls, f):
+        """Yield the chunks of an open binary file without reading more than MAX_SIZE ahead"""
+        buffer = b""
+        eof = False
+        while True:
+            while not eof and len(buffer) < cls.MAX_SIZE:
+                block = f.read(cls.READ_SIZE)
+                if not block:
+                    eof = True
+                else:
+                    buffer += block
+            if not buffer:
+                return
+            # The buffer holds at least MAX_SIZE bytes unless the file ended, so no cut is missed
+            cut = cls.find_cut(buffer, len(buffer))
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+
+class DeltaCodec:
+    """Binary deltas that rebuild one file's contents from another's.
+
+    A delta is a list of operations: copy a byte range of the base or insert
+    literal bytes. Ranges are found by matching lines with difflib, which
+    suits the text and source files consecutive versions mostly differ in.
+    """
+    COPY = b"C"
+    INSERT = b"I"
+
+    @staticmethod
+    def _line_offsets(lines):
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line))
+        return offsets
+
+    @classmethod
+    def encode(cls, base, target):
+        """Return the operations that turn base into target"""
+        base_lines = base.splitlines(keepends=True)
+        target_lines = target.splitlines(keepends=True)
+        base_offsets = cls._line_offsets(base_lines)
+        target_offsets = cls._line_offsets(target_lines)
+
+        ops = []
+        matcher = difflib.SequenceMatcher(None, base_lines, target_lines)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                ops.append(struct.pack(">cQQ", cls.COPY, base_offsets[i1], base_offsets[i2] - base_offsets[i1]))
+            elif j2 > j1:
+                data = target[target_offsets[j1]:target_offsets[j2]]
+                ops.append(struct.pack(">cQ", cls.INSERT, len(data)))
+                ops.append(data)
+        return b"".join(ops)
+
+    @classmethod
+    def apply(cls, base, delta):
+        """Rebuild the target from base and the operations returned by encode"""
+        parts = []
+        pos = 0
+        while pos < len(delta):
+            op = delta[pos:pos + 1]
+            if op == cls.COPY:
+                offset, length = struct.unpack_from(">QQ", delta, pos + 1)
+                parts.append(base[offset:offset + length])
+                pos += 17
+            elif op == cls.INSERT:
+                (length,) = struct.unpack_from(">Q", delta, pos + 1)
+                pos += 9
+                parts.append(delta[pos:pos + length])
+                pos += length
+            else:
+                raise ValueError("Corrupt delta object")
+        return b"".join(parts)
+
+class PackFiles:
+    """Append-only pack files holding many small objects, in the style of git packfiles.
+
+    A snapshot appends its new small objects to one pack and writes the pack's
+    index (digest -> offset, length, codec) once all of them are on disk, so
+    thousands of tiny files become one sequential write. Packs without an
+    index are leftovers of an interrupted snapshot and are removed by GC.
+    """
+    MAX_PACK_SIZE = 256 * 1024 * 1024
+    PACK_SUFFIX = ".pack"
+    INDEX_SUFFIX = ".idx"
+
+    def __init__(self, root):
+        self.packs_dir = os.path.join(root, "packs")
+        self.index = None  # digest -> (pack name, offset, length, codec), loaded on first use
+        self.lock = threading.Lock()
+        self.writer = None
+        self.writer_name = None
+        self.writer_entries = {}
+        self.bytes_added = 0  # bytes appended to packs by this instance
+
+    def exists(self):
+        return os.path.isdir(self.packs_dir)
+
+    def pack_path(self, name):
+        return os.path.join(self.packs_dir, name + self.PACK_SUFFIX)
+
+    def _load(self):
+        if self.index is not None:
+            return
+        self.index = {}
+        if not self.exists():
+            return
+        for file_name in sorted(os.listdir(self.packs_dir)):
+            if not file_name.endswith(self.INDEX_SUFFIX):
+                continue
+            name = file_name[:-len(self.INDEX_SUFFIX)]
+            try:
+                with open(os.path.join(self.packs_dir, file_name), 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable pack index {file_name}: {str(e)}")
+                continue
+            for digest, (offset, length, codec) in entries.items():
+                self.index[digest] = (name, offset, length, codec)
+
+    def lookup(self, digest):
+        """Return (pack name, offset, length, codec) for a packed object, or None"""
+        with self.lock:
+            self._load()
+            return self.index.get(digest)
+
+    def add(self, digest, data, codec):
+        """Append stored bytes to the current pack, returns False if the object is already packed"""
+        with self.lock:
+            self._load()
+            if digest in self.index:
+                return False
+            if self.writer is not None and self.writer.tell() >= self.MAX_PACK_SIZE:
+                self._finish_locked()
+            if self.writer is None:
+                os.makedirs(self.packs_dir, exist_ok=True)
+                self.writer_name = f"pack-{uuid.uuid4().hex}"
+                self.writer = open(self.pack_path(self.writer_name), 'wb')
+                self.writer_entries = {}
+            offset = self.writer.tell()
+            self.writer.write(data)
+            self.bytes_added += len(data)
+            self.writer_entries[digest] = [offset, len(data), codec]
+            self.index[digest] = (self.writer_name, offset, len(data), codec)
+            return True
+
+    def read(self, digest):
+        """Return (stored bytes, codec) of a packed object, or None if it isn't packed"""
+        with self.lock:
+            self._load()
+            entry = self.index.get(digest)
+            if entry is None:
+                return None
+            name, offset, length, codec = entry
+            if name == self.writer_name and self.writer is not None:
+                self.writer.flush()
+        with open(self.pack_path(name), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        if len(data) != length:
+            raise ValueError(f"Pack {name} is truncated")
+        return data, codec
+
+    def finish(self):
+        """Make the objects appended so far permanent by writing the pack's index"""
+        with self.lock:
+            self._finish_locked()
+
+    def _finish_locked(self):
+        if self.writer is None:
+            return
+        self.writer.flush()
+        os.fsync(self.writer.fileno())
+        self.writer.close()
+        index_path = os.path.join(self.packs_dir, self.writer_name + self.INDEX_SUFFIX)
+        with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.writer_entries, f)
+        os.replace(index_path + ".tmp", index_path)
+        self.writer = None
+        self.writer_name = None
+        self.writer_entries = {}
+
+    def abort(self):
+        """Drop the pack being written, its objects were never indexed"""
+        with self.lock:
+            if self.writer is None:
+                return
+            self.writer.close()
+            for digest in self.writer_entries:
+                self.index.pop(digest, None)
+            try:
+                os.remove(self.pack_path(self.writer_name))
+            except OSError:
+                pass
+            self.writer = None
+            self.writer_name = None
+            self.writer_entries = {}
+
+    def collect_garbage(self, referenced):
+        """Delete packs nobody references and rewrite mostly-dead ones, returns the number of objects removed"""
+        if not self.exists():
+            return 0
+        self.finish()
+        removed = 0
+        file_names = os.listdir(self.packs_dir)
+        for file_name in file_names:
+            name, suffix = os.path.splitext(file_name)
+            if suffix == self.PACK_SUFFIX and name + self.INDEX_SUFFIX not in file_names:
+                # Written by a snapshot that never finished
+                os.remove(os.path.join(self.packs_dir, file_name))
+
+        for file_name in file_names:
+            path = os.path.join(self.packs_dir, file_name)
+            name, suffix = os.path.splitext(file_name)
+            if suffix != self.INDEX_SUFFIX:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading pack index {file_name}: {str(e)}")
+                continue
+
+            live = {digest: entry for digest, entry in entries.items() if digest in referenced}
+            live_bytes = sum(length for _, length, _ in live.values())
+            total_bytes = sum(length for _, length, _ in entries.values())
+            if live and live_bytes * 2 >= total_bytes:
+                continue
+            # Copy what is still used into a fresh pack, then drop the old one
+            if live:
+                with open(self.pack_path(name), 'rb') as old_pack:
+                    for digest, (offset, length, codec) in live.items():
+                        old_pack.seek(offset)
+                        data = old_pack.read(length)
+                        with self.lock:
+                            # Let the copy land in the new pack even though the digest is indexed
+                            self._load()
+                            self.index.pop(digest, None)
+                        self.add(digest, data, codec)
+                self.finish()
+            os.remove(path)
+            os.remove(self.pack_path(name))
+            removed += len(entries) - len(live)
+        # Positions changed, reload the index on next use
+        with self.lock:
+            self.index = None
+        return removed
+
+class ContentStore:
+    """Content-addressed object store inside a destination folder.
+
+    Every distinct file content is written once under .versiondiving/objects,
+    keyed by its hash. Versions only keep a small manifest pointing at objects.
+    """
+    HASH_BLOCK_SIZE = 1024 * 1024
+    # Files at least this big are stored as chunks when chunking is enabled
+    CHUNK_THRESHOLD = 32 * 1024 * 1024
+    # Compressed objects carry their codec as a suffix, so stores can mix codecs and raw objects
+    COMPRESSION_SUFFIXES = {"zstd": ".zst", "zlib": ".z"}
+    COMPRESSION_SAMPLE_SIZE = 64 * 1024
+    MIN_COMPRESS_SIZE = 1024
+    # Formats that are already compressed are stored as they are
+    INCOMPRESSIBLE_EXTENSIONS = {
+        ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".jar", ".apk",
+        ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+        ".mp3", ".aac", ".ogg", ".flac", ".m4a", ".opus",
+        ".mp4", ".mkv", ".mov", ".avi", ".webm",
+        ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".epub", ".woff", ".woff2"
+    }
+
+    # Older contents of a file can be kept as a delta against the contents that replaced it
+    DELTA_SUFFIX = ".d"
+    DELTA_MAGIC = b"VDD1"
+    DELTA_MAX_SIZE = 4 * 1024 * 1024
+    # difflib's matching can grow with the square of the line count, so long files are left full
+    DELTA_MAX_LINES = 20000
+    # Files smaller than this go into pack files when packing is enabled
+    PACK_THRESHOLD = 64 * 1024
+
+    def __init__(self, destination_path, copier=None, compression=None, compression_level=DEFAULT_COMPRESSION_LEVEL,
+                 pack_small_files=False):
+        self.destination_path = destination_path
+        self.root = os.path.join(destination_path, META_DIR_NAME)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.packs = PackFiles(self.root)
+        self.pack_small_files = pack_small_files
+        # New object files not yet flushed to disk, the snapshot syncs them in one batch
+        self.unsynced_paths = []
+        self._copier = copier
+        if compression == "zstd" and zstandard is None:
+            print("zstandard is not installed, compressing with zlib instead")
+            compression = "zlib"
+        self.compression = compression
+        # zlib only goes up to 9, zstd up to 22
+        self.compression_level = min(compression_level, 9) if compression == "zlib" else compression_level
+
+    @property
+    def copier(self):
+        # Probing writes into the metadata folder, so only do it once something is actually copied
+        if self._copier is None:
+            self._copier = CopyBackend(self.root)
+        return self._copier
+
+    def exists(self):
+        return os.path.isdir(self.objects_dir) or self.packs.exists()
+
+    def disk_usage(self):
+        """Bytes of the loose objects and packs, shared by all store versions"""
+        return sum(measure_version_size(folder) for folder in (self.objects_dir, self.packs.packs_dir)
+                   if os.path.isdir(folder))
+
+    def has_object(self, digest):
+        return self.packs.lookup(digest) is not None or self.find_object(digest)[0] is not None
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def find_object(self, digest):
+        """Return (path, codec) of a stored object, or (None, None) if it isn't stored"""
+        base_path = self.object_path(digest)
+        if os.path.exists(base_path):
+            return base_path, None
+        for codec, suffix in self.COMPRESSION_SUFFIXES.items():
+            if os.path.exists(base_path + suffix):
+                return base_path + suffix, codec
+        if os.path.exists(base_path + self.DELTA_SUFFIX):
+            return base_path + self.DELTA_SUFFIX, "delta"
+        return None, None
+
+    def delta_base(self, path):
+        """Return the digest a delta object is based on"""
+        with open(path, 'rb') as f:
+            header = f.read(len(self.DELTA_MAGIC) + 64)
+        if not header.startswith(self.DELTA_MAGIC):
+            raise ValueError(f"Corrupt delta object {path}")
+        return header[len(self.DELTA_MAGIC):].decode('ascii')
+
+    def read_object_bytes(self, digest):
+        """Return an object's original contents, following delta chains back to a full object"""
+        deltas = []
+        while True:
+            packed = self.packs.read(digest)
+            if packed is not None:
+                data = self._decompress_bytes(*packed)
+                break
+            path, codec = self.find_object(digest)
+            if path is None:
+                raise FileNotFoundError(f"Stored object {digest} is missing")
+            if codec != "delta":
+                buffer = io.BytesIO()
+                self._read_object_into(path, codec, buffer)
+                data = buffer.getvalue()
+                break
+            with open(path, 'rb') as f:
+                f.seek(len(self.DELTA_MAGIC) + 64)
+                deltas.append(zlib.decompress(f.read()))
+            digest = self.delta_base(path)
+
+        # The newest contents come first, so apply the deltas from the end of the chain backwards
+        for delta in reversed(deltas):
+            data = DeltaCodec.apply(data, delta)
+        return data
+
+    def store_as_delta(self, digest, base_digest):
+        """Replace a full object by a delta against base_digest if that saves enough space.
+
+        The base must be a full object, which keeps delta chains free of cycles.
+        Returns True when the object was replaced.
+        """
+        path, codec = self.find_object(digest)
+        if path is None or codec == "delta" or self.packs.lookup(digest) is not None:
+            # Packed objects stay as they are, their pack is only rewritten by GC
+            return False
+        if self.packs.lookup(base_digest) is None:
+            base_path, base_codec = self.find_object(base_digest)
+            if base_path is None or base_codec == "delta":
+                return False
+        data = self.read_object_bytes(digest)
+        base = self.read_object_bytes(base_digest)
+        if len(data) > self.DELTA_MAX_SIZE or len(base) > self.DELTA_MAX_SIZE:
+            return False
+        if data.count(b"\n") > self.DELTA_MAX_LINES or base.count(b"\n") > self.DELTA_MAX_LINES:
+            return False
+
+        delta = zlib.compress(DeltaCodec.encode(base, data), 9)
+        if len(delta) > os.path.getsize(path) // 2:
+            return False
+        self._write_object_file(self.object_path(digest) + self.DELTA_SUFFIX,
+                                self.DELTA_MAGIC + base_digest.encode('ascii') + delta, durable=True)
+        # The delta is on disk before the full object goes, so the contents are never lost
+        os.remove(path)
+        return True
+
+    def make_full(self, digest):
+        """Turn a delta object back into a full one, used when a version needs it again"""
+        path, codec = self.find_object(digest)
+        if codec != "delta":
+            return
+        data = self.read_object_bytes(digest)
+        self._write_object(digest, data, "", durable=True)
+        os.remove(path)
+
+    def store_replaced_as_deltas(self, full_digests, replaced):
+        """Make full_digests full again and store replaced (rel_path, old digest, new digest)
+        contents as deltas against their successors, returns how many became deltas"""
+        for digest in full_digests:
+            self.make_full(digest)
+        deltas = 0
+        for rel_path, digest, base_digest in replaced:
+            try:
+                if self.store_as_delta(digest, base_digest):
+                    deltas += 1
+            except Exception as e:
+                # A missed delta only costs space, the full object is still there
+                print(f"Could not store {rel_path} of the previous version as a delta: {str(e)}")
+        return deltas
+
+    def pick_codec(self, name, sample):
+        """Choose the codec for new content, None when it isn't worth compressing"""
+        if not self.compression or len(sample) < self.MIN_COMPRESS_SIZE:
+            return None
+        if os.path.splitext(name)[1].lower() in self.INCOMPRESSIBLE_EXTENSIONS:
+            return None
+        # Quick entropy check: if a fast pass over the start barely shrinks it, the rest won't shrink either
+        if len(zlib.compress(sample[:self.COMPRESSION_SAMPLE_SIZE], 1)) > len(sample[:self.COMPRESSION_SAMPLE_SIZE]) * 0.9:
+            return None
+        return self.compression
+
+    def _compress_file(self, source_path, target_path, codec):
+        """Stream a file through the codec without holding it in memory"""
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+            if codec == "zstd":
+                zstandard.ZstdCompressor(level=self.compression_level).copy_stream(source, target)
+                return
+            compressor = zlib.compressobj(self.compression_level)
+            for block in iter(lambda: source.read(self.HASH_BLOCK_SIZE), b''):
+                target.write(compressor.compress(block))
+            target.write(compressor.flush())
+
+    def _compress_bytes(self, data, codec):
+        if codec == "zstd":
+            return zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+        return zlib.compress(data, self.compression_level)
+
+    def _decompress_bytes(self, data, codec):
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Restoring this version needs the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == "zlib":
+            return zlib.decompress(data)
+        return data
+
+    def _read_object_into(self, path, codec, target):
+        """Write an object's original contents into an open binary file"""
+        with open(path, 'rb') as source:
+            if codec == "zstd":
+                if zstandard is None:
+                    raise RuntimeError("Restoring this version needs the zstandard package")
+                zstandard.ZstdDecompressor().copy_stream(source, target)
+            elif codec == "zlib":
+                decompressor = zlib.decompressobj()
+                for block in iter(lambda: source.read(self.HASH_BLOCK_SIZE), b''):
+                    target.write(decompressor.decompress(block))
+                target.write(decompressor.flush())
+            else:
+                shutil.copyfileobj(source, target, self.HASH_BLOCK_SIZE)
+
+    @classmethod
+    def hash_file(cls, path):
+        """Hash a file's contents in blocks"""
+        hasher = hashlib.blake2b(digest_size=32)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def put_file(self, source_path, size=None):
+        """Store a file's contents and return (digest, written) where written is False for duplicates"""
+        if self.pack_small_files and size is not None and size < self.PACK_THRESHOLD:
+            return self._put_small_file(source_path)
+
+        digest = self.hash_file(source_path)
+        if self.has_object(digest):
+            return digest, False
+
+        codec = None
+        if self.compression:
+            with open(source_path, 'rb') as f:
+                codec = self.pick_codec(source_path, f.read(self.COMPRESSION_SAMPLE_SIZE))
+        target = self.object_path(digest) + self.COMPRESSION_SUFFIXES.get(codec, "")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write to a temporary name first so a crash never leaves a truncated object
+        temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            if codec:
+                self._compress_file(source_path, temp_path, codec)
+            else:
+                self.copier.copy_file(source_path, temp_path)
+            os.replace(temp_path, target)
+            self.unsynced_paths.append(target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return digest, True
+
+    def _put_small_file(self, source_path):
+        """Read a small file once and append it to the current pack"""
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.blake2b(data, digest_size=32).hexdigest()
+        if self.has_object(digest):
+            return digest, False
+        codec = self.pick_codec(source_path, data)
+        if codec:
+            data = self._compress_bytes(data, codec)
+        return digest, self.packs.add(digest, data, codec)
+
+    def put_file_chunked(self, source_path):
+        """Store a file as content-defined chunks, returns (digest, chunk_digests, written).
+
+        digest is the hash of the whole file, written is False when every chunk was already stored.
+        """
+        file_hasher = hashlib.blake2b(digest_size=32)
+        chunk_digests = []
+        written = False
+        with open(source_path, 'rb') as f:
+            for chunk in ContentChunker.iter_chunks(f):
+                file_hasher.update(chunk)
+                chunk_digest = hashlib.blake2b(chunk, digest_size=32).hexdigest()
+                chunk_digests.append(chunk_digest)
+                if self._put_bytes(chunk_digest, chunk, source_path):
+                    written = True
+        return file_hasher.hexdigest(), chunk_digests, written
+
+    def _put_bytes(self, digest, data, name):
+        """Store data under digest unless it exists, returns True when it was written"""
+        if self.has_object(digest):
+            return False
+        self._write_object(digest, data, name)
+        return True
+
+    def _write_object(self, digest, data, name, durable=False):
+        """Write data as a full object, compressed if worthwhile"""
+        codec = self.pick_codec(name, data)
+        if codec:
+            data = self._compress_bytes(data, codec)
+        self._write_object_file(self.object_path(digest) + self.COMPRESSION_SUFFIXES.get(codec, ""), data, durable)
+
+    def _write_object_file(self, target, data, durable=False):
+        """Write an object file atomically.
+
+        New objects are flushed later with the snapshot's batch. A durable
+        write is flushed right away with its folder entry, for objects
+        that replace another one which is removed next.
+        """
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, target)
+            if durable:
+                fsync_path(target)
+                fsync_path(os.path.dirname(target), is_dir=True)
+            else:
+                self.unsynced_paths.append(target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def take_unsynced_paths(self):
+        paths, self.unsynced_paths = self.unsynced_paths, []
+        return paths
+
+    def restore_file(self, digest, target_path, chunks=None):
+        """Write the object with the given digest (or the file made of chunks) to target_path"""
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if not chunks:
+            path, codec = self.find_object(digest)
+            if path is None and self.packs.lookup(digest) is None:
+                raise FileNotFoundError(f"Stored object {digest} is missing")
+            if path is not None and codec is None:
+                # Raw objects can still be reflinked or copied in the kernel
+                self.copier.copy_file(path, target_path)
+                return
+            chunks = [digest]
+        with open(target_path, 'wb') as target:
+            for chunk_digest in chunks:
+                path, codec = self.find_object(chunk_digest)
+                if path is None or codec == "delta":
+                    target.write(self.read_object_bytes(chunk_digest))
+                else:
+                    self._read_object_into(path, codec, target)
+
+    def referenced_digests(self):
+        """Collect the digests used by every store version in the destination"""
+        referenced = set()
+        for name in os.listdir(self.destination_path):
+            version_path = os.path.join(self.destination_path, name)
+            if name == META_DIR_NAME or not is_store_version(version_path):
+                continue
+            try:
+                manifest = load_version_manifest(version_path)
+            except Exception as e:
+                print(f"Error reading manifest for {version_path}: {str(e)}")
+                # Keep everything if a manifest cannot be read, rather than risk losing data
+                return None
+            for entry in manifest.get('files', []):
+                referenced.add(entry['digest'])
+                referenced.update(entry.get('chunks', []))
+
+        # Interrupted snapshots waiting to be resumed still need what they stored
+        staging_dir = staging_path(self.destination_path)
+        if os.path.isdir(staging_dir):
+            for name in os.listdir(staging_dir):
+                if not name.endswith(SnapshotCheckpoint.SUFFIX):
+                    continue
+                try:
+                    with open(os.path.join(staging_dir, name), 'r', encoding='utf-8') as f:
+                        checkpoint = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Error reading checkpoint {name}: {str(e)}")
+                    return None
+                if checkpoint.get('storage_mode') != STORAGE_MODE_STORE:
+                    continue
+                for _, _, (digest, chunks, _) in checkpoint.get('files', {}).values():
+                    referenced.add(digest)
+                    referenced.update(chunks or [])
+        return referenced
+
+    def collect_garbage(self):
+        """Remove objects no longer referenced by any version, returns the number removed"""
+        if not self.exists():
+            return 0
+        os.makedirs(self.objects_dir, exist_ok=True)
+        referenced = self.referenced_digests()
+        if referenced is None:
+            return 0
+
+        listing = {}
+        delta_bases = {}
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            listing[prefix] = os.listdir(prefix_dir)
+            for name in listing[prefix]:
+                if name.endswith(self.DELTA_SUFFIX):
+                    try:
+                        delta_bases[prefix + name.split(".")[0]] = self.delta_base(os.path.join(prefix_dir, name))
+                    except (OSError, ValueError) as e:
+                        print(f"Error reading delta object {name}: {str(e)}")
+                        return 0
+
+        # Objects that referenced deltas are rebuilt from must stay, all the way down the chain
+        stack = [digest for digest in referenced if digest in delta_bases]
+        while stack:
+            base = delta_bases[stack.pop()]
+            if base not in referenced:
+                referenced.add(base)
+                if base in delta_bases:
+                    stack.append(base)
+
+        removed = self.packs.collect_garbage(referenced)
+        for prefix, names in listing.items():
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in names:
+                # Leftover .tmp files are from interrupted writes and never referenced
+                if not name.endswith(".tmp") and prefix + name.split(".")[0] in referenced:
+                    continue
+                try:
+                    os.remove(os.path.join(prefix_dir, name))
+                    removed += 1
+                except Exception as e:
+                    print(f"Error removing object {name}: {str(e)}")
+            if not os.listdir(prefix_dir):
+                os.rmdir(prefix_dir)
+        return removed
+
+class SnapshotManifest:
+    """Stat information of every file in the last snapshot of a destination.
+
+    Kept in .versiondiving/last_manifest.json so the next snapshot can tell
+    unchanged files apart by size, mtime and inode without reading them.
+    """
+    FILE_NAME = "last_manifest.json"
+
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self.path = os.path.join(destination_path, META_DIR_NAME, self.FILE_NAME)
+        self.version_name = None
+        self.entries = {}
+        self.dirs = []
+        self.origin_paths = None
+        self.ignore_key = None
+        self.taken_ns = 0
+
+    def load(self):
+        """Load the manifest, leaving it empty if it is missing or its version is gone"""
+        self.version_name = None
+        self.entries = {}
+        self.dirs = []
+        self.origin_paths = None
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable snapshot manifest: {str(e)}")
+            return False
+
+        # The manifest is only useful while the version it describes still exists
+        version_name = data.get('version')
+        if not version_name or not os.path.isdir(os.path.join(self.destination_path, version_name)):
+            return False
+        self.version_name = version_name
+        self.entries = data.get('files', {})
+        self.dirs = data.get('dirs', [])
+        self.origin_paths = data.get('origin_paths')
+        self.ignore_key = data.get('ignore_key', {})
+        self.taken_ns = data.get('taken_ns', 0)
+        return True
+
+    def covers(self, origin_paths, ignore_key):
+        """Check whether the manifest lists the complete tree of these origin paths under the same exclude rules"""
+        return (self.version_name is not None and self.origin_paths == list(origin_paths)
+                and self.ignore_key == ignore_key)
+
+    def unchanged(self, rel_path, stat):
+        """Return the previous entry for rel_path if the file looks unchanged, otherwise None"""
+        entry = self.entries.get(rel_path)
+        # Files modified while the last snapshot was being taken can't be trusted by mtime alone
+        if entry and stat.st_mtime_ns >= self.taken_ns:
+            return None
+        if (entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+                and entry['ino'] == stat.st_ino):
+            return entry
+        return None
+
+    @staticmethod
+    def make_entry(stat, **extra):
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'ino': stat.st_ino, 'mode': stat.st_mode}
+        entry.update(extra)
+        return entry
+
+    def save(self, version_name, entries, taken_ns, dirs=None, origin_paths=None, ignore_key=None):
+        """Replace the manifest with the entries of a freshly created version"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        data = {'version': version_name, 'taken_ns': taken_ns, 'files': entries}
+        if dirs is not None and origin_paths is not None:
+            # With the folders, origins and exclude rules the manifest can stand in for a full tree walk
+            data['dirs'] = dirs
+            data['origin_paths'] = list(origin_paths)
+            data['ignore_key'] = ignore_key or {}
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+        self.version_name = version_name
+        self.entries = entries
+        self.dirs = data.get('dirs', [])
+        self.origin_paths = data.get('origin_paths')
+        self.ignore_key = data.get('ignore_key')
+        self.taken_ns = taken_ns
+
+class TreeFingerprintRecord:
+    """Fingerprint of the origin tree at the last version, stored in .versiondiving/fingerprint.json"""
+    FILE_NAME = "fingerprint.json"
+
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self.path = os.path.join(destination_path, META_DIR_NAME, self.FILE_NAME)
+
+    def matching_version(self, fingerprint):
+        """Return the name of the last version if it has this fingerprint and still exists"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        version_name = data.get('version')
+        if (data.get('fingerprint') == fingerprint and version_name
+                and os.path.isdir(os.path.join(self.destination_path, version_name))):
+            return version_name
+        return None
+
+    def save(self, fingerprint, version_name):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Replaced in one step, a crash mid-write must not leave a record that matches nothing
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'version': version_name}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+class ChangeJournal:
+    """Paths changed in a project's origin since its last version, fed by an OriginWatcher.
+
+    Kept in .versiondiving/change_journal.json. The journal is only trusted
+    while it was recording without gaps since base_version: it starts out
+    untrusted every time the app starts or watching (re)starts, and it gives
+    up when more than MAX_PATHS paths changed. Untrusted means the next
+    snapshot walks the whole tree, after which the journal is trusted again.
+    """
+    FILE_NAME = "change_journal.json"
+    MAX_PATHS = 50000
+    # Journals written by an earlier run missed whatever happened while the app was closed
+    SESSION = uuid.uuid4().hex
+
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self.path = os.path.join(destination_path, META_DIR_NAME, self.FILE_NAME)
+        self.base_version = None
+        self.paths = set()
+        self.in_flight = set()
+        self.recording = False
+        self.dirty = False
+        # Bumped whenever changes are lost, so a snapshot running meanwhile can't become the new base
+        self.generation = 0
+        self.taken_generation = 0
+
+    def start(self):
+        """Start recording, reusing the saved journal only if this run wrote it"""
+        self.recording = True
+        self.base_version = None
+        self.paths = set()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('session') == self.SESSION:
+                self.base_version = data.get('base_version')
+                self.paths = set(data.get('paths', []))
+        except (OSError, ValueError):
+            pass
+        self.dirty = True
+        self.flush()
+
+    def stop(self):
+        """Stop recording, changes from now on are missed so the journal can't be trusted"""
+        self.recording = False
+        self.invalidate()
+        self.flush()
+
+    def invalidate(self):
+        self.base_version = None
+        self.paths = set()
+        self.generation += 1
+        self.dirty = True
+
+    def record(self, path):
+        # Also while there is no base version yet: a change made while the first full snapshot
+        # runs may come after the scan passed it, and belongs to the journal of that snapshot
+        if not self.recording:
+            return
+        self.paths.add(path)
+        self.dirty = True
+        if len(self.paths) > self.MAX_PATHS:
+            print("Change journal overflowed, the next version will rescan the whole origin")
+            self.invalidate()
+
+    def take(self):
+        """Hand the recorded changes to a starting snapshot as (base_version, paths), or None for a full scan"""
+        changes = None
+        if self.recording and self.base_version is not None:
+            changes = (self.base_version, self.paths)
+        # Paths recorded from here on belong to the next snapshot
+        self.in_flight = self.paths
+        self.paths = set()
+        self.taken_generation = self.generation
+        return changes
+
+    def commit(self, version_name):
+        """The snapshot finished, so new changes are relative to version_name"""
+        self.in_flight = set()
+        if self.recording and self.generation == self.taken_generation:
+            self.base_version = version_name
+        self.dirty = True
+        self.flush()
+
+    def rollback(self):
+        """The snapshot failed, keep its changes for the next attempt"""
+        self.paths |= self.in_flight
+        self.in_flight = set()
+        self.dirty = True
+
+    def flush(self):
+        """Write the journal to disk if it changed"""
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'session': self.SESSION,
+                    'base_version': self.base_version,
+                    'paths': sorted(self.paths | self.in_flight)
+                }, f)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Could not save change journal: {str(e)}")
+
+class SnapshotUnchanged(Exception):
+    """Raised when a snapshot is skipped because the origin matches the last version"""
+    def __init__(self, version_name):
+        super().__init__(f"Nothing changed since {version_name}")
+        self.version_name = version_name
+
+class VersionCatalog:
+    """Persisted list of the versions in a destination, oldest first, with their creation times.
+
+    Kept in .versiondiving/catalog.json and updated as versions are created
+    and deleted, so retention and naming don't list and stat the whole
+    destination on every snapshot. The destination folder's mtime is stored
+    alongside: if it changed without the catalog knowing (versions added or
+    removed by hand), the catalog is rebuilt from one listing.
+
+    Each version also carries the bytes it added to the destination, counted
+    while it was written, so byte budgets need no walk of the destination.
+    Versions of unknown size (older catalogs, folders added by hand) are
+    measured once and then cached.
+    """
+    FILE_NAME = "catalog.json"
+
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self.path = os.path.join(destination_path, META_DIR_NAME, self.FILE_NAME)
+        self.versions = []  # [name, created timestamp, size in bytes or None], oldest first
+
+    def load(self, read_only=False):
+        """Load the catalog, rebuilding it if the destination was changed behind its back.
+
+        A read_only load rebuilds in memory only, for readers that run
+        alongside a snapshot which is about to save the catalog itself.
+        """
+        known = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            known = data.get('versions', [])
+            if data.get('dir_mtime_ns') == os.stat(self.destination_path).st_mtime_ns:
+                self.versions = known
+                return self
+        except (OSError, ValueError):
+            pass
+        self.rebuild(known, save=not read_only)
+        return self
+
+    def rebuild(self, known=(), save=True):
+        # Versions that are still there keep their creation time and size
+        known = {version[0]: version for version in known}
+        versions = []
+        for name in os.listdir(self.destination_path):
+            path = os.path.join(self.destination_path, name)
+            if name != META_DIR_NAME and os.path.isdir(path):
+                versions.append(list(known.get(name, [name, os.path.getctime(path), None])))
+        versions.sort(key=lambda version: version[1])
+        self.versions = versions
+        if save:
+            print(f"Rebuilt version catalog of {self.destination_path}: {len(versions)} version(s)")
+            self.save()
+
+    def save(self):
+        """Write the catalog, recording the destination's current mtime as the known state"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            'format': 1,
+            'dir_mtime_ns': os.stat(self.destination_path).st_mtime_ns,
+            'versions': self.versions
+        }
+        # Unique per writer, so two threads saving at once never rename each other's file
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    def names(self):
+        """Version names, oldest first"""
+        return [version[0] for version in self.versions]
+
+    def sizes(self):
+        """[(name, bytes)] oldest first, measuring the versions whose size isn't known yet"""
+        measured = False
+        for version in self.versions:
+            if len(version) < 3 or version[2] is None:
+                try:
+                    size = measure_version_size(os.path.join(self.destination_path, version[0]))
+                except OSError:
+                    size = 0
+                version[2:] = [size]
+                measured = True
+        if measured:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Could not save version catalog: {str(e)}")
+        return [(version[0], version[2]) for version in self.versions]
+
+    def add(self, name, created=None, size=None):
+        self.remove(name)
+        self.versions.append([name, created if created is not None else time.time(), size])
+
+    def remove(self, name):
+        self.versions = [version for version in self.versions if version[0] != name]
+
+def retention_tiers(keep_all_hours, hourly_days, daily_days, weekly_weeks):
+    """Build grandfather-father-son tiers as [(max_age_seconds or None, bucket)], youngest first.
+
+    Each tier reaches from the end of the previous one up to its age; a
+    bucket of None keeps every version, otherwise one version is kept per
+    hour, day or week. A weekly age of 0 keeps weekly versions forever.
+    """
+    hour = 60 * 60
+    day = 24 * hour
+    return [
+        (keep_all_hours * hour, None),
+        (hourly_days * day, 'hour'),
+        (daily_days * day, 'day'),
+        (weekly_weeks * 7 * day if weekly_weeks > 0 else None, 'week')
+    ]
+
+def select_expired_versions(versions, tiers, now=None):
+    """Return the names a tiered policy would delete from catalog versions ([name, created], oldest first).
+
+    One pass from the newest version back: a version is kept when it is the
+    newest one seen in its hour/day/week bucket of the tier its age falls
+    in, and expires when a newer version already covers that bucket or it is
+    older than every tier. The newest version is always kept.
+    """
+    if now is None:
+        now = time.time()
+    bucket_keys = {
+        'hour': lambda moment: (moment.date(), moment.hour),
+        'day': lambda moment: moment.date(),
+        'week': lambda moment: moment.isocalendar()[:2]
+    }
+    covered = set()
+    expired = []
+    for position, version in enumerate(reversed(versions)):
+        name, created = version[:2]
+        age = now - created
+        for max_age, bucket in tiers:
+            if max_age is not None and age > max_age:
+                continue
+            if bucket is None:
+                break
+            key = (bucket, bucket_keys[bucket](datetime.datetime.fromtimestamp(created)))
+            if key not in covered:
+                covered.add(key)
+                break
+            if position > 0:
+                expired.append(name)
+            break
+        else:
+            # Older than the last tier
+            if position > 0:
+                expired.append(name)
+    expired.reverse()
+    return expired
+
+def measure_version_size(version_path):
+    """Bytes a version folder takes up, a hardlinked file is shared out between the versions linking it"""
+    total = 0
+    folders = [version_path]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    # st_nlink is 0 from scandir on Windows
+                    total += stat.st_size // max(stat.st_nlink, 1)
+    return total
+
+class SpaceBudget:
+    """Byte limits of a destination: a maximum size of all versions and a share of the volume left free.
+
+    Checked against the sizes cached in the version catalog and one
+    disk_usage call, so it is cheap enough to check before every snapshot.
+    Store versions only hold their manifest, the objects they share are
+    counted once from the store, and what deleting one of them frees is
+    only known after garbage collection.
+    """
+
+    def __init__(self, max_bytes=0, min_free_percent=0):
+        self.max_bytes = max_bytes  # 0 for no limit
+        self.min_free_percent = min_free_percent
+
+    def bytes_to_free(self, destination_path, used_bytes, incoming_bytes=0):
+        """Return how many bytes must be freed so incoming_bytes more stay within the budget"""
+        usage = shutil.disk_usage(destination_path)
+        # Versions still being deleted in the background are as good as free
+        free = usage.free + VersionReaper.shared().pending_bytes(destination_path)
+        needed = incoming_bytes - (free - usage.total * self.min_free_percent / 100)
+        if self.max_bytes:
+            needed = max(needed, used_bytes + incoming_bytes - self.max_bytes)
+        return max(0, int(needed))
+
+    def select_versions(self, destination_path, catalog, incoming_bytes=0, chosen=()):
+        """Return (oldest versions to delete to fit the budget, bytes still missing after deleting them).
+
+        Versions in chosen are deleted anyway and count as freed. The newest
+        version is never selected. With a content store only the oldest one
+        is selected, check again once its objects are collected.
+        """
+        sizes = catalog.sizes()
+        shared = ContentStore(destination_path).disk_usage()
+        excess = self.bytes_to_free(destination_path, sum(size for _, size in sizes) + shared, incoming_bytes)
+        excess -= sum(size for name, size in sizes if name in chosen)
+        names = []
+        for name, size in sizes[:-1]:
+            if excess <= 0:
+                break
+            if name not in chosen:
+                names.append(name)
+                excess -= size
+                if shared:
+                    break
+        return names, max(0, excess)
+
+def delete_versions(destination_path, catalog, names):
+    """Delete versions with their records and drop stored objects nothing refers to anymore.
+
+    The version folders are only renamed into the trash, the shared
+    VersionReaper removes their files in the background. The catalog is
+    updated and saved. Returns the number of versions deleted.
+    """
+    deleted_count = 0
+    # Only the sizes already known, measuring a version would walk it on the caller's thread
+    sizes = {version[0]: version[2] or 0 for version in catalog.versions if len(version) > 2}
+    trashed = {}
+    for name in names:
+        folder = os.path.join(destination_path, name)
+        try:
+            os.makedirs(trash_path(destination_path), exist_ok=True)
+            trashed_path = os.path.join(trash_path(destination_path), f"{name}.{uuid.uuid4().hex[:8]}")
+            os.rename(folder, trashed_path)
+            trashed[trashed_path] = sizes.get(name, 0)
+            remove_version_records(folder)
+            catalog.remove(name)
+            deleted_count += 1
+        except FileNotFoundError:
+            # Already deleted by hand
+            catalog.remove(name)
+        except Exception as e:
+            print(f"Error removing folder {folder}: {str(e)}")
+    if names:
+        catalog.save()
+    if trashed:
+        VersionReaper.shared().reap_trash(destination_path, trashed)
+    
+    # Drop stored objects that no remaining version refers to, in the background
+    if deleted_count > 0:
+        VersionReaper.shared().collect_garbage(destination_path)
+    return deleted_count
+
+class DestinationLock:
+    """Keeps garbage collection of a destination's store away from a snapshot writing to it.
+
+    A per-destination thread lock covers this application, an flock on
+    .versiondiving/lock also covers a second instance where fcntl exists.
+    """
+    FILE_NAME = "lock"
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, destination_path):
+        key = os.path.normcase(os.path.abspath(destination_path))
+        with DestinationLock._locks_lock:
+            self.thread_lock = DestinationLock._locks.setdefault(key, threading.Lock())
+        self.path = os.path.join(destination_path, META_DIR_NAME, self.FILE_NAME)
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, 'a')
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            except OSError as e:
+                print(f"Could not lock {self.path}: {str(e)}")
+                if self.file:
+                    self.file.close()
+                    self.file = None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.file:
+            self.file.close()  # closing releases the flock
+            self.file = None
+        self.thread_lock.release()
+        return False
+
+class VersionReaper:
+    """Removes deleted versions from the destinations' trash folders on a background thread.
+
+    Deleting a version only renames it into .versiondiving/trash, so neither
+    a snapshot nor the GUI waits for a big tree to be removed. The reaper
+    then deletes the files with a small pool of threads, paced to
+    max_files_per_second so it doesn't take the disk away from a running
+    snapshot. Trash left behind by an earlier run is queued with
+    reap_trash() as well.
+
+    Garbage collection of a destination's store runs on the same thread,
+    ahead of the trash, and so does rewriting the contents a committed
+    version replaced as deltas. A snapshot calls wait_collected() before it looks
+    at the store, so it never reuses an object that is being removed, and
+    holds the DestinationLock while it writes, which a collection waits for.
+    """
+    DEFAULT_WORKERS = 4
+    MAX_FILES_PER_SECOND = 2000
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """The reaper used by the whole application"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_files_per_second=MAX_FILES_PER_SECOND):
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(max_files_per_second)
+        self.condition = threading.Condition()
+        self.pending = collections.deque()
+        self.queued = {}  # trashed path -> (destination path, bytes it frees)
+        self.collections = []  # destination paths whose store needs garbage collection, the first one may be running
+        self.deltas = collections.deque()  # (destination path, digests to keep full, replaced contents)
+        self.thread = None
+
+    def reap_trash(self, destination_path, sizes=None):
+        """Queue everything in a destination's trash folder, sizes maps trashed paths to their bytes"""
+        try:
+            names = os.listdir(trash_path(destination_path))
+        except OSError:
+            return 0
+        sizes = sizes or {}
+        with self.condition:
+            for name in names:
+                path = os.path.join(trash_path(destination_path), name)
+                if path not in self.queued:
+                    self.queued[path] = (destination_path, sizes.get(path, 0))
+                    self.pending.append(path)
+            self._start()
+        return len(names)
+
+    def collect_garbage(self, destination_path):
+        """Queue removing the stored objects no version of the destination refers to anymore"""
+        with self.condition:
+            if destination_path not in self.collections[1:]:
+                self.collections.append(destination_path)
+            self._start()
+
+    def store_deltas(self, destination_path, full_digests, replaced):
+        """Queue storing the contents a new version replaced as deltas, see ContentStore.store_replaced_as_deltas"""
+        with self.condition:
+            self.deltas.append((destination_path, full_digests, replaced))
+            self._start()
+
+    def wait_collected(self, destination_path, timeout=None):
+        """Block until the destination's queued garbage collection is done, returns False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: destination_path not in self.collections, timeout)
+
+    def _start(self):
+        if (self.pending or self.collections or self.deltas) and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="VersionDivingReaper", daemon=True)
+            self.thread.start()
+
+    def pending_bytes(self, destination_path):
+        """Bytes of the destination's trash that are not deleted yet, as far as they are known"""
+        with self.condition:
+            return sum(size for destination, size in self.queued.values() if destination == destination_path)
+
+    def wait_idle(self, timeout=None):
+        """Block until the queued trash is deleted, returns False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.thread is None, timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                deltas = None
+                if self.collections:
+                    destination_path = self.collections[0]
+                    path = None
+                elif self.deltas:
+                    deltas = self.deltas.popleft()
+                    path = None
+                elif not self.pending:
+                    self.thread = None
+                    self.condition.notify_all()
+                    return
+                else:
+                    path = self.pending.popleft()
+            if deltas:
+                self._store_deltas(*deltas)
+                continue
+            if path is None:
+                # A snapshot may be waiting for it, so it goes before the trash
+                self._collect_garbage(destination_path)
+                with self.condition:
+                    self.collections.pop(0)
+                    self.condition.notify_all()
+                continue
+            try:
+                self._delete_tree(path)
+            except RuntimeError:
+                # The application is exiting, the rest of the trash is picked up on the next start
+                return
+            except Exception as e:
+                print(f"Error deleting {path}: {str(e)}")
+            with self.condition:
+                self.queued.pop(path, None)
+
+    @staticmethod
+    def _collect_garbage(destination_path):
+        try:
+            store = ContentStore(destination_path)
+            if store.exists():
+                with DestinationLock(destination_path):
+                    removed_objects = store.collect_garbage()
+                print(f"Removed {removed_objects} unreferenced object(s) from the store")
+        except Exception as e:
+            print(f"Error collecting garbage in {destination_path}: {str(e)}")
+
+    @staticmethod
+    def _store_deltas(destination_path, full_digests, replaced):
+        try:
+            with DestinationLock(destination_path):
+                deltas = ContentStore(destination_path).store_replaced_as_deltas(full_digests, replaced)
+            if deltas:
+                print(f"Stored {deltas} file(s) of the previous version as deltas")
+        except Exception as e:
+            print(f"Error storing deltas in {destination_path}: {str(e)}")
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except PermissionError:
+            # Read-only files can't be deleted on Windows
+            try:
+                os.chmod(path, stat_module.S_IWRITE)
+                os.remove(path)
+            except OSError:
+                pass
+        except OSError:
+            pass
+
+    def _delete_tree(self, path):
+        if os.path.islink(path) or not os.path.isdir(path):
+            self._remove_file(path)
+            return
+        started = time.monotonic()
+        folders = []
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="VersionDivingReaper") as pool:
+            stack = [path]
+            while stack:
+                folder = stack.pop()
+                folders.append(folder)
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        if len(pending) >= self.workers * 16:
+                            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self.limiter.consume(1)
+                        pending.add(pool.submit(self._remove_file, entry.path))
+        # The folders are empty now, a folder comes before its subfolders in the list
+        for folder in reversed(folders):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        print(f"Deleted {os.path.basename(path)} from the trash in {time.monotonic() - started:.1f} s")
+
+class InsufficientSpace(Exception):
+    """Raised before a snapshot starts when the new version would not fit in the destination"""
+    pass
+
+class SnapshotCheckpoint:
+    """Progress of a version being written to the staging folder, so an interrupted snapshot can resume.
+
+    Records the files already safely in the staging folder (flushed to disk)
+    with their size, mtime and per-mode result. A later snapshot of the same
+    origin adopts the staged version and skips files that still match
+    instead of copying them again. Kept next to the staged folder as
+    <name>.checkpoint.json.
+    """
+    SUFFIX = ".checkpoint.json"
+    SAVE_INTERVAL = 30  # seconds between checkpoints while a snapshot runs
+    MAX_AGE_DAYS = 7
+
+    def __init__(self, stage_path, origin_paths, storage_mode):
+        self.stage_path = stage_path
+        self.origin_paths = list(origin_paths)
+        self.storage_mode = storage_mode
+        self.done = {}  # rel_path -> [size, mtime_ns, result] of files in the staged version
+        self.resumable = {}  # the same, loaded from the interrupted snapshot
+        self._last_save = time.monotonic()
+
+    @property
+    def path(self):
+        return self.stage_path + self.SUFFIX
+
+    @classmethod
+    def expired(cls, checkpoint_path):
+        try:
+            return time.time() - os.path.getmtime(checkpoint_path) > cls.MAX_AGE_DAYS * 24 * 60 * 60
+        except OSError:
+            return True
+
+    @classmethod
+    def find_resumable(cls, destination_path, origin_paths, storage_mode):
+        """Return the newest staged version of these origins that can be resumed, or None"""
+        staging_dir = staging_path(destination_path)
+        if not os.path.isdir(staging_dir):
+            return None
+        candidates = []
+        for name in os.listdir(staging_dir):
+            if not name.endswith(cls.SUFFIX):
+                continue
+            checkpoint = cls(os.path.join(staging_dir, name[:-len(cls.SUFFIX)]), origin_paths, storage_mode)
+            if os.path.isdir(checkpoint.stage_path) and checkpoint.load():
+                candidates.append((os.path.getmtime(checkpoint.path), checkpoint.stage_path))
+        return max(candidates)[1] if candidates else None
+
+    def load(self):
+        """Load the files of an interrupted snapshot, returns False if it doesn't match these settings"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('origin_paths') != self.origin_paths or data.get('storage_mode') != self.storage_mode:
+            return False
+        self.resumable = data.get('files', {})
+        return True
+
+    def lookup(self, rel_path, stat):
+        """Return the recorded result for a staged file that is unchanged in the origin, or None"""
+        entry = self.resumable.get(rel_path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry
+        return None
+
+    def add(self, rel_path, stat, result):
+        self.done[rel_path] = [stat.st_size, stat.st_mtime_ns, result]
+
+    def due(self):
+        return time.monotonic() - self._last_save >= self.SAVE_INTERVAL
+
+    def save(self):
+        """Write the checkpoint, the files it lists must already be flushed"""
+        data = {
+            'origin_paths': self.origin_paths,
+            'storage_mode': self.storage_mode,
+            'files': self.done
+        }
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class SnapshotIncomplete(Exception):
+    """Raised when some files could not be copied, the staged version is kept for the next attempt"""
+    REPORT_LINES = 10
+
+    def __init__(self, failures, resumable=True):
+        self.failures = failures  # [(rel_path, error message)]
+        lines = [f"{rel_path}: {message}" for rel_path, message in failures[:self.REPORT_LINES]]
+        if len(failures) > self.REPORT_LINES:
+            lines.append(f"... and {len(failures) - self.REPORT_LINES} more")
+        if resumable:
+            lines.append("The next attempt resumes where this one stopped.")
+        super().__init__(f"{len(failures)} file(s) could not be copied:\n" + "\n".join(lines))
+
+class SnapshotCancelled(Exception):
+    """Raised inside the engine when a running snapshot is cancelled"""
+    pass
+
+class SnapshotEngine:
+    """Writes a snapshot of the origin paths into a new version folder.
+
+    Safe to run off the GUI thread: progress is reported through
+    progress_callback(files_done, files_total, bytes_done, bytes_total) and
+    setting cancel_event aborts the snapshot and removes the partial version.
+    """
+    PROGRESS_INTERVAL = 0.1
+    DEFAULT_COPY_WORKERS = 4
+    # Pauses before each new attempt at files that could not be read, locks are often released quickly
+    RETRY_DELAYS = (1, 2, 4)
+
+    def __init__(self, destination_path, storage_mode=STORAGE_MODE_FULL_COPY,
+                 copy_workers=DEFAULT_COPY_WORKERS, hash_contents_fingerprint=False,
+                 exclude_patterns=None, use_gitignore=False, chunk_large_files=False,
+                 compression=None, compression_level=DEFAULT_COMPRESSION_LEVEL, delta_older_versions=False,
+                 pack_small_files=False, record_checksums=True, allow_partial_versions=False,
+                 space_budget=None, progress_callback=None, cancel_event=None):
+        self.destination_path = destination_path
+        # With a SpaceBudget, old versions are deleted before a snapshot that would not fit it
+        self.space_budget = space_budget
+        self.record_checksums = record_checksums
+        self.allow_partial_versions = allow_partial_versions
+        self.storage_mode = storage_mode
+        self.chunk_large_files = chunk_large_files
+        self.delta_older_versions = delta_older_versions
+        self.exclude_patterns = list(exclude_patterns or [])
+        self.use_gitignore = use_gitignore
+        self.copy_workers = max(1, copy_workers)
+        self.hash_contents_fingerprint = hash_contents_fingerprint
+        self.fingerprint_record = TreeFingerprintRecord(destination_path)
+        self.store = ContentStore(destination_path, compression=compression, compression_level=compression_level,
+                                  pack_small_files=pack_small_files)
+        self.compression = compression if compression != "zstd" or zstandard is not None else "zlib"
+        self.compression_level = compression_level
+        self.manifest = SnapshotManifest(destination_path)
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self._last_progress = 0
+
+    @property
+    def copier(self):
+        return self.store.copier
+
+    def create_version(self, origin_paths, version_name, skip_if_unchanged=False, changes=None):
+        """Create the version folder and return its path.
+
+        With skip_if_unchanged, raises SnapshotUnchanged instead when the origin
+        tree has the same fingerprint as the last version. changes is a
+        (base_version, changed_paths) pair from a ChangeJournal; when it
+        matches the last snapshot only the changed paths are visited.
+        """
+        # Compiled once per snapshot, the walk prunes excluded folders instead of filtering afterwards
+        ignore_rules = IgnoreRules.for_origins(origin_paths, self.exclude_patterns, self.use_gitignore)
+        ignore_key = IgnoreRules.rules_key(ignore_rules)
+
+        self.manifest.load()
+        if (changes and changes[0] == self.manifest.version_name
+                and self.manifest.covers(origin_paths, ignore_key)):
+            dirs, files = scan_changes(origin_paths, self.manifest, changes[1], ignore_rules)
+        else:
+            dirs, files = scan_origins(origin_paths, ignore_rules)
+        fingerprint = tree_fingerprint(origin_paths, dirs, files, self.hash_contents_fingerprint)
+        if skip_if_unchanged:
+            unchanged_version = self.fingerprint_record.matching_version(fingerprint)
+            if unchanged_version:
+                raise SnapshotUnchanged(unchanged_version)
+
+        # Refuse or make room up front, running out of space halfway through helps no one
+        self._ensure_space(files)
+        # Deleted versions may still have their objects collected, which must not race this version reusing them
+        VersionReaper.shared().wait_collected(self.destination_path)
+        # Held until the version is committed, so a collection queued meanwhile cannot
+        # remove the pack being written or objects stored since the last checkpoint
+        with DestinationLock(self.destination_path):
+            return self._write_version(origin_paths, version_name, dirs, files, fingerprint, ignore_key)
+
+    def _write_version(self, origin_paths, version_name, dirs, files, fingerprint, ignore_key):
+        """Write the scanned files as a new version, called with the destination locked"""
+        # An existing version is never written into, the new one gets a counter instead
+        base_name = version_name
+        counter = 2
+        while os.path.exists(os.path.join(self.destination_path, version_name)):
+            version_name = f"{base_name}_{counter}"
+            counter += 1
+        version_path = os.path.join(self.destination_path, version_name)
+
+        # Build the version out of sight, it only appears in the destination once complete
+        recover_staging(self.destination_path)
+        stage_path = staging_path(self.destination_path, version_name)
+        self.checkpoint = SnapshotCheckpoint(stage_path, origin_paths, self.storage_mode)
+        resume_path = None
+        if self.storage_mode != STORAGE_MODE_ARCHIVE:
+            # An archive is one compressed stream, it cannot be continued halfway through
+            resume_path = SnapshotCheckpoint.find_resumable(self.destination_path, origin_paths, self.storage_mode)
+        if resume_path:
+            previous = SnapshotCheckpoint(resume_path, origin_paths, self.storage_mode)
+            previous.load()
+            os.rename(resume_path, stage_path)
+            os.replace(previous.path, self.checkpoint.path)
+            self.checkpoint.resumable = previous.resumable
+            print(f"Resuming {os.path.basename(resume_path)} as {version_name}: "
+                  f"{len(previous.resumable)} file(s) already copied")
+            self._prune_resumed_stage(stage_path, dirs, files)
+        else:
+            os.makedirs(stage_path)
+        self.checksums = None
+        self.pending_deltas = None
+        self.unsynced_paths = []
+        self.failures = []
+        self.bytes_written = 0
+        packed_bytes = self.store.packs.bytes_added
+        try:
+            self._start_progress(files)
+
+            taken_ns = time.time_ns()
+            if self.storage_mode == STORAGE_MODE_STORE:
+                manifest_entries = self._create_store_version(origin_paths, stage_path, dirs, files)
+            elif self.storage_mode == STORAGE_MODE_HARDLINK:
+                manifest_entries = self._create_hardlink_version(stage_path, dirs, files)
+            elif self.storage_mode == STORAGE_MODE_ARCHIVE:
+                manifest_entries = self._create_archive_version(origin_paths, stage_path, dirs, files)
+            else:
+                manifest_entries = self._create_full_copy(stage_path, dirs, files)
+            self._report_progress(force=True)
+            if self.failures and not self.allow_partial_versions:
+                raise SnapshotIncomplete(self.failures, self.storage_mode != STORAGE_MODE_ARCHIVE)
+            if self.failures:
+                # Finalize what could be read and keep a list of what is missing
+                print(f"Version {version_name} is partial: {len(self.failures)} file(s) skipped")
+                save_version_skipped(version_path, self.failures)
+            self.bytes_written += self.store.packs.bytes_added - packed_bytes
+            self._commit_version(stage_path, version_path, dirs)
+        except SnapshotCancelled:
+            # Never leave a half-written version behind that looks like a real one
+            self._discard_stage(stage_path, version_path)
+            raise
+        except BaseException:
+            # Keep what was copied so the next attempt can resume instead of starting over
+            if self.storage_mode == STORAGE_MODE_ARCHIVE or not self._save_checkpoint():
+                self._discard_stage(stage_path, version_path)
+            raise
+        self.checkpoint.remove()
+        if self.pending_deltas:
+            # Only a committed version lets older contents become deltas, it waits for the destination lock
+            VersionReaper.shared().store_deltas(self.destination_path, *self.pending_deltas)
+
+        if self.failures:
+            # The next snapshot scans everything and must not be skipped as unchanged,
+            # so the skipped files get another chance
+            self.manifest.save(version_name, manifest_entries, taken_ns)
+            return version_path
+        self.manifest.save(version_name, manifest_entries, taken_ns,
+                           [rel_dir for _, rel_dir in dirs], origin_paths, ignore_key)
+        self.fingerprint_record.save(fingerprint, version_name)
+        return version_path
+
+    def _discard_stage(self, stage_path, version_path):
+        self.store.packs.abort()
+        shutil.rmtree(stage_path, ignore_errors=True)
+        self.checkpoint.remove()
+        remove_version_records(version_path)
+
+    def _sync_paths(self, paths):
+        """Flush a batch of files, in parallel so the disk can order the writes, returns their total size"""
+        if len(paths) > 1 and self.copy_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.copy_workers, thread_name_prefix="VersionDivingSync") as pool:
+                return sum(pool.map(fsync_path, paths))
+        return sum(fsync_path(path) for path in paths)
+
+    def _estimate_new_bytes(self, files):
+        """Upper bound of the bytes a new version writes, unchanged files are linked or already stored"""
+        if self.storage_mode in (STORAGE_MODE_STORE, STORAGE_MODE_HARDLINK):
+            return sum(stat.st_size for _, rel_path, stat in files if not self.manifest.unchanged(rel_path, stat))
+        return sum(stat.st_size for _, _, stat in files)
+
+    def _ensure_space(self, files):
+        """Delete old versions the space budget allows to, or raise InsufficientSpace if the version won't fit"""
+        incoming = self._estimate_new_bytes(files)
+        if self.space_budget is None:
+            # Only a warning: the estimate ignores reflinks and compression, and a write
+            # that really runs out of space still fails the snapshot
+            try:
+                free = shutil.disk_usage(self.destination_path).free
+                free += VersionReaper.shared().pending_bytes(self.destination_path)
+            except OSError:
+                return
+            if incoming > free:
+                print(f"Warning: the new version may need up to {format_size(incoming)} "
+                      f"and only {format_size(free)} are free in the destination")
+            return
+        catalog = VersionCatalog(self.destination_path).load()
+        while True:
+            names, missing = self.space_budget.select_versions(self.destination_path, catalog, incoming)
+            # Deleting store versions frees an unknown share of the store, so those are deleted one at a time
+            if not names or (missing and not self.store.exists()):
+                break
+            print(f"Deleting {len(names)} old version(s) to make room for about {format_size(incoming)}")
+            if not delete_versions(self.destination_path, catalog, names):
+                break
+            VersionReaper.shared().wait_collected(self.destination_path)
+        if missing:
+            raise InsufficientSpace(f"The new version needs up to {format_size(incoming)}, which would not fit "
+                                    f"the destination's size limits even after deleting the older versions")
+
+    def _save_checkpoint(self):
+        """Flush the files written so far and record them in the checkpoint, returns False on errors"""
+        try:
+            unsynced, self.unsynced_paths = self.unsynced_paths, []
+            self.bytes_written += self._sync_paths(unsynced + self.store.take_unsynced_paths())
+            # Objects appended to a pack only exist once its index is written
+            self.store.packs.finish()
+            self.checkpoint.save()
+            return True
+        except Exception as e:
+            print(f"Could not save snapshot checkpoint: {str(e)}")
+            return False
+
+    def _prune_resumed_stage(self, stage_path, dirs, files):
+        """Remove files and folders of a resumed staged version that are no longer in the origin"""
+        wanted_files = {rel_path for _, rel_path, _ in files}
+        wanted_dirs = {rel_dir for _, rel_dir in dirs}
+        for root, dir_names, file_names in os.walk(stage_path, topdown=False):
+            rel_root = os.path.relpath(root, stage_path)
+            rel_root = "" if rel_root == os.curdir else rel_root
+            for name in file_names:
+                if os.path.join(rel_root, name) not in wanted_files:
+                    os.remove(os.path.join(root, name))
+            for name in dir_names:
+                if os.path.join(rel_root, name) not in wanted_dirs:
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    def _commit_version(self, stage_path, version_path, dirs):
+        """Flush the staged version to disk and rename it into the destination in one step.
+
+        Files are synced together at the end rather than one by one while
+        copying, so the disk can order the writes and a snapshot pays for one
+        round of flushes instead of an fsync per file.
+        """
+        self.bytes_written += self._sync_paths(self.unsynced_paths + self.store.take_unsynced_paths())
+        # Folders after their files, deepest first, so renamed entries are durable too
+        for rel_dir in sorted((rel_dir for _, rel_dir in dirs), reverse=True):
+            folder = os.path.join(stage_path, rel_dir)
+            if os.path.isdir(folder):
+                fsync_path(folder, is_dir=True)
+        fsync_path(stage_path, is_dir=True)
+
+        if self.checksums is not None:
+            save_version_checksums(version_path, self.checksums)
+        # Loaded before the rename, so the version appearing is not mistaken for an outside change
+        catalog = VersionCatalog(self.destination_path).load()
+        os.rename(stage_path, version_path)
+        fsync_path(self.destination_path, is_dir=True)
+        # A store version's objects are counted with the store, the version itself is its manifest
+        size = measure_version_size(version_path) if self.storage_mode == STORAGE_MODE_STORE else self.bytes_written
+        catalog.add(os.path.basename(version_path), size=size)
+        catalog.save()
+
+    def _start_progress(self, files):
+        self.files_total = len(files)
+        self.bytes_total = sum(stat.st_size for _, _, stat in files)
+        self.files_done = 0
+        self.bytes_done = 0
+        self._last_progress = 0
+        self._report_progress(force=True)
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise SnapshotCancelled()
+
+    def _wait(self, seconds):
+        """Sleep between retries, waking up at once when cancelled"""
+        if self.cancel_event is None:
+            time.sleep(seconds)
+        elif self.cancel_event.wait(seconds):
+            raise SnapshotCancelled()
+
+    def _file_done(self, size):
+        """Count a finished file, report progress and stop if cancelled"""
+        self.files_done += 1
+        self.bytes_done += size
+        self._report_progress()
+        self._check_cancelled()
+
+    def _report_progress(self, force=False):
+        if self.progress_callback is None:
+            return
+        # Throttle updates so huge trees of tiny files don't flood the GUI thread
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress_callback(self.files_done, self.files_total, self.bytes_done, self.bytes_total)
+
+    def _map_files(self, files, func):
+        """Run func(source_path, rel_path, stat) for every file, returns the files that succeeded and their results.
+
+        Files are fanned out to a bounded pool of copy threads. Results are
+        collected on the calling thread, so progress counters and the
+        checkpoint need no locking. A file that cannot be read goes to a
+        retry queue instead of stopping the snapshot, and is recorded in
+        self.failures if it still fails after the last retry. A file deleted
+        since the scan is simply left out of the version.
+        """
+        results = [None] * len(files)
+        failed = {}  # index -> error message, waiting for a retry
+        vanished = set()
+
+        def run(index, source_path, rel_path, stat):
+            try:
+                return func(source_path, rel_path, stat)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+                if isinstance(e, FileNotFoundError) and not os.path.lexists(source_path):
+                    # Editor swap files and build temp files come and go, nothing to retry
+                    vanished.add(index)
+                    return None
+                failed[index] = e.strerror or str(e)
+                return None
+
+        def finished(index, result):
+            if index not in failed and index not in vanished:
+                self.checkpoint.add(files[index][1], files[index][2], result)
+                if self.checkpoint.due():
+                    self._save_checkpoint()
+            self._file_done(files[index][2].st_size)
+
+        if self.copy_workers == 1 or len(files) < 2:
+            for index, (source_path, rel_path, stat) in enumerate(files):
+                results[index] = run(index, source_path, rel_path, stat)
+                finished(index, results[index])
+        else:
+            self._map_files_parallel(files, run, finished, results)
+
+        # Retry locked or busy files once the rest is done, with growing pauses
+        for delay in self.RETRY_DELAYS:
+            if not failed:
+                break
+            print(f"Retrying {len(failed)} file(s) in {delay} s")
+            self._wait(delay)
+            for index in sorted(failed):
+                source_path, rel_path, stat = files[index]
+                del failed[index]
+                results[index] = run(index, source_path, rel_path, stat)
+                if index not in failed and index not in vanished:
+                    self.checkpoint.add(rel_path, stat, results[index])
+        self.failures.extend((files[index][1], message) for index, message in sorted(failed.items()))
+        if vanished:
+            print(f"Left out {len(vanished)} file(s) deleted from the origin while the version was created")
+        left_out = vanished.union(failed)
+        return ([file for index, file in enumerate(files) if index not in left_out],
+                [result for index, result in enumerate(results) if index not in left_out])
+
+    def _map_files_parallel(self, files, run, finished, results):
+        # Keep a few files queued per thread without materializing a future for every file up front
+        max_pending = self.copy_workers * 4
+        pool = ThreadPoolExecutor(max_workers=self.copy_workers, thread_name_prefix="VersionDivingCopy")
+        pending = {}
+        try:
+            def collect(done):
+                for future in done:
+                    index = pending.pop(future)
+                    results[index] = future.result()
+                    finished(index, results[index])
+
+            for index, (source_path, rel_path, stat) in enumerate(files):
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[pool.submit(run, index, source_path, rel_path, stat)] = index
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            # On errors or cancel, drop queued files and let the running ones finish
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _create_full_copy(self, version_path, dirs, files):
+        """Copy every origin path into the version folder"""
+        # Folders are created up front so copy threads never race on makedirs
+        for source_dir, rel_dir in dirs:
+            os.makedirs(os.path.join(version_path, rel_dir), exist_ok=True)
+        def copy_file(source_path, rel_path, stat):
+            target_path = os.path.join(version_path, rel_path)
+            resumed = self.checkpoint.lookup(rel_path, stat)
+            if resumed and os.path.exists(target_path) and (resumed[2] or not self.record_checksums):
+                # Copied by the interrupted snapshot this one resumes
+                return resumed[2]
+            if self.record_checksums:
+                checksum = self.copier.copy2_checksum(source_path, target_path)
+            else:
+                checksum = None
+                self.copier.copy2(source_path, target_path)
+            self.unsynced_paths.append(target_path)
+            return checksum
+
+        files, checksums = self._map_files(files, copy_file)
+        if self.record_checksums:
+            self.checksums = {rel_path: checksum for (_, rel_path, _), checksum in zip(files, checksums)}
+        # Match copytree, which keeps the timestamps and permissions of copied folders
+        for source_dir, rel_dir in reversed(dirs):
+            try:
+                shutil.copystat(source_dir, os.path.join(version_path, rel_dir))
+            except OSError:
+                pass
+        return {rel_path: SnapshotManifest.make_entry(stat) for _, rel_path, stat in files}
+
+    def _create_store_version(self, origin_paths, version_path, dirs, files):
+        """Store file contents as objects, write a manifest for the version and return its snapshot entries"""
+        def store_file(source_path, rel_path, stat):
+            previous = self.manifest.unchanged(rel_path, stat)
+            if previous and 'digest' in previous:
+                # Unchanged since the last snapshot: reference the stored object without reading the file
+                return previous['digest'], previous.get('chunks'), "reused"
+            resumed = self.checkpoint.lookup(rel_path, stat)
+            if resumed:
+                # Stored by the interrupted snapshot this one resumes
+                return tuple(resumed[2])
+            if self.chunk_large_files and stat.st_size >= ContentStore.CHUNK_THRESHOLD:
+                # Big files that change a little at a time only store the chunks that changed
+                digest, chunks, was_written = self.store.put_file_chunked(source_path)
+            else:
+                (digest, was_written), chunks = self.store.put_file(source_path, stat.st_size), None
+            return digest, chunks, "written" if was_written else "duplicate"
+
+        # On errors the engine either checkpoints the pack or aborts it
+        files, results = self._map_files(files, store_file)
+        # Packed objects only count once their index is written, before any manifest points at them
+        self.store.packs.finish()
+
+        manifest_files = []
+        manifest_entries = {}
+        written = sum(1 for _, _, outcome in results if outcome == "written")
+        reused = sum(1 for _, _, outcome in results if outcome == "reused")
+        for (source_path, rel_path, stat), (digest, chunks, outcome) in zip(files, results):
+            file_entry = {
+                'path': rel_path,
+                'digest': digest,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'mode': stat.st_mode & 0o7777
+            }
+            if chunks:
+                manifest_entries[rel_path] = SnapshotManifest.make_entry(stat, digest=digest, chunks=chunks)
+                file_entry['chunks'] = chunks
+            else:
+                manifest_entries[rel_path] = SnapshotManifest.make_entry(stat, digest=digest)
+            manifest_files.append(file_entry)
+
+        manifest = {
+            'format': 1,
+            'created': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'origin_paths': list(origin_paths),
+            'dirs': sorted(rel_dir for _, rel_dir in dirs),
+            'files': manifest_files
+        }
+        with open(os.path.join(version_path, VERSION_MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        self.unsynced_paths.append(os.path.join(version_path, VERSION_MANIFEST_NAME))
+
+        if self.delta_older_versions:
+            # Rewritten by the reaper once the version is committed, not on the snapshot's time
+            self.pending_deltas = self._previous_deltas(files, results)
+
+        print(f"Stored version {os.path.basename(version_path)}: {len(manifest_files)} files, "
+              f"{reused} unchanged, {written} new objects")
+        return manifest_entries
+
+    def _previous_deltas(self, files, results):
+        """Pick the new version's objects to keep full and the contents it replaced, to store as deltas against them"""
+        current = {digest for digest, _, _ in results}
+        full_digests = []
+        replaced = []
+        for (_, rel_path, stat), (digest, chunks, outcome) in zip(files, results):
+            if outcome == "duplicate":
+                # Contents seen before may have become a delta meanwhile, the newest version stays complete
+                full_digests.append(digest)
+            previous = self.manifest.entries.get(rel_path)
+            if (chunks or not previous or 'digest' not in previous or previous.get('chunks')
+                    or previous['digest'] in current):
+                continue
+            replaced.append((rel_path, previous['digest'], digest))
+        return full_digests, replaced
+
+    def _create_archive_version(self, origin_paths, version_path, dirs, files):
+        """Write the whole version as one tar stream plus a sidecar index, in a single sequential pass.
+
+        Slow USB drives and network shares pay for every file created, so the
+        version becomes one archive file. The index records where each
+        member's data starts in the uncompressed stream, so listing needs no
+        archive access and single files can be pulled out by seeking.
+        """
+        archive_name = ARCHIVE_FILE_NAMES[self.compression]
+        index_files = []
+        with open(os.path.join(version_path, archive_name), 'wb') as raw:
+            if self.compression == "zstd":
+                stream = zstandard.ZstdCompressor(level=self.compression_level).stream_writer(raw, closefd=False)
+            elif self.compression == "zlib":
+                stream = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=min(9, self.compression_level), mtime=0)
+            else:
+                stream = raw
+            with tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                for source_dir, rel_dir in dirs:
+                    info = tarfile.TarInfo(rel_dir.replace(os.sep, "/"))
+                    info.type = tarfile.DIRTYPE
+                    try:
+                        dir_stat = os.stat(source_dir)
+                        info.mode = dir_stat.st_mode & 0o7777
+                        info.mtime = dir_stat.st_mtime
+                    except OSError:
+                        info.mode = 0o755
+                    tar.addfile(info)
+
+                unreadable = set()
+
+                def add_member(f, rel_path, stat):
+                    # The member is the file as opened, it may have changed since the scan
+                    size = os.fstat(f.fileno()).st_size
+                    info = tarfile.TarInfo(rel_path.replace(os.sep, "/"))
+                    info.size = size
+                    info.mtime = stat.st_mtime
+                    info.mode = stat.st_mode & 0o7777
+                    reader = _ArchiveMemberReader(f, size)
+                    tar.addfile(info, reader)
+                    if reader.error:
+                        # Its header is already in the stream, so it can't be retried, only left out of the index
+                        unreadable.add(rel_path)
+                        self.failures.append((rel_path, reader.error))
+                        return
+                    # Member data ends at the current offset minus its padding to whole tar blocks
+                    blocks = -(-size // tarfile.BLOCKSIZE)
+                    index_entry = {
+                        'path': rel_path,
+                        'offset': tar.offset - blocks * tarfile.BLOCKSIZE,
+                        'size': size,
+                        'mtime_ns': stat.st_mtime_ns,
+                        'mode': stat.st_mode & 0o7777
+                    }
+                    if self.record_checksums:
+                        index_entry['checksum'] = reader.hexdigest()
+                    index_files.append(index_entry)
+
+                def open_member(source_path, rel_path, stat):
+                    """Archive one file, returns the error if it could not be opened"""
+                    # Opening is where locked files fail, before anything is written to the stream,
+                    # so only that failure is safe to retry; errors writing the stream end the snapshot
+                    try:
+                        f = open(source_path, 'rb')
+                    except FileNotFoundError:
+                        # Deleted since the scan, it is left out without a retry
+                        vanished.add(rel_path)
+                        return None
+                    except OSError as e:
+                        return e.strerror or str(e)
+                    with f:
+                        add_member(f, rel_path, stat)
+                    return None
+
+                failed = {}
+                vanished = set()
+                for source_path, rel_path, stat in files:
+                    error = open_member(source_path, rel_path, stat)
+                    if error:
+                        # Locked files go to the retry queue and are appended after the rest
+                        failed[rel_path] = (source_path, stat, error)
+                    self._file_done(stat.st_size)
+                for delay in self.RETRY_DELAYS:
+                    if not failed:
+                        break
+                    self._wait(delay)
+                    for rel_path, (source_path, stat, _) in list(failed.items()):
+                        error = open_member(source_path, rel_path, stat)
+                        if error:
+                            failed[rel_path] = (source_path, stat, error)
+                        else:
+                            del failed[rel_path]
+                self.failures.extend((rel_path, message) for rel_path, (_, _, message) in sorted(failed.items()))
+            if stream is not raw:
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+            self.bytes_written += raw.tell()
+
+        index = {
+            'format': 1,
+            'created': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'archive': archive_name,
+            'codec': self.compression,
+            'origin_paths': list(origin_paths),
+            'dirs': sorted(rel_dir for _, rel_dir in dirs),
+            'files': index_files
+        }
+        # The index is written last, a version without one is an interrupted archive
+        with open(os.path.join(version_path, ARCHIVE_INDEX_NAME), 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        self.unsynced_paths.append(os.path.join(version_path, ARCHIVE_INDEX_NAME))
+
+        print(f"Archived version {os.path.basename(version_path)}: {len(index_files)} files in {archive_name}")
+        return {rel_path: SnapshotManifest.make_entry(stat) for _, rel_path, stat in files
+                if rel_path not in failed and rel_path not in unreadable and rel_path not in vanished}
+
+    def _previous_plain_version(self, exclude_path):
+        """Find the newest plain (non-store) version folder to link unchanged files from"""
+        for name in reversed(VersionCatalog(self.destination_path).load().names()):
+            path = os.path.join(self.destination_path, name)
+            if (path == exclude_path or not os.path.isdir(path)
+                    or is_store_version(path) or is_archive_version(path)):
+                continue
+            return path
+        return None
+
+    def _create_hardlink_version(self, version_path, dirs, files):
+        """Copy changed files and hardlink unchanged ones from the previous version, like rsync --link-dest"""
+        # Prefer the manifest of the last snapshot, it avoids stat calls on the previous version
+        previous_path = os.path.join(self.destination_path, self.manifest.version_name or "")
+        if (self.manifest.version_name and not is_store_version(previous_path)
+                and not is_archive_version(previous_path)):
+            use_manifest = True
+        else:
+            previous_path = self._previous_plain_version(version_path)
+            use_manifest = False
+
+        for source_dir, rel_dir in dirs:
+            os.makedirs(os.path.join(version_path, rel_dir), exist_ok=True)
+        # Linked files are the same file as in the previous version, so is their checksum
+        previous_checksums = {}
+        if self.record_checksums and previous_path:
+            previous_checksums = load_version_checksums(previous_path) or {}
+
+        def link_or_copy(source_path, rel_path, stat):
+            target_path = os.path.join(version_path, rel_path)
+            resumed = self.checkpoint.lookup(rel_path, stat)
+            if resumed and os.path.exists(target_path) and (resumed[2][1] or not self.record_checksums):
+                # Linked or copied by the interrupted snapshot this one resumes
+                return tuple(resumed[2])
+            if self.checkpoint.resumable:
+                # A staged file that isn't reused may be a hardlink into older versions, don't write through it
+                try:
+                    os.remove(target_path)
+                except FileNotFoundError:
+                    pass
+            linked = bool(previous_path) and self._link_unchanged(previous_path, rel_path, stat, target_path, use_manifest)
+            checksum = None
+            if linked:
+                if self.record_checksums:
+                    checksum = (previous_checksums[rel_path] if rel_path in previous_checksums
+                                else ContentStore.hash_file(target_path))
+            elif self.record_checksums:
+                checksum = self.copier.copy2_checksum(source_path, target_path)
+            else:
+                self.copier.copy2(source_path, target_path)
+            if not linked:
+                # Linked files were flushed with the version they came from
+                self.unsynced_paths.append(target_path)
+            return linked, checksum
+
+        files, results = self._map_files(files, link_or_copy)
+        if self.record_checksums:
+            self.checksums = {rel_path: checksum for (_, rel_path, _), (_, checksum) in zip(files, results)}
+        linked = sum(1 for was_linked, _ in results if was_linked)
+        copied = len(results) - linked
+        print(f"Created version {os.path.basename(version_path)}: {linked} hardlinked, {copied} copied")
+        return {rel_path: SnapshotManifest.make_entry(stat) for _, rel_path, stat in files}
+
+    def _link_unchanged(self, previous_path, rel_path, stat, target_path, use_manifest):
+        """Hardlink rel_path from the previous version if it is unchanged, returns True when linked"""
+        previous_file = os.path.join(previous_path, rel_path)
+        if use_manifest:
+            unchanged = self.manifest.unchanged(rel_path, stat) is not None
+        else:
+            # copy2 keeps mtimes, so a matching size and mtime means the file is unchanged
+            try:
+                previous_stat = os.stat(previous_file)
+                unchanged = (previous_stat.st_size == stat.st_size
+                             and previous_stat.st_mtime_ns == stat.st_mtime_ns)
+            except OSError:
+                unchanged = False
+
+        if not unchanged:
+            return False
+        try:
+            os.link(previous_file, target_path)
+            return True
+        except OSError as e:
+            # Filesystems without hardlinks (or at their link limit) get a real copy
+            print(f"Could not hardlink {rel_path}, copying instead: {str(e)}")
+            return False
+
+def restore_version(version_path, target_path, rel_path=None):
+    """Rebuild a version's files inside target_path, or only rel_path and what is below it"""
+    def selected(path):
+        return rel_path is None or path == rel_path or path.startswith(rel_path + os.sep)
+
+    if is_archive_version(version_path):
+        restore_archive_version(version_path, target_path, selected)
+        return
+
+    # Copy methods are probed in the destination's metadata folder, never in the user's restore folder
+    destination_path = os.path.dirname(version_path)
+    if not is_store_version(version_path):
+        # Plain folder versions are already browsable, just copy them out
+        copier = CopyBackend(os.path.join(destination_path, META_DIR_NAME))
+        source_path = os.path.join(version_path, rel_path) if rel_path else version_path
+        if os.path.isdir(source_path):
+            shutil.copytree(source_path, os.path.join(target_path, rel_path or ""),
+                            dirs_exist_ok=True, copy_function=copier.copy2)
+        else:
+            os.makedirs(os.path.dirname(os.path.join(target_path, rel_path)), exist_ok=True)
+            copier.copy2(source_path, os.path.join(target_path, rel_path))
+        return
+
+    manifest = load_version_manifest(version_path)
+    store = ContentStore(destination_path)
+    for rel_dir in manifest.get('dirs', []):
+        if selected(rel_dir):
+            os.makedirs(os.path.join(target_path, rel_dir), exist_ok=True)
+    for entry in manifest.get('files', []):
+        if not selected(entry['path']):
+            continue
+        file_path = os.path.join(target_path, entry['path'])
+        store.restore_file(entry['digest'], file_path, entry.get('chunks'))
+        try:
+            os.chmod(file_path, entry.get('mode', 0o644))
+            os.utime(file_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        except Exception as e:
+            print(f"Could not restore metadata for {file_path}: {str(e)}")
+
+def restore_archive_version(version_path, target_path, selected):
+    """Extract the members of an archive version accepted by selected(rel_path), in archive order"""
+    index = load_archive_index(version_path)
+    for rel_dir in index.get('dirs', []):
+        if selected(rel_dir):
+            os.makedirs(os.path.join(target_path, rel_dir), exist_ok=True)
+    entries = sorted((entry for entry in index.get('files', []) if selected(entry['path'])),
+                     key=lambda entry: entry['offset'])
+    if not entries:
+        return
+
+    # Forward seeks only, so compressed archives are decompressed at most once
+    with open_archive_stream(os.path.join(version_path, index['archive']), index.get('codec')) as stream:
+        for entry in entries:
+            stream.seek(entry['offset'])
+            file_path = os.path.join(target_path, entry['path'])
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            remaining = entry['size']
+            with open(file_path, 'wb') as f:
+                while remaining:
+                    data = stream.read(min(remaining, 1024 * 1024))
+                    if not data:
+                        raise ValueError(f"Archive ends inside {entry['path']}")
+                    f.write(data)
+                    remaining -= len(data)
+            try:
+                os.chmod(file_path, entry.get('mode', 0o644))
+                os.utime(file_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            except Exception as e:
+                print(f"Could not restore metadata for {file_path}: {str(e)}")
+
+def fsync_path(path, is_dir=False):
+    """Flush a file, or a folder's entries, to disk as far as the platform allows.
+
+    Returns the size of a flushed file, 0 for folders and paths that could not be opened.
+    """
+    if is_dir and os.name == 'nt':
+        # Windows cannot open folders for flushing, renames there are journaled anyway
+        return 0
+    try:
+        fd = os.open(path, os.O_RDONLY if is_dir or os.name != 'nt' else os.O_RDWR)
+    except OSError:
+        return 0
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Some network filesystems refuse fsync, the data is still written
+        pass
+    try:
+        return 0 if is_dir else os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+def trash_path(destination_path):
+    return os.path.join(destination_path, META_DIR_NAME, TRASH_DIR_NAME)
+
+def staging_path(destination_path, version_name=None):
+    staging_dir = os.path.join(destination_path, META_DIR_NAME, STAGING_DIR_NAME)
+    return os.path.join(staging_dir, version_name) if version_name else staging_dir
+
+def recover_staging(destination_path):
+    """Clean up what interrupted snapshots left in the staging folder, returns how many were removed.
+
+    Staged versions with a checkpoint are kept so the next snapshot of the
+    same origin can resume them, unless they are too old to be worth it.
+    """
+    staging_dir = staging_path(destination_path)
+    if not os.path.isdir(staging_dir):
+        return 0
+    names = os.listdir(staging_dir)
+    removed = 0
+    for name in names:
+        path = os.path.join(staging_dir, name)
+        if name.endswith(SnapshotCheckpoint.SUFFIX):
+            if not os.path.isdir(path[:-len(SnapshotCheckpoint.SUFFIX)]) or SnapshotCheckpoint.expired(path):
+                os.remove(path)
+            continue
+        checkpoint_path = path + SnapshotCheckpoint.SUFFIX
+        if os.path.isdir(path) and os.path.exists(checkpoint_path) and not SnapshotCheckpoint.expired(checkpoint_path):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+        if not os.path.isdir(os.path.join(destination_path, name)):
+            # Records are saved just before the rename, drop them if the rename never happened
+            remove_version_records(os.path.join(destination_path, name))
+    if removed:
+        print(f"Removed {removed} unfinished version(s) from {staging_dir}")
+    return removed
+
+def version_record_path(version_path, kind):
+    """Where a version's records of the given kind are kept, outside the browsable folder"""
+    destination_path, version_name = os.path.split(os.path.normpath(version_path))
+    return os.path.join(destination_path, META_DIR_NAME, kind, version_name + ".json")
+
+def version_checksums_path(version_path):
+    return version_record_path(version_path, "checksums")
+
+def load_version_checksums(version_path):
+    """Load {rel_path: checksum} recorded when a plain version was created, or None"""
+    try:
+        with open(version_checksums_path(version_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_version_checksums(version_path, checksums):
+    path = version_checksums_path(version_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(checksums, f)
+    os.replace(path + ".tmp", path)
+
+def load_version_skipped(version_path):
+    """Load [(rel_path, error message)] of files a partial version had to leave out, or None if it is complete"""
+    try:
+        with open(version_record_path(version_path, "skipped"), 'r', encoding='utf-8') as f:
+            return [tuple(skipped) for skipped in json.load(f)]
+    except (OSError, ValueError):
+        return None
+
+def save_version_skipped(version_path, skipped):
+    path = version_record_path(version_path, "skipped")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(skipped, f)
+    os.replace(path + ".tmp", path)
+
+def remove_version_records(version_path):
+    """Remove the checksums and skipped-file records kept for a deleted version"""
+    for kind in ("checksums", "skipped"):
+        try:
+            os.remove(version_record_path(version_path, kind))
+        except OSError:
+            pass
+
+class RateLimiter:
+    """Paces reads shared by several threads to max_bytes_per_second (0 means unlimited)"""
+    def __init__(self, max_bytes_per_second=0):
+        self.rate = max_bytes_per_second
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def consume(self, count):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_slot, now)
+            self.next_slot = start + count / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+class _HashingWriter:
+    """File-like target that hashes what is written to it instead of storing it"""
+    def __init__(self, limiter):
+        self.hasher = hashlib.blake2b(digest_size=32)
+        self.limiter = limiter
+
+    def write(self, data):
+        self.limiter.consume(len(data))
+        self.hasher.update(data)
+        return len(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+class _HashingReader:
+    """Wraps a source file and hashes everything read from it"""
+    def __init__(self, f):
+        self.f = f
+        self.hasher = hashlib.blake2b(digest_size=32)
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.hasher.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+class _ArchiveMemberReader(_HashingReader):
+    """Feeds tarfile exactly size bytes of a source file, zero-filled if the file shrinks or a read fails.
+
+    Once tarfile has written a member's header the stream must get the whole
+    member, or every later member is misaligned. A short or failed read is
+    padded instead and kept in self.error, so the member can be left out of
+    the archive index.
+    """
+    def __init__(self, f, size):
+        super().__init__(f)
+        self.remaining = size
+        self.error = None
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = b""
+        if self.error is None:
+            try:
+                data = super().read(size)
+            except OSError as e:
+                self.error = e.strerror or str(e)
+            if self.error is None and len(data) < size:
+                self.error = "File shrank while it was archived"
+        if self.error is not None:
+            data += bytes(size - len(data))
+        self.remaining -= len(data)
+        return data
+
+class ScrubCancelled(Exception):
+    """Raised inside the scrubber when a running verification is cancelled"""
+    pass
+
+class VersionScrubber:
+    """Re-hashes stored versions in parallel and reports files that are missing or corrupt.
+
+    Plain versions are checked against the checksums recorded when they were
+    created, store versions by re-hashing the objects they use (an object's
+    name is the hash of its contents) and archive versions member by member.
+    Uncompressed files are read through mmap, and a shared rate limit keeps a
+    background scrub from saturating the disk.
+    """
+    DEFAULT_WORKERS = 4
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, destination_path, workers=DEFAULT_WORKERS, max_bytes_per_second=0,
+                 progress_callback=None, cancel_event=None):
+        self.destination_path = destination_path
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(max_bytes_per_second)
+        self.store = ContentStore(destination_path)
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+
+    def list_versions(self):
+        return sorted(name for name in os.listdir(self.destination_path)
+                      if name != META_DIR_NAME and os.path.isdir(os.path.join(self.destination_path, name)))
+
+    def scrub(self, version_names=None):
+        """Verify the given versions (all by default), returns [(version name, rel path, problem)]"""
+        if version_names is None:
+            version_names = self.list_versions()
+        problems = []
+        tasks = []
+        objects = {}  # digest -> [(version name, rel path)] so shared objects are hashed once
+        for name in version_names:
+            version_path = os.path.join(self.destination_path, name)
+            try:
+                if is_store_version(version_path):
+                    for entry in load_version_manifest(version_path).get('files', []):
+                        for digest in entry.get('chunks') or [entry['digest']]:
+                            objects.setdefault(digest, []).append((name, entry['path']))
+                elif is_archive_version(version_path):
+                    tasks.append((self._scrub_archive, (name,)))
+                else:
+                    checksums = load_version_checksums(version_path)
+                    if checksums is None:
+                        problems.append((name, "", "no checksums recorded"))
+                        continue
+                    for rel_path, checksum in checksums.items():
+                        tasks.append((self._scrub_plain_file, (name, rel_path, checksum)))
+            except Exception as e:
+                problems.append((name, "", f"unreadable ({str(e)})"))
+        for digest, owners in objects.items():
+            tasks.append((self._scrub_object, (digest, owners)))
+
+        done = 0
+        self._report_progress(done, len(tasks))
+        # Bounded like the snapshot copy pool, hashing releases the GIL on large blocks
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="VersionDivingScrub")
+        pending = set()
+        try:
+            for func, args in tasks:
+                if len(pending) >= self.workers * 4:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        problems.extend(future.result())
+                        done += 1
+                    self._report_progress(done, len(tasks))
+                pending.add(pool.submit(func, *args))
+            for future in pending:
+                problems.extend(future.result())
+                done += 1
+                self._report_progress(done, len(tasks))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return sorted(problems)
+
+    def _report_progress(self, done, total):
+        if self.progress_callback is not None:
+            self.progress_callback(done, total)
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ScrubCancelled()
+
+    def hash_mapped(self, path):
+        """Hash a file through a read-only memory map"""
+        hasher = hashlib.blake2b(digest_size=32)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return hasher.hexdigest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, self.BLOCK_SIZE):
+                        self._check_cancelled()
+                        with view[offset:offset + self.BLOCK_SIZE] as block:
+                            self.limiter.consume(len(block))
+                            hasher.update(block)
+        return hasher.hexdigest()
+
+    def _scrub_plain_file(self, name, rel_path, checksum):
+        path = os.path.join(self.destination_path, name, rel_path)
+        if not os.path.isfile(path):
+            return [(name, rel_path, "missing")]
+        # Reflinked copies are not hashed when their version is created, only checked for presence
+        if checksum is not None and self.hash_mapped(path) != checksum:
+            return [(name, rel_path, "corrupt")]
+        return []
+
+    def _hash_object(self, digest):
+        """Hash the original contents of a stored object"""
+        if self.store.packs.lookup(digest) is None:
+            path, codec = self.store.find_object(digest)
+            if path is None:
+                raise FileNotFoundError(f"Stored object {digest} is missing")
+            if codec is None:
+                return self.hash_mapped(path)
+            if codec != "delta":
+                writer = _HashingWriter(self.limiter)
+                self.store._read_object_into(path, codec, writer)
+                return writer.hexdigest()
+        # Packed objects are small and deltas are limited in size, both fit in memory
+        data = self.store.read_object_bytes(digest)
+        self.limiter.consume(len(data))
+        return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+    def _scrub_object(self, digest, owners):
+        self._check_cancelled()
+        try:
+            problem = None if self._hash_object(digest) == digest else "corrupt"
+        except FileNotFoundError:
+            problem = "missing"
+        except ScrubCancelled:
+            raise
+        except Exception as e:
+            # Compressed data that no longer decompresses is as corrupt as a wrong hash
+            problem = f"corrupt ({str(e)})"
+        if problem is None:
+            return []
+        return [(name, rel_path, problem) for name, rel_path in owners]
+
+    def _scrub_archive(self, name):
+        """Stream through an archive version once, checking each member against the index"""
+        version_path = os.path.join(self.destination_path, name)
+        index = load_archive_index(version_path)
+        archive_path = os.path.join(version_path, index['archive'])
+        if not os.path.isfile(archive_path):
+            return [(name, index['archive'], "missing")]
+
+        problems = []
+        entries = sorted(index.get('files', []), key=lambda entry: entry['offset'])
+        try:
+            with open_archive_stream(archive_path, index.get('codec')) as stream:
+                for position, entry in enumerate(entries):
+                    self._check_cancelled()
+                    stream.seek(entry['offset'])
+                    hasher = hashlib.blake2b(digest_size=32)
+                    remaining = entry['size']
+                    while remaining:
+                        data = stream.read(min(remaining, self.BLOCK_SIZE))
+                        if not data:
+                            break
+                        self.limiter.consume(len(data))
+                        hasher.update(data)
+                        remaining -= len(data)
+                    if remaining:
+                        # The archive is truncated, nothing after this point can be read
+                        problems.extend((name, later['path'], "missing") for later in entries[position:])
+                        break
+                    if entry.get('checksum') and hasher.hexdigest() != entry['checksum']:
+                        problems.append((name, entry['path'], "corrupt"))
+        except ScrubCancelled:
+            raise
+        except Exception as e:
+            problems.append((name, index['archive'], f"corrupt ({str(e)})"))
+        return problems
+
+def format_size(num_bytes):
+    """Format a byte count for display"""
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+class SnapshotWorker(QThread):
+    """Runs a SnapshotEngine in a background thread so copying never blocks the GUI"""
+    progress = pyqtSignal(int, int, int, int)  # files done, files total, bytes done, bytes total
+    completed = pyqtSignal(str)  # version name
+    skipped = pyqtSignal(str)  # name of the unchanged last version
+    failed = pyqtSignal(str)  # error message
+    cancelled = pyqtSignal()
+
+    def __init__(self, destination_path, origin_paths, version_name, options, skip_if_unchanged=False,
+                 changes=None, parent=None):
+        super().__init__(parent)
+        self.origin_paths = list(origin_paths)
+        self.version_name = version_name
+        self.skip_if_unchanged = skip_if_unchanged
+        self.changes = changes
+        self.cancel_event = threading.Event()
+        # options holds the project's SnapshotEngine settings (see VersionDivingApp.get_snapshot_options)
+        self.engine = SnapshotEngine(destination_path,
+                                     progress_callback=self.progress.emit,
+                                     cancel_event=self.cancel_event,
+                                     **options)
+
+    def cancel(self):
+        """Ask the running snapshot to stop after the current file"""
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            version_path = self.engine.create_version(self.origin_paths, self.version_name,
+                                                      self.skip_if_unchanged, self.changes)
+            # The engine adds a counter when the name is already taken
+            self.completed.emit(os.path.basename(version_path))
+        except SnapshotUnchanged as e:
+            self.skipped.emit(e.version_name)
+        except SnapshotCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class ScrubWorker(QThread):
+    """Runs a VersionScrubber in a background thread"""
+    progress = pyqtSignal(int, int)  # items done, items total
+    completed = pyqtSignal(list)  # [(version name, rel path, problem)]
+    failed = pyqtSignal(str)  # error message
+    cancelled = pyqtSignal()
+
+    def __init__(self, destination_path, version_names=None, workers=VersionScrubber.DEFAULT_WORKERS,
+                 max_bytes_per_second=0, parent=None):
+        super().__init__(parent)
+        self.version_names = version_names
+        self.cancel_event = threading.Event()
+        self.scrubber = VersionScrubber(destination_path, workers, max_bytes_per_second,
+                                        progress_callback=self.progress.emit,
+                                        cancel_event=self.cancel_event)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            self.completed.emit(self.scrubber.scrub(self.version_names))
+        except ScrubCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class _WatchdogForwarder:
+    """Minimal watchdog event handler that forwards changed paths to a callback"""
+    # watchdog also reports opened and closed files on Linux, plain reads (our own copying too) are no change
+    CHANGE_EVENTS = {'created', 'modified', 'deleted', 'moved'}
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def dispatch(self, event):
+        if event.event_type not in self.CHANGE_EVENTS:
+            return
+        self.callback(event.src_path)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.callback(dest_path)
+
+class OriginWatcher(QObject):
+    """Watches the origin paths and asks for a snapshot once changes have settled.
+
+    Uses watchdog's recursive observers when installed, otherwise a
+    QFileSystemWatcher on every folder and file (up to MAX_WATCHED_PATHS).
+    A snapshot is requested after quiet_seconds without changes, but never
+    sooner than min_interval_seconds after the previous one and never later
+    than max_delay_seconds after the first unsaved change.
+    """
+    triggered = pyqtSignal()
+    path_changed = pyqtSignal(str)
+
+    MAX_WATCHED_PATHS = 20000
+
+    JOURNAL_FLUSH_MS = 2000
+
+    def __init__(self, origin_paths, quiet_seconds, min_interval_seconds, max_delay_seconds,
+                 trigger=True, journal=None, exclude_patterns=None, use_gitignore=False, parent=None):
+        super().__init__(parent)
+        self.origin_paths = list(origin_paths)
+        # Changes in excluded paths neither trigger versions nor get journaled
+        self.exclude_settings = (list(exclude_patterns or []), use_gitignore)
+        self.ignore_rules = IgnoreRules.for_origins(self.origin_paths, *self.exclude_settings)
+        # Without trigger the watcher only feeds the change journal
+        self.trigger = trigger
+        self.journal = journal
+        self.quiet_seconds = quiet_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.first_change = None
+        self.last_trigger = 0.0
+        self.observer = None
+        self.qt_watcher = None
+        self.watch_limit_reached = False
+
+        self.quiet_timer = QTimer(self)
+        self.quiet_timer.setSingleShot(True)
+        self.quiet_timer.timeout.connect(self._fire)
+
+        # Batch journal writes instead of rewriting the file for every event
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self._flush_journal)
+
+        # Changes from watchdog's thread arrive through a queued signal on the GUI thread
+        self.path_changed.connect(self._on_changed)
+
+        if self.journal is not None:
+            self.journal.start()
+        if WatchdogObserver is not None:
+            self._start_watchdog()
+        else:
+            self._start_qt_watcher()
+
+    def _start_watchdog(self):
+        self.observer = WatchdogObserver()
+        handler = _WatchdogForwarder(self.path_changed.emit)
+        for path in self.origin_paths:
+            if os.path.isdir(path):
+                self.observer.schedule(handler, path, recursive=True)
+            elif os.path.exists(path):
+                self.observer.schedule(handler, os.path.dirname(path), recursive=False)
+        self.observer.daemon = True
+        self.observer.start()
+
+    def _start_qt_watcher(self):
+        self.qt_watcher = QFileSystemWatcher(self)
+        self.qt_watcher.directoryChanged.connect(self._on_changed)
+        self.qt_watcher.fileChanged.connect(self._on_changed)
+        for path in self.origin_paths:
+            self._watch_tree(path)
+        if self.watch_limit_reached:
+            print(f"Watching only the first {self.MAX_WATCHED_PATHS} paths, install watchdog for large origins")
+            if self.journal is not None:
+                # Unwatched files would never show up in the journal
+                self.journal.stop()
+
+    def _watch_tree(self, path):
+        """Add a folder (recursively) or a file to the Qt watcher"""
+        if not os.path.isdir(path):
+            if os.path.exists(path):
+                self._add_qt_paths([path])
+            return
+
+        paths = []
+        stack = [path]
+        while stack:
+            dir_path = stack.pop()
+            paths.append(dir_path)
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if self.is_ignored(entry.path):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            # Qt only reports folder entries being added/removed, edits need a file watch
+                            paths.append(entry.path)
+            except OSError:
+                pass
+        self._add_qt_paths(paths)
+
+    def _add_qt_paths(self, paths):
+        watched = set(self.qt_watcher.files()) | set(self.qt_watcher.directories())
+        paths = [path for path in paths if path not in watched]
+        room = self.MAX_WATCHED_PATHS - len(watched)
+        if len(paths) > room:
+            self.watch_limit_reached = True
+            paths = paths[:max(0, room)]
+        if paths:
+            self.qt_watcher.addPaths(paths)
+
+    def is_ignored(self, path):
+        """Check whether a path falls under an origin's exclude rules"""
+        for origin_path, rules in self.ignore_rules.items():
+            if path.startswith(origin_path + os.sep):
+                rel_path = os.path.relpath(path, origin_path).replace(os.sep, "/")
+                return rules.ignores_path(rel_path, os.path.isdir(path))
+        return False
+
+    def set_exclude(self, exclude_patterns, use_gitignore):
+        """Switch to new exclude settings, watching folders that are no longer excluded"""
+        settings = (list(exclude_patterns), use_gitignore)
+        if settings == self.exclude_settings:
+            return
+        self.exclude_settings = settings
+        self._rebuild_ignore_rules()
+
+    def _rebuild_ignore_rules(self):
+        self.ignore_rules = IgnoreRules.for_origins(self.origin_paths, *self.exclude_settings)
+        if self.journal is not None:
+            # Paths excluded until now were never journaled
+            self.journal.invalidate()
+        if self.qt_watcher is not None:
+            for path in self.origin_paths:
+                self._watch_tree(path)
+
+    def _on_changed(self, path):
+        if self.exclude_settings[1] and os.path.basename(path) == ".gitignore" and os.path.dirname(path) in self.origin_paths:
+            self._rebuild_ignore_rules()
+        elif self.is_ignored(path):
+            return
+        if self.qt_watcher is not None:
+            if os.path.isdir(path):
+                # Pick up files and folders created inside a watched folder
+                watched = set(self.qt_watcher.files()) | set(self.qt_watcher.directories())
+                try:
+                    with os.scandir(path) as entries:
+                        new_paths = [entry.path for entry in entries if entry.path not in watched]
+                except OSError:
+                    new_paths = []
+                for new_path in new_paths:
+                    if not self.is_ignored(new_path):
+                        self._watch_tree(new_path)
+            elif os.path.exists(path) and path not in self.qt_watcher.files():
+                # Editors that save by renaming drop the original watch
+                self._add_qt_paths([path])
+
+        if self.journal is not None:
+            self.journal.record(path)
+            if not self.flush_timer.isActive():
+                self.flush_timer.start(self.JOURNAL_FLUSH_MS)
+
+        if not self.trigger:
+            return
+        if self.first_change is None:
+            self.first_change = time.monotonic()
+        self._schedule()
+
+    def _schedule(self):
+        now = time.monotonic()
+        delay = self.quiet_seconds
+        # Keep saving during long bursts of edits
+        delay = min(delay, self.first_change + self.max_delay_seconds - now)
+        # Don't create versions more often than the minimum interval
+        delay = max(delay, self.last_trigger + self.min_interval_seconds - now, 0)
+        self.quiet_timer.start(int(delay * 1000))
+
+    def retry_later(self):
+        """Try again after another quiet period, e.g. when a version was still being created"""
+        if self.first_change is None:
+            self.first_change = time.monotonic()
+        self.quiet_timer.start(int(self.quiet_seconds * 1000))
+
+    def _fire(self):
+        self.first_change = None
+        self.last_trigger = time.monotonic()
+        self.triggered.emit()
+
+    def _flush_journal(self):
+        self.journal.flush()
+
+    def stop(self):
+        """Stop watching and drop any pending trigger"""
+        self.quiet_timer.stop()
+        self.flush_timer.stop()
+        if self.journal is not None:
+            self.journal.stop()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+        if self.qt_watcher is not None:
+            paths = self.qt_watcher.files() + self.qt_watcher.directories()
+            if paths:
+                self.qt_watcher.removePaths(paths)
+
+class _ContentsNode:
+    """One row of the contents tree"""
+    __slots__ = ('parent', 'row', 'label', 'kind', 'path', 'is_dir', 'stored', 'children', 'listing', 'details')
+
+    def __init__(self, parent, label, kind, path=None, is_dir=False, stored=None):
+        self.parent = parent
+        self.row = len(parent.children) if parent is not None else 0
+        self.label = label
+        self.kind = kind
+        self.path = path
+        self.is_dir = is_dir
+        self.stored = stored  # (version path, rel path) of an entry of a store or archive version
+        self.children = []
+        # None until the folder is listed, then ContentsModel.SCANNING and ContentsModel.LISTED
+        self.listing = None if is_dir and stored is None else ContentsModel.LISTED
+        self.details = None  # (color, tooltip) of a version, read the first time it is shown
+
+class ContentsScanner(QObject):
+    """Lists folders for the contents tree on a background thread.
+
+    Uses os.scandir, whose DirEntry.is_dir() answers from the directory
+    listing without another stat, and streams what it finds back through
+    the batch signal BATCH_SIZE entries at a time. A slow network
+    destination never blocks the window and big folders fill in while
+    they are read.
+    """
+    BATCH_SIZE = 200
+    batch = pyqtSignal(int, list)  # scan token, [(label, kind, path, is_dir[, stored])]
+    finished = pyqtSignal(int, bool)  # scan token, whether the batches still need sorting
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.condition = threading.Condition()
+        self.jobs = collections.deque()
+        self.first_token = 0  # scans with lower tokens were cancelled
+        self.thread = None
+
+    def scan(self, token, kind, path, origin_paths=()):
+        """List the children of a tree node in the background, results arrive tagged with token"""
+        with self.condition:
+            self.jobs.append((token, kind, path, list(origin_paths)))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="VersionDivingScanner", daemon=True)
+                self.thread.start()
+
+    def cancel_before(self, token):
+        """Drop the queued and running scans with tokens lower than token"""
+        with self.condition:
+            self.first_token = token
+            self.jobs.clear()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.jobs:
+                    self.thread = None
+                    return
+                token, kind, path, origin_paths = self.jobs.popleft()
+            batches = 0
+            try:
+                for entries in self._list(kind, path, origin_paths):
+                    if token < self.first_token:
+                        break
+                    self.batch.emit(token, entries)
+                    batches += 1
+            except Exception as e:
+                self.batch.emit(token, [(f"Error listing directory: {str(e)}", ContentsModel.ERROR)])
+            sortable = kind in (ContentsModel.ORIGIN, ContentsModel.ENTRY) or (
+                kind == ContentsModel.VERSION and not (is_store_version(path) or is_archive_version(path)))
+            self.finished.emit(token, sortable and batches > 1)
+
+    def _list(self, kind, path, origin_paths):
+        """Yield the children of a node in batches of _ContentsNode arguments"""
+        if kind == ContentsModel.HEADER and path is None:
+            yield [(origin_path, ContentsModel.ORIGIN, origin_path, os.path.isdir(origin_path))
+                   for origin_path in origin_paths]
+            return
+        if kind == ContentsModel.HEADER:
+            # The versions of a destination come from its catalog, oldest first, never written from here
+            names = VersionCatalog(path).load(read_only=True).names()
+            for start in range(0, len(names), self.BATCH_SIZE):
+                yield [(name, ContentsModel.VERSION, os.path.join(path, name), True)
+                       for name in names[start:start + self.BATCH_SIZE]]
+            return
+        if kind == ContentsModel.VERSION and (is_store_version(path) or is_archive_version(path)):
+            # The top level of a stored version comes from its manifest or archive index
+            manifest = load_archive_index(path) if is_archive_version(path) else load_version_manifest(path)
+            top_dirs = {d.split(os.sep)[0] for d in manifest.get('dirs', [])}
+            top_files = {f['path'] for f in manifest.get('files', []) if os.sep not in f['path']}
+            yield [(name, ContentsModel.STORED, os.path.join(path, name), name in top_dirs, (path, name))
+                   for name in sorted(top_dirs | top_files)]
+            return
+        child_kind = ContentsModel.ORIGIN if kind == ContentsModel.ORIGIN else ContentsModel.ENTRY
+        entries = []
+        with os.scandir(path) as scanned:
+            for entry in scanned:
+                entries.append((entry.name, child_kind, entry.path, entry.is_dir()))
+                if len(entries) >= self.BATCH_SIZE:
+                    yield sorted(entries, key=lambda child: child[0].lower())
+                    entries = []
+        if entries:
+            yield sorted(entries, key=lambda child: child[0].lower())
+
+class ContentsModel(QAbstractItemModel):
+    """Tree of the origin paths and the destination's versions shown in the Contents tab.
+
+    Nothing is listed on the GUI thread: a group or folder is handed to the
+    ContentsScanner when it is expanded (canFetchMore/fetchMore) and its
+    rows are inserted as the batches come back. After a snapshot only the
+    new version's row is added. Icons are looked up once.
+    """
+    HEADER = 'header'
+    ORIGIN = 'origin'  # an origin path or something inside one
+    VERSION = 'version'
+    ENTRY = 'entry'  # a file or folder inside a plain version
+    STORED = 'stored'  # a top-level entry of a store or archive version
+    ERROR = 'error'
+    SCANNING = 'scanning'
+    LISTED = 'listed'
+
+    def __init__(self, style, parent=None):
+        super().__init__(parent)
+        self.folder_icon = style.standardIcon(QStyle.StandardPixmap.SP_DirIcon)
+        self.file_icon = style.standardIcon(QStyle.StandardPixmap.SP_FileIcon)
+        self.root = _ContentsNode(None, "", self.HEADER)
+        self.origin_paths = []
+        self.scanner = ContentsScanner(self)
+        self.scanner.batch.connect(self._add_batch)
+        self.scanner.finished.connect(self._scan_finished)
+        self.scans = {}  # token -> [node, names collected by a version sync or None]
+        self.next_token = 0
+
+    def set_paths(self, origin_paths, destination_path):
+        """Show new origin paths and destination, the groups are listed again when expanded"""
+        self.beginResetModel()
+        self.scanner.cancel_before(self.next_token)
+        self.scans.clear()
+        self.root.children = []
+        self.origin_paths = list(origin_paths)
+        if origin_paths:
+            self._add_child(self.root, "Origin", self.HEADER, None, True)
+        if destination_path:
+            self._add_child(self.root, f"Destination: {destination_path}", self.HEADER, destination_path, True)
+        self.endResetModel()
+
+    def clear(self):
+        self.set_paths([], "")
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def _index_of(self, node):
+        return QModelIndex() if node is self.root else self.createIndex(node.row, 0, node)
+
+    def _destination_node(self):
+        for node in self.root.children:
+            if node.kind == self.HEADER and node.path:
+                return node
+        return None
+
+    def _add_child(self, parent, label, kind, path=None, is_dir=False, stored=None):
+        child = _ContentsNode(parent, label, kind, path, is_dir, stored)
+        parent.children.append(child)
+        return child
+
+    def _start_scan(self, node, sync=False):
+        token = self.next_token
+        self.next_token += 1
+        self.scans[token] = [node, [] if sync else None]
+        self.scanner.scan(token, node.kind, node.path, self.origin_paths)
+
+    def add_version(self, name):
+        """Add the row of a new version instead of listing the destination again"""
+        node = self._destination_node()
+        if node is None or node.listing != self.LISTED:
+            # Not listed yet, or the running listing reads the catalog after the version was added
+            return
+        if any(child.label == name for child in node.children):
+            return
+        self.beginInsertRows(self._index_of(node), len(node.children), len(node.children))
+        self._add_child(node, name, self.VERSION, os.path.join(node.path, name), True)
+        self.endInsertRows()
+
+    def sync_versions(self):
+        """Drop the rows of deleted versions, and add missing ones, from the catalog in the background"""
+        node = self._destination_node()
+        if node is not None and node.listing is not None:
+            # Scans run in order, so this one is applied after a listing that is still running
+            self._start_scan(node, sync=True)
+
+    def _apply_version_sync(self, node, names):
+        parent = self._index_of(node)
+        wanted = set(names)
+        for row in reversed(range(len(node.children))):
+            if node.children[row].kind == self.VERSION and node.children[row].label not in wanted:
+                self.beginRemoveRows(parent, row, row)
+                del node.children[row]
+                for child in node.children[row:]:
+                    child.row -= 1
+                self.endRemoveRows()
+        shown = {child.label for child in node.children}
+        for name in names:
+            if name not in shown:
+                self.add_version(name)
+
+    def _add_batch(self, token, entries):
+        scan = self.scans.get(token)
+        if scan is None:
+            return
+        node, sync_names = scan
+        if sync_names is not None:
+            sync_names.extend(entry[0] for entry in entries if entry[1] == self.VERSION)
+            return
+        self.beginInsertRows(self._index_of(node), len(node.children), len(node.children) + len(entries) - 1)
+        for entry in entries:
+            self._add_child(node, *entry)
+        self.endInsertRows()
+
+    def _scan_finished(self, token, needs_sort):
+        scan = self.scans.pop(token, None)
+        if scan is None:
+            return
+        node, sync_names = scan
+        if sync_names is not None:
+            self._apply_version_sync(node, sync_names)
+            return
+        node.listing = self.LISTED
+        if needs_sort:
+            self._sort_children(node)
+        if not node.children:
+            # Lets the view drop the expand arrow of an empty folder
+            index = self._index_of(node)
+            self.dataChanged.emit(index, index)
+
+    def _sort_children(self, node):
+        """Sort rows that arrived in several batches by name, keeping the view's selection and expanded rows"""
+        self.layoutAboutToBeChanged.emit()
+        node.children.sort(key=lambda child: child.label.lower())
+        for row, child in enumerate(node.children):
+            child.row = row
+        for index in self.persistentIndexList():
+            child = index.internalPointer()
+            if child.parent is node and index.row() != child.row:
+                self.changePersistentIndex(index, self.createIndex(child.row, 0, child))
+        self.layoutChanged.emit()
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if column != 0 or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        # Folders get an expand arrow before they are listed
+        return node.listing != self.LISTED or bool(node.children)
+
+    def canFetchMore(self, parent):
+        return self.node(parent).listing is None
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        if node.listing is None:
+            node.listing = self.SCANNING
+            self._start_scan(node)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return node.label
+        if role == Qt.ItemDataRole.DecorationRole:
+            if node.kind in (self.HEADER, self.ERROR):
+                return None
+            return self.folder_icon if node.is_dir else self.file_icon
+        if node.kind == self.HEADER:
+            if role == Qt.ItemDataRole.BackgroundRole:
+                return QColor(240, 240, 240)
+            if role == Qt.ItemDataRole.ForegroundRole:
+                return QColor(0, 0, 0)
+        elif node.kind == self.ERROR:
+            if role == Qt.ItemDataRole.ForegroundRole:
+                return QColor(255, 0, 0)
+        elif node.kind == self.VERSION and role in (Qt.ItemDataRole.ForegroundRole, Qt.ItemDataRole.ToolTipRole):
+            color, tooltip = self._version_details(node)
+            return color if role == Qt.ItemDataRole.ForegroundRole else tooltip
+        return None
+
+    def _version_details(self, node):
+        """Color and tooltip of a version row, only read for rows the view actually shows"""
+        if node.details is None:
+            skipped = load_version_skipped(node.path)
+            if skipped:
+                # Partial versions are missing files that were locked while they were created
+                node.details = (QColor(200, 120, 0), f"Partial version, {len(skipped)} file(s) skipped:\n" +
+                                "\n".join(rel_path for rel_path, _ in skipped[:20]))
+            else:
+                node.details = (None, None)
+        return node.details
+
 class VersionDivingApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -6176,6 +10125,11 @@ class VersionDivingApp(QMainWindow):
         self.all_floating_timers = []
         
         self.is_creating_version = False  # Flag to track when version creation is in progress
+        self.snapshot_worker = None  # Background thread copying the current version
+        self.snapshot_job = None  # Details of the version being created
+        self.extracted_dirs = []  # Temporary folders holding files opened from stored versions
+        self.scrub_worker = None  # Background thread verifying stored versions
+        self.scrub_job = None  # Details of the running verification
         # Store all project tabs
         self.project_tabs = []
         self.current_project_index = 0
@@ -6212,6 +10166,15 @@ class VersionDivingApp(QMainWindow):
             # Don't load the project automatically
             # self.load_project(most_recent)
         
+        # Clear out versions a crash or power loss left unfinished, before any snapshot can start
+        for destination_path in {project.get('destination_path') for project in self.recent_projects}:
+            if destination_path and os.path.isdir(destination_path):
+                try:
+                    recover_staging(destination_path)
+                    VersionReaper.shared().reap_trash(destination_path)
+                except Exception as e:
+                    print(f"Error recovering unfinished versions in {destination_path}: {str(e)}")
+        
         # Apply floating timer setting
         self.toggle_floating_timer(show_floating_timer)
         
@@ -6237,13 +10200,17 @@ class VersionDivingApp(QMainWindow):
         show_action = QAction("Show", self)
         quit_action = QAction("Exit", self)
         create_action = QAction("Create Version", self)
+        self.cancel_snapshot_action = QAction("Cancel Version Creation", self)
+        self.cancel_snapshot_action.setEnabled(False)
         
         show_action.triggered.connect(self.show)
         quit_action.triggered.connect(self.full_exit)
         create_action.triggered.connect(self.create_version)
+        self.cancel_snapshot_action.triggered.connect(self.cancel_version_creation)
         
         self.tray_menu.addAction(show_action)
         self.tray_menu.addAction(create_action)
+        self.tray_menu.addAction(self.cancel_snapshot_action)
         self.tray_menu.addSeparator()
         self.tray_menu.addAction(quit_action)
         
@@ -6274,6 +10241,10 @@ class VersionDivingApp(QMainWindow):
             countdown_timer = project.get('countdown_timer')
             if countdown_timer and hasattr(countdown_timer, 'isActive') and countdown_timer.isActive():
                 countdown_timer.stop()
+                
+            watcher = project.get('origin_watcher')
+            if watcher:
+                watcher.stop()
         
         # Destroy all floating timers
         for timer in self.all_floating_timers:
@@ -6281,6 +10252,18 @@ class VersionDivingApp(QMainWindow):
                 timer.close()
         self.all_floating_timers.clear()
         
+        # Remove files extracted from stored versions for opening (some may still be open)
+        for extract_dir in self.extracted_dirs:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+        
+        # Stop a version that is still being created, the engine removes the partial folder
+        if self.snapshot_worker and self.snapshot_worker.isRunning():
+            self.snapshot_worker.cancel()
+            self.snapshot_worker.wait()
+        if self.scrub_worker and self.scrub_worker.isRunning():
+            self.scrub_worker.cancel()
+            self.scrub_worker.wait()
+        
         # Save settings
         self.save_recent_projects()
         
@@ -6328,11 +10311,39 @@ class VersionDivingApp(QMainWindow):
             'custom_format': self.custom_format_edit.text(),
             'auto_delete': self.auto_delete_check.isChecked(),
             'version_limit': self.version_limit_spin.value(),
+            'retention_policy': self.retention_policy_combo.currentIndex(),
+            'retention_all_hours': self.retention_all_hours_spin.value(),
+            'retention_hourly_days': self.retention_hourly_days_spin.value(),
+            'retention_daily_days': self.retention_daily_days_spin.value(),
+            'retention_weekly_weeks': self.retention_weekly_weeks_spin.value(),
+            'max_size_enabled': self.max_size_check.isChecked(),
+            'max_size_gb': self.max_size_spin.value(),
+            'min_free_enabled': self.min_free_check.isChecked(),
+            'min_free_percent': self.min_free_spin.value(),
+            'storage_mode': self.storage_mode_combo.currentIndex(),
+            'copy_workers': self.copy_workers_spin.value(),
+            'chunk_large_files': self.chunk_large_files_check.isChecked(),
+            'compression': self.compression_combo.currentIndex(),
+            'compression_level': self.compression_level_spin.value(),
+            'delta_versions': self.delta_versions_check.isChecked(),
+            'pack_small_files': self.pack_small_files_check.isChecked(),
+            'record_checksums': self.record_checksums_check.isChecked(),
+            'allow_partial': self.allow_partial_check.isChecked(),
+            'scrub_rate_limit': self.scrub_rate_spin.value(),
+            'exclude_patterns': self.get_exclude_patterns(),
+            'use_gitignore': self.use_gitignore_check.isChecked(),
             'auto_create': self.auto_create_check.isChecked(),
             'interval_value': self.interval_spin.value(),
             'interval_unit': self.interval_unit.currentIndex(),
+            'trigger_mode': self.trigger_mode_combo.currentIndex(),
+            'quiet_seconds': self.quiet_seconds_spin.value(),
+            'min_interval_minutes': self.min_interval_spin.value(),
+            'max_delay_minutes': self.max_delay_spin.value(),
             'create_on_start': self.create_on_start_check.isChecked(),
             'auto_create_on_load': self.auto_create_on_load_check.isChecked(),
+            'skip_unchanged': self.skip_unchanged_check.isChecked(),
+            'hash_contents': self.hash_contents_check.isChecked(),
+            'change_journal': self.change_journal_check.isChecked(),
             'show_floating_timer': self.show_floating_timer_check.isChecked(),
             'timer_opacity': self.timer_opacity_slider.value(),
             'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -6386,6 +10397,17 @@ class VersionDivingApp(QMainWindow):
         status_bar = self.statusBar()
         status_bar.showMessage("Copyright © Version Diving - HE Design")
         
+        # Progress of the version being created in the background (hidden while idle)
+        self.snapshot_progress_label = QLabel()
+        self.snapshot_progress_bar = QProgressBar()
+        self.snapshot_progress_bar.setRange(0, 100)
+        self.snapshot_progress_bar.setMaximumWidth(200)
+        self.cancel_snapshot_btn = QPushButton("Cancel")
+        self.cancel_snapshot_btn.clicked.connect(self.cancel_version_creation)
+        for widget in (self.snapshot_progress_label, self.snapshot_progress_bar, self.cancel_snapshot_btn):
+            status_bar.addPermanentWidget(widget)
+            widget.hide()
+        
         # Create main widget and layout
         main_widget = QWidget()
         main_layout = QVBoxLayout(main_widget)
@@ -6431,78 +10453,14 @@ class VersionDivingApp(QMainWindow):
         # Update Open buttons
         self.open_origin_btn.setEnabled(has_origin)
         self.open_dest_btn.setEnabled(has_dest)
+        self.verify_versions_btn.setEnabled(has_dest or self.scrub_worker is not None)
     
     def update_contents_list(self):
-        """Update the contents list with origin and destination files"""
-        self.contents_list.clear()
-        
-        # Add origin contents
-        if self.origin_paths:
-            origin_header = QListWidgetItem("--- ORIGIN ---")
-            origin_header.setBackground(QColor(240, 240, 240))
-            origin_header.setForeground(QColor(0, 0, 0))
-            self.contents_list.addItem(origin_header)
-            
-            for path in self.origin_paths:
-                item = QListWidgetItem(path)
-                if os.path.isdir(path):
-                    item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-                    # Also list the contents of the directory
-                    try:
-                        for subitem in os.listdir(path):
-                            subitem_path = os.path.join(path, subitem)
-                            sublist_item = QListWidgetItem(f"  {subitem}")
-                            if os.path.isdir(subitem_path):
-                                sublist_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-                            else:
-                                sublist_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
-                            self.contents_list.addItem(sublist_item)
-                    except Exception as e:
-                        error_item = QListWidgetItem(f"  Error listing directory: {str(e)}")
-                        error_item.setForeground(QColor(255, 0, 0))
-                        self.contents_list.addItem(error_item)
-                else:
-                    item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
-                self.contents_list.addItem(item)
-        
-        # Add destination contents
-        if self.destination_path:
-            self.contents_list.addItem("")
-            dest_header = QListWidgetItem("--- DESTINATION ---")
-            dest_header.setBackground(QColor(240, 240, 240))
-            dest_header.setForeground(QColor(0, 0, 0))
-            self.contents_list.addItem(dest_header)
-            
-            dest_item = QListWidgetItem(self.destination_path)
-            dest_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-            self.contents_list.addItem(dest_item)
-            
-            try:
-                for item in os.listdir(self.destination_path):
-                    item_path = os.path.join(self.destination_path, item)
-                    list_item = QListWidgetItem(f"  {item}")
-                    if os.path.isdir(item_path):
-                        list_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-                        # List the contents of version folders (one level)
-                        try:
-                            for subitem in os.listdir(item_path):
-                                subitem_path = os.path.join(item_path, subitem)
-                                sublist_item = QListWidgetItem(f"    {subitem}")
-                                if os.path.isdir(subitem_path):
-                                    sublist_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-                                else:
-                                    sublist_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
-                                self.contents_list.addItem(sublist_item)
-                        except Exception:
-                            # Silently ignore errors listing sub-directories
-                            pass
-                    else:
-                        list_item.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
-                    self.contents_list.addItem(list_item)
-            except Exception as e:
-                error_item = QListWidgetItem(f"Error listing directory: {str(e)}")
-                error_item.setForeground(QColor(255, 0, 0))
-                self.contents_list.addItem(error_item)
+        """Show the origin paths and the destination's versions, folders are listed in the background when expanded"""
+        self.contents_model.set_paths(self.origin_paths, self.destination_path)
+        # Both groups start out open
+        for row in range(self.contents_model.rowCount()):
+            self.contents_view.expand(self.contents_model.index(row, 0))
     
     def add_project_tab(self, name="New Project"):
         """Add a new project tab with all necessary widgets"""
@@ -6586,6 +10544,12 @@ class VersionDivingApp(QMainWindow):
         self.open_dest_btn.setEnabled(False)
         dest_layout.addWidget(self.open_dest_btn)
         
+        self.verify_versions_btn = QPushButton("Verify Versions")
+        self.verify_versions_btn.setToolTip("Re-read every version in the destination and report missing or damaged files")
+        self.verify_versions_btn.clicked.connect(lambda: self.verify_versions())
+        self.verify_versions_btn.setEnabled(False)
+        dest_layout.addWidget(self.verify_versions_btn)
+        
         dest_group.setLayout(dest_layout)
         selection_layout.addWidget(dest_group)
         
@@ -6696,16 +10660,19 @@ class VersionDivingApp(QMainWindow):
         contents_widget = QWidget()
         contents_layout = QVBoxLayout(contents_widget)
         
-        self.contents_list = QListWidget()
-        # Set up icons for the contents list
-        folder_icon = self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon)
-        file_icon = self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon)
-        self.contents_list.setIconSize(QSize(16, 16))
-        # Add double-click and context menu support
-        self.contents_list.itemDoubleClicked.connect(self.open_content_item)
-        self.contents_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.contents_list.customContextMenuRequested.connect(self.show_contents_context_menu)
-        contents_layout.addWidget(self.contents_list)
+        self.contents_model = ContentsModel(self.style(), self)
+        self.contents_view = QTreeView()
+        self.contents_view.setModel(self.contents_model)
+        self.contents_view.setHeaderHidden(True)
+        # Rows all have the same height, the view doesn't need to measure each one
+        self.contents_view.setUniformRowHeights(True)
+        self.contents_view.setIconSize(QSize(16, 16))
+        # Add double-click and context menu support, double-click opens instead of expanding
+        self.contents_view.setExpandsOnDoubleClick(False)
+        self.contents_view.doubleClicked.connect(self.open_content_item)
+        self.contents_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.contents_view.customContextMenuRequested.connect(self.show_contents_context_menu)
+        contents_layout.addWidget(self.contents_view)
         
         contents_scroll.setWidget(contents_widget)
         self.tab_widget.addTab(contents_scroll, "Contents")
@@ -6787,6 +10754,18 @@ class VersionDivingApp(QMainWindow):
         self.auto_delete_check.stateChanged.connect(self.toggle_version_limit)
         auto_delete_layout.addWidget(self.auto_delete_check)
         
+        policy_layout = QHBoxLayout()
+        policy_layout.addWidget(QLabel("Policy:"))
+        self.retention_policy_combo = QComboBox()
+        self.retention_policy_combo.addItems(RETENTION_POLICIES)
+        self.retention_policy_combo.setToolTip("Keep the most recent: keeps a fixed number of the newest versions.\n"
+                                               "Tiered: keeps every version for a while, then one per hour,\n"
+                                               "then one per day, then one per week.")
+        self.retention_policy_combo.setEnabled(False)
+        self.retention_policy_combo.currentIndexChanged.connect(self.update_retention_controls)
+        policy_layout.addWidget(self.retention_policy_combo)
+        auto_delete_layout.addLayout(policy_layout)
+        
         limit_layout = QHBoxLayout()
         limit_layout.addWidget(QLabel("Keep only the most recent:"))
         self.version_limit_spin = QSpinBox()
@@ -6797,9 +10776,186 @@ class VersionDivingApp(QMainWindow):
         limit_layout.addWidget(QLabel("versions"))
         auto_delete_layout.addLayout(limit_layout)
         
+        # Tiered policy: all versions, then hourly, daily and weekly ones
+        tiers_layout = QGridLayout()
+        self.retention_all_hours_spin = QSpinBox()
+        self.retention_all_hours_spin.setRange(0, 720)
+        self.retention_all_hours_spin.setValue(1)
+        self.retention_all_hours_spin.setSuffix(" h")
+        self.retention_hourly_days_spin = QSpinBox()
+        self.retention_hourly_days_spin.setRange(0, 365)
+        self.retention_hourly_days_spin.setValue(1)
+        self.retention_hourly_days_spin.setSuffix(" days")
+        self.retention_daily_days_spin = QSpinBox()
+        self.retention_daily_days_spin.setRange(0, 3650)
+        self.retention_daily_days_spin.setValue(30)
+        self.retention_daily_days_spin.setSuffix(" days")
+        self.retention_weekly_weeks_spin = QSpinBox()
+        self.retention_weekly_weeks_spin.setRange(0, 5200)
+        self.retention_weekly_weeks_spin.setValue(0)
+        self.retention_weekly_weeks_spin.setSuffix(" weeks")
+        self.retention_weekly_weeks_spin.setSpecialValueText("Forever")
+        tier_rows = [
+            ("Keep all versions for:", self.retention_all_hours_spin),
+            ("Then one per hour up to:", self.retention_hourly_days_spin),
+            ("Then one per day up to:", self.retention_daily_days_spin),
+            ("Then one per week for:", self.retention_weekly_weeks_spin)
+        ]
+        self.retention_tier_spins = []
+        for row, (label, spin) in enumerate(tier_rows):
+            tiers_layout.addWidget(QLabel(label), row, 0)
+            tiers_layout.addWidget(spin, row, 1)
+            spin.setEnabled(False)
+            self.retention_tier_spins.append(spin)
+        auto_delete_layout.addLayout(tiers_layout)
+        
+        # Byte budgets, on top of the policy above
+        max_size_layout = QHBoxLayout()
+        self.max_size_check = QCheckBox("Keep the destination under:")
+        self.max_size_check.setEnabled(False)
+        self.max_size_check.stateChanged.connect(self.update_retention_controls)
+        max_size_layout.addWidget(self.max_size_check)
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(1, 100000)
+        self.max_size_spin.setValue(20)
+        self.max_size_spin.setSuffix(" GB")
+        self.max_size_spin.setEnabled(False)
+        max_size_layout.addWidget(self.max_size_spin)
+        auto_delete_layout.addLayout(max_size_layout)
+        
+        min_free_layout = QHBoxLayout()
+        self.min_free_check = QCheckBox("Always leave free on the drive:")
+        self.min_free_check.setEnabled(False)
+        self.min_free_check.stateChanged.connect(self.update_retention_controls)
+        min_free_layout.addWidget(self.min_free_check)
+        self.min_free_spin = QSpinBox()
+        self.min_free_spin.setRange(1, 90)
+        self.min_free_spin.setValue(10)
+        self.min_free_spin.setSuffix(" %")
+        self.min_free_spin.setEnabled(False)
+        min_free_layout.addWidget(self.min_free_spin)
+        auto_delete_layout.addLayout(min_free_layout)
+        
         auto_delete_group.setLayout(auto_delete_layout)
         settings_layout.addWidget(auto_delete_group)
         
+        # Storage settings
+        storage_group = QGroupBox("Storage")
+        storage_layout = QVBoxLayout()
+        
+        storage_mode_layout = QHBoxLayout()
+        storage_mode_layout.addWidget(QLabel("Storage mode:"))
+        self.storage_mode_combo = QComboBox()
+        self.storage_mode_combo.addItems(STORAGE_MODES)
+        self.storage_mode_combo.setToolTip("Deduplicated Store keeps each file's contents once and saves versions as small manifests.\n"
+                                           "Use 'Restore Version' in the Contents tab to get the files back.\n"
+                                           "Hardlink Unchanged Files keeps plain folders but links files that did not change,\n"
+                                           "so editing a file inside a version folder also changes it in older versions.\n"
+                                           "Single Archive writes each version as one tar file (compressed with the setting below),\n"
+                                           "which is fastest on slow USB drives and network shares.")
+        storage_mode_layout.addWidget(self.storage_mode_combo)
+        storage_layout.addLayout(storage_mode_layout)
+        
+        copy_workers_layout = QHBoxLayout()
+        copy_workers_layout.addWidget(QLabel("Copy threads:"))
+        self.copy_workers_spin = QSpinBox()
+        self.copy_workers_spin.setRange(1, 64)
+        self.copy_workers_spin.setValue(SnapshotEngine.DEFAULT_COPY_WORKERS)
+        self.copy_workers_spin.setToolTip("Number of files copied in parallel. Raise it for fast SSDs and network shares, use 1 for slow USB drives.")
+        copy_workers_layout.addWidget(self.copy_workers_spin)
+        copy_workers_layout.addStretch()
+        storage_layout.addLayout(copy_workers_layout)
+        
+        compression_layout = QHBoxLayout()
+        compression_layout.addWidget(QLabel("Compression:"))
+        self.compression_combo = QComboBox()
+        self.compression_combo.addItems(COMPRESSION_LABELS)
+        if zstandard is None:
+            # Keep the indexes stable but don't offer a codec that isn't installed
+            self.compression_combo.model().item(COMPRESSION_CODECS.index("zstd")).setEnabled(False)
+            self.compression_combo.setItemText(COMPRESSION_CODECS.index("zstd"), "zstd (not installed)")
+        self.compression_combo.setToolTip("Compress stored files in the Deduplicated Store. Files that are already compressed,\n"
+                                          "like images, videos and archives, are stored as they are.\n"
+                                          "Single Archive versions are written as .tar.gz (zlib) or .tar.zst (zstd).")
+        compression_layout.addWidget(self.compression_combo)
+        compression_layout.addWidget(QLabel("Level:"))
+        self.compression_level_spin = QSpinBox()
+        self.compression_level_spin.setRange(1, 22)
+        self.compression_level_spin.setValue(DEFAULT_COMPRESSION_LEVEL)
+        self.compression_level_spin.setToolTip("Higher levels are smaller but slower. zlib uses levels up to 9, zstd up to 22.")
+        compression_layout.addWidget(self.compression_level_spin)
+        compression_layout.addStretch()
+        storage_layout.addLayout(compression_layout)
+        
+        self.chunk_large_files_check = QCheckBox("Store only the changed parts of large files (Deduplicated Store)")
+        self.chunk_large_files_check.setToolTip(f"Files of {format_size(ContentStore.CHUNK_THRESHOLD)} or more are split into chunks, "
+                                                "so databases and other big files that change a little at a time\n"
+                                                "only add the chunks that changed to each version.")
+        storage_layout.addWidget(self.chunk_large_files_check)
+        
+        self.delta_versions_check = QCheckBox("Keep older versions as differences to newer ones (Deduplicated Store)")
+        self.delta_versions_check.setToolTip("The newest version is always stored complete. Files it replaced are kept as deltas,\n"
+                                             "which saves a lot of space for text files that change a few lines at a time\n"
+                                             "but makes restoring old versions slower.")
+        storage_layout.addWidget(self.delta_versions_check)
+        
+        self.pack_small_files_check = QCheckBox("Pack small files together (Deduplicated Store)")
+        self.pack_small_files_check.setToolTip("Files under 64 KB are appended to a few large pack files instead of\n"
+                                               "one object file each, so creating and deleting versions of projects\n"
+                                               "with many tiny files stays fast.")
+        storage_layout.addWidget(self.pack_small_files_check)
+        
+        self.record_checksums_check = QCheckBox("Record file checksums so versions can be verified")
+        self.record_checksums_check.setToolTip("Each file is hashed while it is copied into its version. 'Verify Versions' re-hashes\n"
+                                               "the stored files and reports any that are missing or damaged.\n"
+                                               "Copies are read through the hash instead of the faster in-kernel copy;\n"
+                                               "reflinked copies read nothing and are only checked for presence.\n"
+                                               "Deduplicated Store versions can always be verified.")
+        storage_layout.addWidget(self.record_checksums_check)
+        
+        self.allow_partial_check = QCheckBox("Save partial versions when files are locked")
+        self.allow_partial_check.setToolTip("Files another program keeps locked are retried a few times. If they stay locked,\n"
+                                            "the version is saved without them and marked as partial. When unchecked, the version\n"
+                                            "is not saved and the next attempt continues where this one stopped.")
+        storage_layout.addWidget(self.allow_partial_check)
+        
+        scrub_rate_layout = QHBoxLayout()
+        scrub_rate_layout.addWidget(QLabel("Verify speed limit:"))
+        self.scrub_rate_spin = QSpinBox()
+        self.scrub_rate_spin.setRange(0, 10000)
+        self.scrub_rate_spin.setSuffix(" MB/s")
+        self.scrub_rate_spin.setSpecialValueText("Unlimited")
+        self.scrub_rate_spin.setToolTip("Limit how fast 'Verify Versions' reads the destination, so it can run in the background.")
+        scrub_rate_layout.addWidget(self.scrub_rate_spin)
+        scrub_rate_layout.addStretch()
+        storage_layout.addLayout(scrub_rate_layout)
+        
+        storage_group.setLayout(storage_layout)
+        settings_layout.addWidget(storage_group)
+        
+        # Exclude settings
+        exclude_group = QGroupBox("Exclude")
+        exclude_layout = QVBoxLayout()
+        
+        exclude_layout.addWidget(QLabel("Files and folders to leave out of versions, one pattern per line (.gitignore syntax):"))
+        self.exclude_patterns_edit = QPlainTextEdit()
+        self.exclude_patterns_edit.setPlaceholderText("node_modules/\n*.log\n/build/\n!keep.log")
+        self.exclude_patterns_edit.setMaximumHeight(100)
+        exclude_layout.addWidget(self.exclude_patterns_edit)
+        
+        exclude_options_layout = QHBoxLayout()
+        self.use_gitignore_check = QCheckBox("Also use each origin folder's .gitignore")
+        exclude_options_layout.addWidget(self.use_gitignore_check)
+        exclude_options_layout.addStretch()
+        add_common_btn = QPushButton("Add Common Patterns")
+        add_common_btn.setToolTip("Exclude version control folders, dependencies, caches and build output")
+        add_common_btn.clicked.connect(self.add_common_exclude_patterns)
+        exclude_options_layout.addWidget(add_common_btn)
+        exclude_layout.addLayout(exclude_options_layout)
+        
+        exclude_group.setLayout(exclude_layout)
+        settings_layout.addWidget(exclude_group)
+        
         # Auto-create settings
         auto_create_group = QGroupBox("Auto-Create Versions")
         auto_create_layout = QVBoxLayout()
@@ -6825,6 +10981,45 @@ class VersionDivingApp(QMainWindow):
         interval_layout.addWidget(self.interval_unit)
         auto_create_layout.addLayout(interval_layout)
         
+        # Change-triggered mode
+        trigger_layout = QHBoxLayout()
+        trigger_layout.addWidget(QLabel("Trigger:"))
+        self.trigger_mode_combo = QComboBox()
+        self.trigger_mode_combo.addItems(["At the interval above", "When files change"])
+        self.trigger_mode_combo.setEnabled(False)
+        self.trigger_mode_combo.currentIndexChanged.connect(self.trigger_mode_changed)
+        trigger_layout.addWidget(self.trigger_mode_combo)
+        auto_create_layout.addLayout(trigger_layout)
+        
+        watch_layout = QHBoxLayout()
+        watch_layout.addWidget(QLabel("After"))
+        self.quiet_seconds_spin = QSpinBox()
+        self.quiet_seconds_spin.setRange(1, 3600)
+        self.quiet_seconds_spin.setValue(30)
+        self.quiet_seconds_spin.setSuffix(" s")
+        self.quiet_seconds_spin.setToolTip("Wait until no files have changed for this long")
+        watch_layout.addWidget(self.quiet_seconds_spin)
+        watch_layout.addWidget(QLabel("quiet, at least"))
+        self.min_interval_spin = QSpinBox()
+        self.min_interval_spin.setRange(0, 1440)
+        self.min_interval_spin.setValue(1)
+        self.min_interval_spin.setSuffix(" min")
+        self.min_interval_spin.setToolTip("Minimum time between two versions")
+        watch_layout.addWidget(self.min_interval_spin)
+        watch_layout.addWidget(QLabel("apart, at most"))
+        self.max_delay_spin = QSpinBox()
+        self.max_delay_spin.setRange(1, 1440)
+        self.max_delay_spin.setValue(10)
+        self.max_delay_spin.setSuffix(" min")
+        self.max_delay_spin.setToolTip("Create a version after this long even if files keep changing")
+        watch_layout.addWidget(self.max_delay_spin)
+        watch_layout.addWidget(QLabel("after a change"))
+        watch_layout.addStretch()
+        auto_create_layout.addLayout(watch_layout)
+        for widget in (self.quiet_seconds_spin, self.min_interval_spin, self.max_delay_spin):
+            widget.setEnabled(False)
+            widget.valueChanged.connect(self.interval_changed)
+        
         # Additional options
         self.create_on_start_check = QCheckBox("Create version on Start Button click")
         self.create_on_start_check.setEnabled(False)
@@ -6834,6 +11029,21 @@ class VersionDivingApp(QMainWindow):
         self.auto_create_on_load_check.setEnabled(False)
         auto_create_layout.addWidget(self.auto_create_on_load_check)
         
+        self.skip_unchanged_check = QCheckBox("Skip auto-create when nothing has changed")
+        self.skip_unchanged_check.setChecked(True)
+        self.skip_unchanged_check.setEnabled(False)
+        auto_create_layout.addWidget(self.skip_unchanged_check)
+        
+        self.hash_contents_check = QCheckBox("Compare file contents, not just sizes and dates (slower)")
+        self.hash_contents_check.setEnabled(False)
+        auto_create_layout.addWidget(self.hash_contents_check)
+        
+        self.change_journal_check = QCheckBox("Track changed files between versions (faster for large origins)")
+        self.change_journal_check.setToolTip("Versions only look at files changed since the last one instead of scanning every folder")
+        self.change_journal_check.setEnabled(False)
+        self.change_journal_check.toggled.connect(self.interval_changed)
+        auto_create_layout.addWidget(self.change_journal_check)
+        
         # Floating timer layout
         timer_layout = QVBoxLayout()
         self.show_floating_timer_check = QCheckBox("Show floating countdown timer")
@@ -6899,6 +11109,7 @@ class VersionDivingApp(QMainWindow):
             'countdown_timer': None,
             'auto_create_timer': None,
             'floating_timer': None,
+            'origin_watcher': None,  # Watches origin files in change-triggered mode
             'project_color': project_color,  # Store the project color
             'controls': {
                 'origin_list': self.origin_list,
@@ -6912,16 +11123,45 @@ class VersionDivingApp(QMainWindow):
                 'custom_format_edit': self.custom_format_edit,
                 'auto_delete_check': self.auto_delete_check,
                 'version_limit_spin': self.version_limit_spin,
+                'retention_policy_combo': self.retention_policy_combo,
+                'retention_all_hours_spin': self.retention_all_hours_spin,
+                'retention_hourly_days_spin': self.retention_hourly_days_spin,
+                'retention_daily_days_spin': self.retention_daily_days_spin,
+                'retention_weekly_weeks_spin': self.retention_weekly_weeks_spin,
+                'max_size_check': self.max_size_check,
+                'max_size_spin': self.max_size_spin,
+                'min_free_check': self.min_free_check,
+                'min_free_spin': self.min_free_spin,
+                'storage_mode_combo': self.storage_mode_combo,
+                'copy_workers_spin': self.copy_workers_spin,
+                'chunk_large_files_check': self.chunk_large_files_check,
+                'compression_combo': self.compression_combo,
+                'compression_level_spin': self.compression_level_spin,
+                'delta_versions_check': self.delta_versions_check,
+                'pack_small_files_check': self.pack_small_files_check,
+                'record_checksums_check': self.record_checksums_check,
+                'allow_partial_check': self.allow_partial_check,
+                'scrub_rate_spin': self.scrub_rate_spin,
+                'verify_versions_btn': self.verify_versions_btn,
+                'exclude_patterns_edit': self.exclude_patterns_edit,
+                'use_gitignore_check': self.use_gitignore_check,
                 'auto_create_check': self.auto_create_check,
                 'interval_spin': self.interval_spin,
                 'interval_unit': self.interval_unit,
+                'trigger_mode_combo': self.trigger_mode_combo,
+                'quiet_seconds_spin': self.quiet_seconds_spin,
+                'min_interval_spin': self.min_interval_spin,
+                'max_delay_spin': self.max_delay_spin,
                 'create_on_start_check': self.create_on_start_check,
                 'auto_create_on_load_check': self.auto_create_on_load_check,
+                'skip_unchanged_check': self.skip_unchanged_check,
+                'hash_contents_check': self.hash_contents_check,
+                'change_journal_check': self.change_journal_check,
                 'show_floating_timer_check': self.show_floating_timer_check,
                 'timer_opacity_slider': self.timer_opacity_slider,
                 'countdown_label': self.countdown_label,
                 'start_stop_btn': self.start_stop_btn,
-                'contents_list': self.contents_list,
+                'contents_view': self.contents_view,
                 'tab_widget': self.tab_widget,
                 'recent_projects_list': self.recent_projects_list,
                 'color_preview': self.color_preview,
@@ -6949,7 +11189,7 @@ class VersionDivingApp(QMainWindow):
         # Update UI to reflect the fresh state
         self.update_origin_list()
         self.update_button_states()
-        self.contents_list.clear()
+        self.contents_model.clear()
         
         # Reset all UI control values
         self.prefix_edit.clear()
@@ -6958,13 +11198,41 @@ class VersionDivingApp(QMainWindow):
         self.custom_format_edit.clear()
         self.auto_delete_check.setChecked(False)
         self.version_limit_spin.setValue(5)
+        self.retention_policy_combo.setCurrentIndex(RETENTION_KEEP_RECENT)
+        self.retention_all_hours_spin.setValue(1)
+        self.retention_hourly_days_spin.setValue(1)
+        self.retention_daily_days_spin.setValue(30)
+        self.retention_weekly_weeks_spin.setValue(0)
+        self.max_size_check.setChecked(False)
+        self.max_size_spin.setValue(20)
+        self.min_free_check.setChecked(False)
+        self.min_free_spin.setValue(10)
+        self.storage_mode_combo.setCurrentIndex(STORAGE_MODE_FULL_COPY)
+        self.copy_workers_spin.setValue(SnapshotEngine.DEFAULT_COPY_WORKERS)
+        self.chunk_large_files_check.setChecked(False)
+        self.compression_combo.setCurrentIndex(0)
+        self.compression_level_spin.setValue(DEFAULT_COMPRESSION_LEVEL)
+        self.delta_versions_check.setChecked(False)
+        self.pack_small_files_check.setChecked(False)
+        self.record_checksums_check.setChecked(True)
+        self.allow_partial_check.setChecked(True)
+        self.scrub_rate_spin.setValue(0)
+        self.exclude_patterns_edit.setPlainText("")
+        self.use_gitignore_check.setChecked(False)
         
         # Enable auto-create features by default for all new projects
         self.auto_create_check.setChecked(True)
         self.interval_spin.setValue(5)
         self.interval_unit.setCurrentIndex(0)
+        self.trigger_mode_combo.setCurrentIndex(TRIGGER_INTERVAL)
+        self.quiet_seconds_spin.setValue(30)
+        self.min_interval_spin.setValue(1)
+        self.max_delay_spin.setValue(10)
         self.create_on_start_check.setChecked(True)
         self.auto_create_on_load_check.setChecked(True)
+        self.skip_unchanged_check.setChecked(True)
+        self.hash_contents_check.setChecked(False)
+        self.change_journal_check.setChecked(False)
         self.show_floating_timer_check.setChecked(True)
         self.timer_opacity_slider.setValue(100)
         self.countdown_label.setText("--:--:--")
@@ -7267,7 +11535,7 @@ class VersionDivingApp(QMainWindow):
             self.destination_path = ""
             self.dest_label.setText("No destination selected")
             self.update_button_states()
-            self.contents_list.clear()
+            self.contents_model.clear()
             # Show toast notification for clearing destination
             self.show_toast("Destination folder cleared")
             
@@ -7341,13 +11609,20 @@ class VersionDivingApp(QMainWindow):
         else:  # Hours
             self.countdown_seconds = interval_value * 60 * 60
     
+    def trigger_mode_changed(self, index):
+        """Enable the change-trigger settings and restart a running auto-create in the new mode"""
+        watch_enabled = self.auto_create_check.isChecked() and index == TRIGGER_ON_CHANGE
+        for widget in (self.quiet_seconds_spin, self.min_interval_spin, self.max_delay_spin):
+            widget.setEnabled(watch_enabled)
+        self.interval_changed()
+    
     def interval_changed(self):
         """Handle changes to interval settings"""
         # If auto-create is running, restart the timers with new interval
-        if self.current_project_index >= 0:
+        if self.current_project_index >= 0 and self.current_project_index < len(self.project_tabs):
             project = self.project_tabs[self.current_project_index]
             if project.get('auto_create_running', False):
-                self.start_auto_create_timer(self.current_project_index)
+                self.start_timer(self.current_project_index)
     
     def load_project(self, project):
         """Load a project's settings"""
@@ -7369,15 +11644,42 @@ class VersionDivingApp(QMainWindow):
         auto_delete = project.get('auto_delete', False)
         self.auto_delete_check.setChecked(auto_delete)
         self.version_limit_spin.setValue(project.get('version_limit', 5))
+        self.retention_policy_combo.setCurrentIndex(project.get('retention_policy', RETENTION_KEEP_RECENT))
+        self.retention_all_hours_spin.setValue(project.get('retention_all_hours', 1))
+        self.retention_hourly_days_spin.setValue(project.get('retention_hourly_days', 1))
+        self.retention_daily_days_spin.setValue(project.get('retention_daily_days', 30))
+        self.retention_weekly_weeks_spin.setValue(project.get('retention_weekly_weeks', 0))
+        self.max_size_check.setChecked(project.get('max_size_enabled', False))
+        self.max_size_spin.setValue(project.get('max_size_gb', 20))
+        self.min_free_check.setChecked(project.get('min_free_enabled', False))
+        self.min_free_spin.setValue(project.get('min_free_percent', 10))
         # Force update of dependent controls
         self.toggle_version_limit(Qt.CheckState.Checked.value if auto_delete else Qt.CheckState.Unchecked.value)
         
+        # Load storage settings
+        self.storage_mode_combo.setCurrentIndex(project.get('storage_mode', STORAGE_MODE_FULL_COPY))
+        self.copy_workers_spin.setValue(project.get('copy_workers', SnapshotEngine.DEFAULT_COPY_WORKERS))
+        self.chunk_large_files_check.setChecked(project.get('chunk_large_files', False))
+        self.compression_combo.setCurrentIndex(project.get('compression', 0))
+        self.compression_level_spin.setValue(project.get('compression_level', DEFAULT_COMPRESSION_LEVEL))
+        self.delta_versions_check.setChecked(project.get('delta_versions', False))
+        self.pack_small_files_check.setChecked(project.get('pack_small_files', False))
+        self.record_checksums_check.setChecked(project.get('record_checksums', True))
+        self.allow_partial_check.setChecked(project.get('allow_partial', True))
+        self.scrub_rate_spin.setValue(project.get('scrub_rate_limit', 0))
+        self.exclude_patterns_edit.setPlainText("\n".join(project.get('exclude_patterns', [])))
+        self.use_gitignore_check.setChecked(project.get('use_gitignore', False))
+        
         # Load auto-create settings if available
         auto_create = project.get('auto_create', False)
         if 'auto_create' in project:
             self.auto_create_check.setChecked(auto_create)
             self.interval_spin.setValue(project.get('interval_value', 5))
             self.interval_unit.setCurrentIndex(project.get('interval_unit', 0))
+            self.trigger_mode_combo.setCurrentIndex(project.get('trigger_mode', TRIGGER_INTERVAL))
+            self.quiet_seconds_spin.setValue(project.get('quiet_seconds', 30))
+            self.min_interval_spin.setValue(project.get('min_interval_minutes', 1))
+            self.max_delay_spin.setValue(project.get('max_delay_minutes', 10))
             
             # Force update of dependent controls
             self.toggle_auto_create_settings(Qt.CheckState.Checked.value if auto_create else Qt.CheckState.Unchecked.value)
@@ -7391,6 +11693,9 @@ class VersionDivingApp(QMainWindow):
         # Update checkboxes and slider
         self.create_on_start_check.setChecked(create_on_start)
         self.auto_create_on_load_check.setChecked(auto_create_on_load)
+        self.skip_unchanged_check.setChecked(project.get('skip_unchanged', True))
+        self.hash_contents_check.setChecked(project.get('hash_contents', False))
+        self.change_journal_check.setChecked(project.get('change_journal', False))
         self.show_floating_timer_check.setChecked(show_floating_timer)
         self.timer_opacity_slider.setValue(timer_opacity)
         
@@ -7417,115 +11722,306 @@ class VersionDivingApp(QMainWindow):
             self.load_project(project)
     
     def create_version(self):
-        # Check if auto-creation is currently in progress (in the middle of copying files)
-        if hasattr(self, 'is_creating_version') and self.is_creating_version:
+        # Check if a version is currently being created (in the middle of copying files)
+        if self.is_creating_version:
             QMessageBox.warning(
                 self,
-                "Auto-Create In Progress",
-                "An automatic version is currently being created. Please wait for it to complete.",
+                "Version In Progress",
+                "A version is currently being created. Please wait for it to complete or cancel it.",
                 QMessageBox.StandardButton.Ok
             )
             return
             
-        # Generate version folder name
-        version_name = self.generate_version_name()
-        version_path = os.path.join(self.destination_path, version_name)
-        
-        # Create the version folder
         try:
-            os.makedirs(version_path, exist_ok=True)
-            
-            # Copy files/folders
-            for source_path in self.origin_paths:
-                if os.path.isdir(source_path):
-                    # Copy directory contents
-                    source_basename = os.path.basename(source_path)
-                    dest_dir = os.path.join(version_path, source_basename)
-                    shutil.copytree(source_path, dest_dir)
-                else:
-                    # Copy file
-                    shutil.copy2(source_path, version_path)
-            
-            # Track if any versions were deleted
-            deleted_count = 0
-            
-            # Cleanup old versions if needed
-            if self.auto_delete_check.isChecked():
-                deleted_count = self.cleanup_old_versions()
-            
-            # Update the contents view
-            self.update_contents_list()
+            self.start_version_creation(self.current_project_index)
+        except Exception as e:
+            error_message = f"Error creating version: {str(e)}"
+            QMessageBox.critical(self, "Error", error_message)
+    
+    def get_project_controls(self, project_index):
+        """Return the settings widgets of a project's tab, or None if there is no such tab"""
+        if project_index < 0 or project_index >= len(self.project_tabs):
+            return None
+        return self.project_tabs[project_index].get('controls')
+    
+    def control(self, controls, name):
+        """A settings widget from a project's controls, or the one on screen without them"""
+        return controls[name] if controls else getattr(self, name)
+    
+    def get_snapshot_options(self, controls=None):
+        """Collect a project's storage settings as SnapshotEngine keyword arguments"""
+        control = lambda name: self.control(controls, name)
+        return {
+            'storage_mode': control('storage_mode_combo').currentIndex(),
+            'copy_workers': control('copy_workers_spin').value(),
+            'hash_contents_fingerprint': control('hash_contents_check').isChecked(),
+            'chunk_large_files': control('chunk_large_files_check').isChecked(),
+            'compression': COMPRESSION_CODECS[control('compression_combo').currentIndex()],
+            'compression_level': control('compression_level_spin').value(),
+            'delta_older_versions': control('delta_versions_check').isChecked(),
+            'pack_small_files': control('pack_small_files_check').isChecked(),
+            'record_checksums': control('record_checksums_check').isChecked(),
+            'allow_partial_versions': control('allow_partial_check').isChecked(),
+            'space_budget': self.get_space_budget(controls),
+            'exclude_patterns': self.get_exclude_patterns(controls),
+            'use_gitignore': control('use_gitignore_check').isChecked()
+        }
+    
+    def get_exclude_patterns(self, controls=None):
+        """Return the project's exclude patterns as a list of lines"""
+        edit = controls['exclude_patterns_edit'] if controls else self.exclude_patterns_edit
+        return [line for line in edit.toPlainText().splitlines() if line.strip()]
+    
+    def add_common_exclude_patterns(self):
+        """Append the usual dependency, cache and build folders to the exclude patterns"""
+        patterns = self.get_exclude_patterns()
+        missing = [pattern for pattern in IgnoreRules.COMMON_PATTERNS if pattern not in patterns]
+        if missing:
+            self.exclude_patterns_edit.setPlainText("\n".join(patterns + missing))
+    
+    def start_version_creation(self, project_index, auto=False):
+        """Start copying the current origin paths into a new version on a background thread"""
+        if self.is_creating_version:
+            return False
             
-            # Always save current project to recents after creating a version
-            self.save_recent_projects()
+        # Settings come from the project's own tab, an auto-created version may not be the one on screen
+        controls = self.get_project_controls(project_index)
+        
+        # Generate version folder name
+        version_name = self.generate_version_name(controls)
+        
+        # Remember everything the completion handler needs, the user may switch tabs meanwhile
+        self.snapshot_job = {
+            'project_index': project_index,
+            'destination_path': self.destination_path,
+            'version_name': version_name,
+            'auto': auto,
+            'auto_delete': self.control(controls, 'auto_delete_check').isChecked(),
+            'version_limit': self.control(controls, 'version_limit_spin').value(),
+            'retention_tiers': self.get_retention_tiers(controls),
+            'space_budget': self.get_space_budget(controls),
+            'started': time.monotonic()
+        }
+        
+        # Hand over the changes recorded since the last version so only those paths are visited
+        changes = None
+        journal = self.get_change_journal(project_index)
+        if journal:
+            changes = journal.take()
+        self.snapshot_job['journal'] = journal
+        
+        # Copy files/folders (or store them as objects) using the project's storage settings
+        # Auto-create ticks don't produce identical copies when nothing in the origin changed
+        skip_if_unchanged = auto and self.control(controls, 'skip_unchanged_check').isChecked()
+        worker = SnapshotWorker(self.destination_path, self.origin_paths, version_name,
+                                self.get_snapshot_options(controls), skip_if_unchanged, changes, self)
+        worker.progress.connect(self.update_version_progress)
+        worker.completed.connect(self.version_creation_completed)
+        worker.skipped.connect(self.version_creation_skipped)
+        worker.failed.connect(self.version_creation_failed)
+        worker.cancelled.connect(self.version_creation_cancelled)
+        
+        self.is_creating_version = True
+        self.snapshot_worker = worker
+        
+        # Show progress in the status bar and allow cancelling from there or the tray
+        self.snapshot_progress_label.setText(f"Creating {version_name}...")
+        self.snapshot_progress_bar.setValue(0)
+        self.snapshot_progress_label.show()
+        self.snapshot_progress_bar.show()
+        self.cancel_snapshot_btn.show()
+        self.cancel_snapshot_btn.setEnabled(True)
+        self.cancel_snapshot_action.setEnabled(True)
+        
+        worker.start()
+        return True
+    
+    def get_change_journal(self, project_index):
+        """Return the change journal recording the project's origin, if it has one"""
+        if project_index < 0 or project_index >= len(self.project_tabs):
+            return None
+        watcher = self.project_tabs[project_index].get('origin_watcher')
+        if not watcher or not watcher.journal:
+            return None
+        # A journal only describes the origin and destination it was started for
+        if (watcher.journal.destination_path != self.destination_path
+                or watcher.origin_paths != list(self.origin_paths)):
+            return None
+        # Exclude settings may have been edited since watching started
+        controls = self.get_project_controls(project_index)
+        watcher.set_exclude(self.get_exclude_patterns(controls), self.control(controls, 'use_gitignore_check').isChecked())
+        return watcher.journal
+    
+    def update_version_progress(self, files_done, files_total, bytes_done, bytes_total):
+        """Show the progress of the running version creation"""
+        if not self.snapshot_job:
+            return
             
-            # Reset the timer if auto-create is running for the current project
-            timer_was_reset = False
-            if self.current_project_index >= 0:
-                project = self.project_tabs[self.current_project_index]
-                if project.get('auto_create_running', False):
-                    # Get interval value from the current project
-                    interval_value = self.interval_spin.value()
-                    unit = self.interval_unit.currentText()
+        if bytes_total > 0:
+            percent = int(bytes_done * 100 / bytes_total)
+        elif files_total > 0:
+            percent = int(files_done * 100 / files_total)
+        else:
+            percent = 0
+        self.snapshot_progress_bar.setValue(percent)
+        
+        # Estimate the remaining time from the copy rate so far
+        eta_text = ""
+        elapsed = time.monotonic() - self.snapshot_job['started']
+        if bytes_done > 0 and bytes_total > bytes_done and elapsed > 1:
+            remaining = int(elapsed * (bytes_total - bytes_done) / bytes_done)
+            minutes, seconds = divmod(remaining, 60)
+            eta_text = f", ETA {minutes}:{seconds:02d}"
+            
+        progress_text = (f"Creating {self.snapshot_job['version_name']}: {files_done}/{files_total} files, "
+                         f"{format_size(bytes_done)} of {format_size(bytes_total)}{eta_text}")
+        self.snapshot_progress_label.setText(progress_text)
+        self.tray_icon.setToolTip(progress_text)
+    
+    def cancel_version_creation(self):
+        """Cancel the version that is currently being created"""
+        if self.snapshot_worker and self.snapshot_worker.isRunning():
+            self.snapshot_worker.cancel()
+            self.snapshot_progress_label.setText("Cancelling version creation...")
+            self.cancel_snapshot_btn.setEnabled(False)
+            self.cancel_snapshot_action.setEnabled(False)
+    
+    def finish_version_creation(self):
+        """Reset the progress UI once the background worker is done"""
+        self.is_creating_version = False
+        self.snapshot_progress_label.hide()
+        self.snapshot_progress_bar.hide()
+        self.cancel_snapshot_btn.hide()
+        self.cancel_snapshot_action.setEnabled(False)
+        self.tray_icon.setToolTip("Version Diving")
+        
+        if self.snapshot_worker:
+            self.snapshot_worker.deleteLater()
+            self.snapshot_worker = None
+        job = self.snapshot_job
+        self.snapshot_job = None
+        return job
+    
+    def version_creation_completed(self, version_name):
+        """Finish a version once the background copy succeeded"""
+        job = self.finish_version_creation()
+        if job['journal']:
+            job['journal'].commit(version_name)
+        
+        # Track if any versions were deleted
+        deleted_count = 0
+        
+        # Cleanup old versions if needed
+        if job['auto_delete']:
+            deleted_count = self.cleanup_old_versions(job['destination_path'], job['version_limit'],
+                                                      job['retention_tiers'], job['space_budget'])
+        
+        # Update the contents view if the version belongs to the project on screen
+        if job['destination_path'] == self.destination_path:
+            # Only the new row is added, deleted versions are dropped after a background look at the catalog
+            self.contents_model.add_version(version_name)
+            self.contents_model.sync_versions()
+        
+        # Always save current project to recents after creating a version
+        self.save_recent_projects()
+        
+        # Reset the timer if auto-create is running for the project (auto-create resets its own timer)
+        timer_was_reset = False
+        project_index = job['project_index']
+        if not job['auto'] and 0 <= project_index < len(self.project_tabs):
+            project = self.project_tabs[project_index]
+            if project.get('auto_create_running', False):
+                # Get interval value from the current project
+                interval_value = self.interval_spin.value()
+                unit = self.interval_unit.currentText()
+                
+                # Update countdown
+                if unit == "Minutes":
+                    project['countdown_seconds'] = interval_value * 60
+                else:  # Hours
+                    project['countdown_seconds'] = interval_value * 60 * 60
                     
-                    # Update countdown
-                    if unit == "Minutes":
-                        project['countdown_seconds'] = interval_value * 60
-                    else:  # Hours
-                        project['countdown_seconds'] = interval_value * 60 * 60
+                # Update the countdown display
+                if 'controls' in project:
+                    countdown_label = project['controls'].get('countdown_label')
+                    if countdown_label:
+                        hours, remainder = divmod(project['countdown_seconds'], 3600)
+                        minutes, seconds = divmod(remainder, 60)
+                        countdown_label.setText(f"{hours:02d}:{minutes:02d}:{seconds:02d}")
                         
-                    # Update the countdown display
-                    if 'controls' in project:
-                        countdown_label = project['controls'].get('countdown_label')
-                        if countdown_label:
-                            hours, remainder = divmod(project['countdown_seconds'], 3600)
-                            minutes, seconds = divmod(remainder, 60)
-                            countdown_label.setText(f"{hours:02d}:{minutes:02d}:{seconds:02d}")
-                            
-                    # Update floating timer if present
-                    floating_timer = project.get('floating_timer')
-                    if floating_timer:
-                        floating_timer.update_time(project['countdown_seconds'])
-                        
-                    timer_was_reset = True
-            
-            # Show success message as toast instead of alert
-            if deleted_count > 0:
-                success_message = f"Version created successfully at: {version_name}\n{deleted_count} old version(s) removed"
-                if timer_was_reset:
-                    success_message += "\nAuto-create timer has been reset"
-                self.show_toast(success_message, 5000)
-            else:
-                success_message = f"Version created successfully at: {version_name}"
-                if timer_was_reset:
-                    success_message += "\nAuto-create timer has been reset"
-                self.show_toast(success_message, 3000)
-                
-        except Exception as e:
-            error_message = f"Error creating version: {str(e)}"
+                # Update floating timer if present
+                floating_timer = project.get('floating_timer')
+                if floating_timer:
+                    floating_timer.update_time(project['countdown_seconds'])
+                    
+                timer_was_reset = True
+        
+        # Show success message as toast instead of alert
+        if job['auto'] and 0 <= project_index < len(self.project_tabs):
+            success_message = f"Auto-created version for {self.project_tabs[project_index].get('name', 'Project')}: {version_name}"
+        else:
+            success_message = f"Version created successfully at: {version_name}"
+        skipped = load_version_skipped(os.path.join(job['destination_path'], version_name))
+        if skipped:
+            success_message += f"\nPartial version: {len(skipped)} locked file(s) skipped"
+        if deleted_count > 0:
+            success_message += f"\n{deleted_count} old version(s) removed"
+        if timer_was_reset:
+            success_message += "\nAuto-create timer has been reset"
+        self.show_toast(success_message, 5000 if deleted_count > 0 else 3000)
+    
+    def version_creation_skipped(self, last_version_name):
+        """Log an auto-create tick that found nothing new to save"""
+        job = self.finish_version_creation()
+        if job and job['journal']:
+            # The origin matched this version, so it is a valid base for the journal
+            job['journal'].commit(last_version_name)
+        project_name = "Project"
+        if job and 0 <= job['project_index'] < len(self.project_tabs):
+            project_name = self.project_tabs[job['project_index']].get('name', 'Project')
+        message = f"No changes in {project_name} since {last_version_name} - skipped auto-create"
+        print(message)
+        self.statusBar().showMessage(message, 10000)
+    
+    def version_creation_failed(self, message):
+        """Report a version that could not be created"""
+        job = self.finish_version_creation()
+        if job and job['journal']:
+            job['journal'].rollback()
+        error_message = f"Error creating version: {message}"
+        if job and job['auto']:
+            self.show_toast(error_message, 5000)
+        else:
             QMessageBox.critical(self, "Error", error_message)
     
-    def generate_version_name(self):
+    def version_creation_cancelled(self):
+        """Clean up after the user cancelled a version"""
+        job = self.finish_version_creation()
+        if job and job['journal']:
+            job['journal'].rollback()
+        if job:
+            self.show_toast(f"Cancelled creating version: {job['version_name']}", 3000)
+    
+    def generate_version_name(self, controls=None):
         # Get current date and time
         now = datetime.datetime.now()
         date_str = now.strftime("%Y-%m-%d")
         time_str = now.strftime("%H-%M-%S")
         
-        prefix = self.prefix_edit.text()
-        suffix = self.suffix_edit.text()
+        prefix = self.control(controls, 'prefix_edit').text()
+        suffix = self.control(controls, 'suffix_edit').text()
         
-        format_index = self.name_format_combo.currentIndex()
+        format_index = self.control(controls, 'name_format_combo').currentIndex()
         
         if format_index == 0:  # Date_Time
             name = f"{date_str}_{time_str}"
         elif format_index == 1:  # Custom
-            custom_format = self.custom_format_edit.text()
+            custom_format = self.control(controls, 'custom_format_edit').text()
             name = custom_format.replace("{date}", date_str).replace("{time}", time_str)
         else:  # Counter
             # Find existing counter-based folders and increment
             counter = 1
-            existing_folders = [f for f in os.listdir(self.destination_path) 
-                               if os.path.isdir(os.path.join(self.destination_path, f))]
+            existing_folders = set(VersionCatalog(self.destination_path).load().names())
             
             while f"version_{counter:03d}" in existing_folders:
                 counter += 1
@@ -7540,28 +12036,50 @@ class VersionDivingApp(QMainWindow):
             
         return name
     
-    def cleanup_old_versions(self):
-        limit = self.version_limit_spin.value()
-        deleted_count = 0
-        
-        # Get all folders in the destination directory
-        folders = [os.path.join(self.destination_path, f) 
-                  for f in os.listdir(self.destination_path) 
-                  if os.path.isdir(os.path.join(self.destination_path, f))]
-        
-        # Sort folders by creation time (newest first)
-        folders.sort(key=lambda x: os.path.getctime(x), reverse=True)
+    def get_retention_tiers(self, controls=None):
+        """Tiers of the tiered auto-delete policy, or None when keeping the most recent versions"""
+        control = lambda name: self.control(controls, name)
+        if control('retention_policy_combo').currentIndex() != RETENTION_TIERED:
+            return None
+        return retention_tiers(control('retention_all_hours_spin').value(),
+                               control('retention_hourly_days_spin').value(),
+                               control('retention_daily_days_spin').value(),
+                               control('retention_weekly_weeks_spin').value())
+    
+    def get_space_budget(self, controls=None):
+        """Byte budgets of the auto-delete settings, or None when auto-delete has none"""
+        control = lambda name: self.control(controls, name)
+        if not control('auto_delete_check').isChecked():
+            return None
+        max_bytes = control('max_size_spin').value() * 1024 ** 3 if control('max_size_check').isChecked() else 0
+        min_free_percent = control('min_free_spin').value() if control('min_free_check').isChecked() else 0
+        if not max_bytes and not min_free_percent:
+            return None
+        return SpaceBudget(max_bytes, min_free_percent)
+    
+    def cleanup_old_versions(self, destination_path=None, limit=None, tiers=None, budget=None):
+        if destination_path is None:
+            destination_path = self.destination_path
+            tiers = self.get_retention_tiers()
+            budget = self.get_space_budget()
+        if limit is None:
+            limit = self.version_limit_spin.value()
+        
+        # The catalog keeps versions in creation order, no need to list and stat the destination
+        catalog = VersionCatalog(destination_path).load()
+        names = catalog.names()
+        if tiers is not None:
+            expired = select_expired_versions(catalog.versions, tiers)
+        else:
+            # Remove the oldest folders beyond the limit
+            expired = names[:max(len(names) - limit, 0)]
         
-        # Remove old folders
-        if len(folders) > limit:
-            for folder in folders[limit:]:
-                try:
-                    shutil.rmtree(folder)
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error removing folder {folder}: {str(e)}")
+        # Then more of the oldest ones while the destination is over its byte budget
+        if budget is not None:
+            over_budget, _ = budget.select_versions(destination_path, catalog, chosen=set(expired))
+            expired = [name for name in names if name in expired or name in over_budget]
         
-        return deleted_count
+        return delete_versions(destination_path, catalog, expired)
     
     def update_name_format(self, index):
         self.custom_format_edit.setEnabled(index == 1)  # Enable for "Custom" option
@@ -7689,63 +12207,22 @@ class VersionDivingApp(QMainWindow):
     
     def auto_create_version(self):
         """Create a version automatically based on the timer"""
-        # Set a flag to indicate we're in the middle of creating a version
-        self.is_creating_version = True
-        
         # Only create if both origin and destination are set
         if len(self.origin_paths) > 0 and self.destination_path:
             try:
-                # Generate version folder name
-                version_name = self.generate_version_name()
-                version_path = os.path.join(self.destination_path, version_name)
-                
-                # Create the version folder
-                os.makedirs(version_path, exist_ok=True)
-                
-                # Copy files/folders
-                for source_path in self.origin_paths:
-                    if os.path.isdir(source_path):
-                        # Copy directory contents
-                        source_basename = os.path.basename(source_path)
-                        dest_dir = os.path.join(version_path, source_basename)
-                        shutil.copytree(source_path, dest_dir)
-                    else:
-                        # Copy file
-                        shutil.copy2(source_path, version_path)
-                
-                # Track if any versions were deleted
-                deleted_count = 0
-                
-                # Cleanup old versions if needed
-                if self.auto_delete_check.isChecked():
-                    deleted_count = self.cleanup_old_versions()
-                
-                # Update the contents view if window is visible
-                if self.isVisible():
-                    self.update_contents_list()
-                
-                # Always save to recent projects after creating a version
-                self.save_recent_projects()
-                
-                # Show toast notification
-                if deleted_count > 0:
-                    self.show_toast(f"New version created at: {version_name}\n{deleted_count} old version(s) removed", 5000)
-                else:
-                    self.show_toast(f"New version created at: {version_name}", 3000)
+                # The copy runs in the background, completion is reported by version_creation_completed
+                if not self.start_version_creation(self.current_project_index, auto=True):
+                    self.show_toast("Skipped auto-create: another version is still being created", 3000)
                 
                 # Restart the countdown
                 self.restart_countdown()
                 
             except Exception as e:
                 self.show_toast(f"Error creating version: {str(e)}", 5000)
-            finally:
-                # Clear the creation flag when done
-                self.is_creating_version = False
         else:
             # If we don't have origin and destination, stop auto-create
             self.show_toast("Auto-create failed: missing origin files or destination folder", 3000)
             self.stop_auto_create()
-            self.is_creating_version = False
 
     def show_origin_context_menu(self, position):
         """Show context menu for the origin list to remove individual items"""
@@ -7802,65 +12279,140 @@ class VersionDivingApp(QMainWindow):
         help_dialog.exec()
 
     def show_contents_context_menu(self, position):
-        """Show context menu for the contents list"""
-        item = self.contents_list.itemAt(position)
-        if not item:
+        """Show context menu for the contents tree"""
+        index = self.contents_view.indexAt(position)
+        if not index.isValid():
             return
-            
-        # Get the item text
-        item_text = item.text()
+        node = self.contents_model.node(index)
         
-        # Skip headers and empty items
-        if item_text.startswith("---") or not item_text.strip():
+        # Skip the origin header and error rows
+        if not node.path:
             return
             
         menu = QMenu()
+        open_action = menu.addAction("Open")
+        open_containing_action = None
+        restore_action = None
+        verify_action = None
         
-        if item_text.startswith("  "):  # It's a file or folder in destination
-            open_action = menu.addAction("Open")
+        if node.kind in (ContentsModel.VERSION, ContentsModel.ENTRY, ContentsModel.STORED):
             open_containing_action = menu.addAction("Open Containing Folder")
+        if node.kind == ContentsModel.VERSION:
+            # Versions can be restored to a folder of the user's choice
+            restore_action = menu.addAction("Restore Version To...")
+            verify_action = menu.addAction("Verify Version")
+        
+        action = menu.exec(self.contents_view.viewport().mapToGlobal(position))
+        
+        if action == open_action:
+            self.open_content_item(index)
+        elif open_containing_action is not None and action == open_containing_action:
+            os.startfile(os.path.dirname(node.path))
+        elif restore_action is not None and action == restore_action:
+            self.restore_version_to(node.path)
+        elif verify_action is not None and action == verify_action:
+            self.verify_versions([node.label])
+    
+    def open_content_item(self, index):
+        """Open the selected item from the contents tree"""
+        node = self.contents_model.node(index)
+        
+        # Skip the origin header and error rows
+        if not node.path:
+            return
             
-            action = menu.exec(self.contents_list.mapToGlobal(position))
-            
-            if action == open_action:
-                self.open_content_item(item)
-            elif action == open_containing_action:
-                # Open the destination folder
-                if self.destination_path:
-                    os.startfile(self.destination_path)
-        else:  # It's either an origin item or the destination path itself
-            open_action = menu.addAction("Open")
+        try:
+            if node.stored:
+                # Entries of stored versions only exist as (possibly compressed) objects, extract them first
+                version_path, rel_path = node.stored
+                extract_dir = tempfile.mkdtemp(prefix="versiondiving-")
+                self.extracted_dirs.append(extract_dir)
+                restore_version(version_path, extract_dir, rel_path)
+                os.startfile(os.path.join(extract_dir, rel_path))
+            elif os.path.exists(node.path):
+                os.startfile(node.path)
+            else:
+                self.show_toast(f"Cannot find: {node.path}", 3000)
+        except Exception as e:
+            self.show_toast(f"Error opening item: {str(e)}", 3000)
+
+    def restore_version_to(self, version_path):
+        """Rebuild a version into a folder chosen by the user"""
+        target = QFileDialog.getExistingDirectory(self, "Select Folder to Restore Into")
+        if not target:
+            return
             
-            action = menu.exec(self.contents_list.mapToGlobal(position))
+        try:
+            restore_version(version_path, target)
+            self.show_toast(f"Restored {os.path.basename(version_path)} to: {target}", 3000)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error restoring version: {str(e)}")
+
+    def verify_versions(self, version_names=None):
+        """Verify versions of the destination in the background, or cancel the running verification"""
+        if self.scrub_worker:
+            self.scrub_worker.cancel()
+            self.scrub_job['button'].setEnabled(False)
+            self.statusBar().showMessage("Cancelling verification...")
+            return
+        if not self.destination_path:
+            return
             
-            if action == open_action:
-                self.open_content_item(item)
-    
-    def open_content_item(self, item):
-        """Open the selected item from the contents list"""
-        # Get the item text
-        item_text = item.text()
+        worker = ScrubWorker(self.destination_path, version_names, self.copy_workers_spin.value(),
+                             self.scrub_rate_spin.value() * 1024 * 1024, self)
+        worker.progress.connect(self.update_verify_progress)
+        worker.completed.connect(self.verify_completed)
+        worker.failed.connect(self.verify_failed)
+        worker.cancelled.connect(self.verify_cancelled)
         
-        # Skip headers and empty items
-        if item_text.startswith("---") or not item_text.strip():
+        # The button of the project that started it doubles as its cancel button
+        self.scrub_job = {
+            'button': self.verify_versions_btn,
+            'destination_path': self.destination_path,
+            'label': version_names[0] if version_names and len(version_names) == 1 else "all versions"
+        }
+        self.scrub_worker = worker
+        self.verify_versions_btn.setText("Cancel Verification")
+        self.statusBar().showMessage(f"Verifying {self.scrub_job['label']}...")
+        worker.start()
+    
+    def update_verify_progress(self, done, total):
+        if self.scrub_job:
+            self.statusBar().showMessage(f"Verifying {self.scrub_job['label']}: {done}/{total} files")
+    
+    def finish_verify(self):
+        """Reset the verify button once the background worker is done"""
+        job = self.scrub_job
+        job['button'].setText("Verify Versions")
+        job['button'].setEnabled(True)
+        self.statusBar().clearMessage()
+        self.scrub_worker.deleteLater()
+        self.scrub_worker = None
+        self.scrub_job = None
+        return job
+    
+    def verify_completed(self, problems):
+        """Show the result of a verification"""
+        job = self.finish_verify()
+        if not problems:
+            self.show_toast(f"Verified {job['label']}: no problems found", 3000)
             return
             
-        try:
-            # Handle items based on their format
-            if item_text.startswith("  "):  # It's a subfolder or file in destination folder
-                item_name = item_text.strip()
-                item_path = os.path.join(self.destination_path, item_name)
-                if os.path.exists(item_path):
-                    os.startfile(item_path)
-                else:
-                    self.show_toast(f"Cannot find: {item_path}", 3000)
-            else:  # It's either an origin path or the destination path itself
-                if os.path.exists(item_text):
-                    os.startfile(item_text)
-                else:
-                    self.show_toast(f"Cannot find: {item_text}", 3000)
-        except Exception as e:
-            self.show_toast(f"Error opening item: {str(e)}", 3000)
+        message = QMessageBox(self)
+        message.setIcon(QMessageBox.Icon.Warning)
+        message.setWindowTitle("Verification Problems")
+        message.setText(f"Found {len(problems)} problem(s) while verifying {job['label']} in {job['destination_path']}.")
+        message.setDetailedText("\n".join(f"{version_name}/{rel_path}: {problem}" if rel_path else f"{version_name}: {problem}"
+                                          for version_name, rel_path, problem in problems))
+        message.exec()
+    
+    def verify_failed(self, error_message):
+        self.finish_verify()
+        QMessageBox.critical(self, "Error", f"Error verifying versions: {error_message}")
+    
+    def verify_cancelled(self):
+        self.finish_verify()
+        self.show_toast("Verification cancelled", 2000)
 
     def toggle_version_limit(self, state):
         """Enable/disable version limit spinbox based on the auto-delete checkbox"""
@@ -7870,7 +12422,20 @@ class VersionDivingApp(QMainWindow):
         # In PyQt6, the state is an enum, not a boolean, so we need to check it properly
         enabled = (state == Qt.CheckState.Checked.value)
         
-        self.version_limit_spin.setEnabled(enabled)
+        self.retention_policy_combo.setEnabled(enabled)
+        self.update_retention_controls()
+    
+    def update_retention_controls(self, index=None):
+        """Enable the settings of the selected auto-delete policy"""
+        enabled = self.auto_delete_check.isChecked()
+        tiered = self.retention_policy_combo.currentIndex() == RETENTION_TIERED
+        self.version_limit_spin.setEnabled(enabled and not tiered)
+        for spin in self.retention_tier_spins:
+            spin.setEnabled(enabled and tiered)
+        self.max_size_check.setEnabled(enabled)
+        self.max_size_spin.setEnabled(enabled and self.max_size_check.isChecked())
+        self.min_free_check.setEnabled(enabled)
+        self.min_free_spin.setEnabled(enabled and self.min_free_check.isChecked())
         
         # Debug info
         print(f"Version limit spinner enabled: {enabled}")
@@ -7886,10 +12451,17 @@ class VersionDivingApp(QMainWindow):
         # Enable/disable interval controls
         self.interval_spin.setEnabled(enabled)
         self.interval_unit.setEnabled(enabled)
+        self.trigger_mode_combo.setEnabled(enabled)
+        watch_enabled = enabled and self.trigger_mode_combo.currentIndex() == TRIGGER_ON_CHANGE
+        for widget in (self.quiet_seconds_spin, self.min_interval_spin, self.max_delay_spin):
+            widget.setEnabled(watch_enabled)
         
         # Enable/disable additional options
         self.create_on_start_check.setEnabled(enabled)
         self.auto_create_on_load_check.setEnabled(enabled)
+        self.skip_unchanged_check.setEnabled(enabled)
+        self.hash_contents_check.setEnabled(enabled)
+        self.change_journal_check.setEnabled(enabled)
         self.show_floating_timer_check.setEnabled(enabled)
         
         # Enable/disable timer opacity slider if floating timer is checked
@@ -8107,6 +12679,18 @@ class VersionDivingApp(QMainWindow):
         controls = project.get('controls', {})
         settings = project.get('settings', {})
         
+        # In change-triggered mode the origin watcher replaces the countdown
+        trigger_combo = controls.get('trigger_mode_combo')
+        if trigger_combo and trigger_combo.currentIndex() == TRIGGER_ON_CHANGE:
+            self.start_origin_watcher(project_index)
+            return
+        self.stop_origin_watcher(project_index)
+        
+        # The countdown decides when, but a watcher still records what changed for the journal
+        journal_check = controls.get('change_journal_check')
+        if journal_check and journal_check.isChecked():
+            self.create_origin_watcher(project_index, trigger=False)
+        
         # Get interval from settings
         interval = settings.get('auto_create_interval', 5)
         try:
@@ -8150,6 +12734,95 @@ class VersionDivingApp(QMainWindow):
         # If it already exists, it will be updated with the current countdown
         self.create_floating_timer(project_index)
 
+    def start_origin_watcher(self, project_index):
+        """Create versions for a project when its origin files change instead of on a countdown"""
+        project = self.project_tabs[project_index]
+        controls = project.get('controls', {})
+        
+        # Stop the countdown if the project was running in interval mode
+        timer = project.get('auto_create_timer')
+        if timer and timer.isActive():
+            timer.stop()
+        self.stop_origin_watcher(project_index)
+        
+        watcher = self.create_origin_watcher(project_index)
+        watcher.triggered.connect(lambda: self.origin_change_triggered(project_index))
+        project['auto_create_running'] = True
+        project['countdown_seconds'] = 0
+        
+        # Update UI controls
+        start_stop_btn = controls.get('start_stop_btn')
+        if start_stop_btn:
+            start_stop_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaStop))
+            start_stop_btn.setToolTip("Stop Auto-Create")
+        countdown_label = controls.get('countdown_label')
+        if countdown_label:
+            countdown_label.setText("Watching")
+            
+        # Keep the floating timer for this project, showing zeros while watching
+        self.create_floating_timer(project_index)
+        floating_timer = project.get('floating_timer')
+        if floating_timer:
+            floating_timer.update_time(0)
+    
+    def create_origin_watcher(self, project_index, trigger=True):
+        """Start watching a project's origin paths, feeding its change journal if enabled"""
+        project = self.project_tabs[project_index]
+        controls = project.get('controls', {})
+        
+        # The current tab's live paths are the source of truth for the project on screen
+        if project_index == self.current_project_index:
+            origin_paths = self.origin_paths
+            destination_path = self.destination_path
+        else:
+            origin_paths = project.get('origin_paths', [])
+            destination_path = project.get('destination_path', '')
+        
+        journal = None
+        journal_check = controls.get('change_journal_check')
+        if journal_check and journal_check.isChecked() and destination_path and os.path.isdir(destination_path):
+            journal = ChangeJournal(destination_path)
+        
+        watcher = OriginWatcher(
+            origin_paths,
+            controls['quiet_seconds_spin'].value(),
+            controls['min_interval_spin'].value() * 60,
+            controls['max_delay_spin'].value() * 60,
+            trigger,
+            journal,
+            self.get_exclude_patterns(controls),
+            controls['use_gitignore_check'].isChecked(),
+            self
+        )
+        project['origin_watcher'] = watcher
+        return watcher
+    
+    def stop_origin_watcher(self, project_index):
+        """Stop watching a project's origin files"""
+        project = self.project_tabs[project_index]
+        watcher = project.get('origin_watcher')
+        if watcher:
+            watcher.stop()
+            watcher.deleteLater()
+            project['origin_watcher'] = None
+    
+    def origin_change_triggered(self, project_index):
+        """Create a version once a project's origin changes have settled"""
+        if project_index < 0 or project_index >= len(self.project_tabs):
+            return
+        project = self.project_tabs[project_index]
+        if not project.get('auto_create_running', False):
+            return
+            
+        if self.is_creating_version:
+            # Don't lose the change, try again once the running version is done
+            watcher = project.get('origin_watcher')
+            if watcher:
+                watcher.retry_later()
+            return
+            
+        self.auto_create_snapshot(project_index)
+    
     def update_timer(self, project_index):
         """Update the timer countdown for a specific project"""
         if project_index < 0 or project_index >= len(self.project_tabs):
@@ -8186,10 +12859,9 @@ class VersionDivingApp(QMainWindow):
         if floating_timer:
             floating_timer.update_time(countdown_seconds)
             
-        # Check if countdown has reached zero
+        # Check if countdown has reached zero (auto_create_snapshot restarts the countdown)
         if countdown_seconds <= 0:
             self.auto_create_snapshot(project_index)
-            self.stop_timer(project_index)
     
     def auto_create_snapshot(self, project_index):
         """Create a version snapshot for a specific project when timer reaches zero"""
@@ -8201,49 +12873,49 @@ class VersionDivingApp(QMainWindow):
         
         # Save current project state
         current_index = self.current_project_index
+        current_origin_paths = self.origin_paths
+        current_destination_path = self.destination_path
         
         # Temporarily switch to this project
         self.current_project_index = project_index
         
         # Set up the necessary data for creating a version
-        self.origin_paths = project.get('origin_paths', []).copy()
-        self.destination_path = project.get('destination_path', '')
+        # (the current tab's live lists are the source of truth for the project on screen)
+        if project_index != current_index:
+            self.origin_paths = project.get('origin_paths', []).copy()
+            self.destination_path = project.get('destination_path', '')
         
         # Only create if we have both origin and destination paths
         if len(self.origin_paths) > 0 and self.destination_path:
             try:
-                # Mark that we're creating a version
-                self.is_creating_version = True
-                
-                # Create the version
-                self.create_version()
-                
-                # Restart the timer
-                interval_value = 5  # Default to 5 minutes if not found
-                
-                controls = project.get('controls', {})
-                interval_spin = controls.get('interval_spin')
-                if interval_spin and hasattr(interval_spin, 'value'):
-                    interval_value = interval_spin.value()
-                
-                # Update countdown for next automatic version
-                project['countdown_seconds'] = interval_value * 60
-                
-                # Update floating timer if it exists
-                floating_timer = project.get('floating_timer')
-                if floating_timer:
-                    floating_timer.update_time(interval_value * 60)
-                
-                # Show notification
-                self.show_toast(f"Auto-created version for {project.get('name', 'Project')}")
+                # Start the version in the background; a previous one that is still copying wins
+                if not self.start_version_creation(project_index, auto=True):
+                    self.show_toast(f"Skipped auto-version for {project.get('name', 'Project')}: "
+                                    "another version is still being created", 3000)
+                
+                # Restart the timer (change-triggered projects have no countdown)
+                if not project.get('origin_watcher'):
+                    interval_value = 5  # Default to 5 minutes if not found
+                    
+                    controls = project.get('controls', {})
+                    interval_spin = controls.get('interval_spin')
+                    if interval_spin and hasattr(interval_spin, 'value'):
+                        interval_value = interval_spin.value()
+                    
+                    # Update countdown for next automatic version
+                    project['countdown_seconds'] = interval_value * 60
+                    
+                    # Update floating timer if it exists
+                    floating_timer = project.get('floating_timer')
+                    if floating_timer:
+                        floating_timer.update_time(interval_value * 60)
             except Exception as e:
                 self.show_toast(f"Error creating auto-version: {str(e)}", 5000)
-            finally:
-                # Reset the flag
-                self.is_creating_version = False
         
-        # Restore current project index
+        # Restore current project state
         self.current_project_index = current_index
+        self.origin_paths = current_origin_paths
+        self.destination_path = current_destination_path
 
     def stop_timer(self, project_index):
         """Stop the timer for a specific project"""
@@ -8258,6 +12930,7 @@ class VersionDivingApp(QMainWindow):
         timer = project.get('auto_create_timer')
         if timer and timer.isActive():
             timer.stop()
+        self.stop_origin_watcher(project_index)
             
         # Update project state
         project['auto_create_running'] = False
@@ -8411,6 +13084,10 @@ class VersionDivingApp(QMainWindow):
         if countdown_timer and hasattr(countdown_timer, 'isActive') and countdown_timer.isActive():
             countdown_timer.stop()
             
+        watcher = removed_project.get('origin_watcher')
+        if watcher:
+            watcher.stop()
+            
         # Now remove the project from our list
         self.project_tabs.pop(index)
         
@@ -8931,8 +13608,17 @@ class HelpDialog(QDialog):
             ("<b>Contents Tab</b>", "View a list of your selected files/folders and the contents of your destination folder."),
             ("<b>Settings Tab</b>", "Configure version naming, automatic cleanup, and automatic version creation."),
             ("<b>Version Naming</b>", "Customize how version folders are named, with options for date/time, sequential numbers, or custom formats."),
-            ("<b>Auto-Delete Old Versions</b>", "Automatically maintain a limited number of versions to save disk space."),
+            ("<b>Auto-Delete Old Versions</b>", "Automatically maintain a limited number of versions to save disk space. "
+             "The tiered policy keeps every recent version, then one per hour, one per day and one per week as versions get older. "
+             "Size limits delete more of the oldest versions while the destination is too big or the drive too full, "
+             "also before a snapshot that would not fit."),
+            ("<b>Storage Mode</b>", "Save versions as plain folders, as plain folders that hardlink unchanged files, as a single archive file per version, or in a deduplicated store where unchanged files take no extra space. Right-click a version to restore it."),
             ("<b>Auto-Create Versions</b>", "Set the app to automatically create versions at regular intervals, ideal for long AI coding sessions."),
+            ("<b>Change-Triggered Versions</b>", "Instead of a fixed interval, auto-create can watch your origin files and create a version once they stop changing for a while."),
+            ("<b>Exclude Patterns</b>", "Leave folders like .git, node_modules or build output out of your versions using .gitignore-style patterns, optionally together with the origin's own .gitignore."),
+            ("<b>Locked Files</b>", "Files that cannot be read (for example because another program locks them) are retried a few times. If they stay locked, the version is saved without them and shown in orange as partial, or, if partial versions are turned off, kept unfinished so the next attempt only copies what is missing."),
+            ("<b>Verify Versions</b>", "Re-read the stored versions in the background and get a list of files that are missing or damaged. Checksums are recorded when each version is created, and the speed limit keeps verification from slowing down your disk."),
+            ("<b>Change Journal</b>", "While auto-create runs, Version Diving can remember which files changed so the next version only looks at those instead of scanning every folder."),
             ("<b>Floating Timer</b>", "Shows a countdown to the next automatic version. Can be positioned anywhere on your screen."),
             ("<b>System Tray</b>", "The app minimizes to your system tray and continues creating versions in the background."),
             ("<b>Toast Notifications</b>", "Non-intrusive popups confirm when versions are created or settings are changed."),
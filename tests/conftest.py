@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import main  # noqa: E402
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w" if isinstance(data, str) else "wb") as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """A small origin folder with a nested file"""
+    path = tmp_path / "origin"
+    write(str(path / "a.txt"), "A-v1")
+    write(str(path / "b.txt"), "B-v1")
+    write(str(path / "sub" / "c.txt"), "C-v1" * 100)
+    return str(path)
+
+
+@pytest.fixture
+def destination(tmp_path):
+    path = tmp_path / "dest"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delays(monkeypatch):
+    monkeypatch.setattr(main.SnapshotEngine, "RETRY_DELAYS", ())
@@ -0,0 +1,71 @@
+import os
+import tarfile
+
+import pytest
+
+import main
+from conftest import read, write
+
+
+def restore(version, tmp_path):
+    target = str(tmp_path / "restored")
+    main.restore_version(version, target)
+    return target
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_archive_round_trip(origin, destination, tmp_path, compression):
+    engine = main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_ARCHIVE, compression=compression)
+    version = engine.create_version([origin], "v1")
+    assert main.is_archive_version(version)
+
+    target = restore(version, tmp_path)
+    name = os.path.basename(origin)
+    assert read(os.path.join(target, name, "a.txt")) == b"A-v1"
+    assert read(os.path.join(target, name, "sub", "c.txt")) == b"C-v1" * 100
+
+    # Single entries come out of the archive by seeking to their offset
+    single = str(tmp_path / "single")
+    main.restore_version(version, single, os.path.join(name, "b.txt"))
+    assert read(os.path.join(single, name, "b.txt")) == b"B-v1"
+    assert not os.path.exists(os.path.join(single, name, "a.txt"))
+
+
+def test_archive_file_shrunk_after_scan(origin, destination, tmp_path, monkeypatch):
+    write(os.path.join(origin, "a.txt"), "a" * 30000)
+    real_start = main.SnapshotEngine._start_progress
+
+    def start_progress(self, files):
+        real_start(self, files)
+        write(os.path.join(origin, "a.txt"), "s" * 20000)
+
+    monkeypatch.setattr(main.SnapshotEngine, "_start_progress", start_progress)
+    version = main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_ARCHIVE).create_version([origin], "v1")
+
+    target = restore(version, tmp_path)
+    name = os.path.basename(origin)
+    assert read(os.path.join(target, name, "a.txt")) == b"s" * 20000
+    assert read(os.path.join(target, name, "b.txt")) == b"B-v1"
+    with tarfile.open(os.path.join(version, "archive.tar")) as tar:
+        assert len([member for member in tar.getmembers() if member.isfile()]) == 3
+
+
+def test_archive_read_error_keeps_later_members_aligned(origin, destination, tmp_path, monkeypatch):
+    write(os.path.join(origin, "a.txt"), "a" * 30000)
+    real_read = main._HashingReader.read
+
+    def read_chunk(self, size=-1):
+        if self.f.name.endswith("a.txt") and self.f.tell() > 0:
+            raise OSError(5, "Input/output error")
+        return real_read(self, size)
+
+    monkeypatch.setattr(main._HashingReader, "read", read_chunk)
+    engine = main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_ARCHIVE, allow_partial_versions=True)
+    version = engine.create_version([origin], "v1")
+
+    name = os.path.basename(origin)
+    assert [rel_path for rel_path, _ in main.load_version_skipped(version)] == [os.path.join(name, "a.txt")]
+    target = restore(version, tmp_path)
+    assert not os.path.exists(os.path.join(target, name, "a.txt"))
+    assert read(os.path.join(target, name, "b.txt")) == b"B-v1"
+    assert read(os.path.join(target, name, "sub", "c.txt")) == b"C-v1" * 100
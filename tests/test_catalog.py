@@ -0,0 +1,37 @@
+import os
+import threading
+
+import main
+
+
+def test_read_only_load_never_writes(origin, destination):
+    main.SnapshotEngine(destination).create_version([origin], "v1")
+    catalog_path = main.VersionCatalog(destination).path
+    before = os.stat(catalog_path).st_mtime_ns
+    os.mkdir(os.path.join(destination, "added-by-hand"))
+
+    assert main.VersionCatalog(destination).load(read_only=True).names() == ["v1", "added-by-hand"]
+    assert os.stat(catalog_path).st_mtime_ns == before
+    assert not [name for name in os.listdir(os.path.dirname(catalog_path)) if name.endswith(".tmp")]
+
+
+def test_concurrent_saves_do_not_collide(destination):
+    errors = []
+
+    def save_repeatedly():
+        try:
+            for _ in range(200):
+                catalog = main.VersionCatalog(destination)
+                catalog.add("v1", 1.0, 10)
+                catalog.save()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_repeatedly) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert main.VersionCatalog(destination).load().names() == ["v1"]
@@ -0,0 +1,26 @@
+import main
+
+
+def test_changes_during_base_snapshot_are_kept(destination):
+    journal = main.ChangeJournal(destination)
+    journal.start()
+    journal.record("/origin/before.txt")
+
+    # The first snapshot walks the whole tree
+    assert journal.take() is None
+    journal.record("/origin/edited-during-snapshot.txt")
+    journal.commit("v1")
+
+    assert journal.take() == ("v1", {"/origin/edited-during-snapshot.txt"})
+
+
+def test_failed_snapshot_keeps_its_changes(destination):
+    journal = main.ChangeJournal(destination)
+    journal.start()
+    journal.take()
+    journal.commit("v1")
+    journal.record("/origin/a.txt")
+    assert journal.take() == ("v1", {"/origin/a.txt"})
+    journal.record("/origin/b.txt")
+    journal.rollback()
+    assert journal.take() == ("v1", {"/origin/a.txt", "/origin/b.txt"})
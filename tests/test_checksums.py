@@ -0,0 +1,43 @@
+import os
+import shutil
+
+import pytest
+
+import main
+from conftest import write
+
+
+@pytest.mark.parametrize("mode", [main.STORAGE_MODE_FULL_COPY, main.STORAGE_MODE_HARDLINK])
+def test_copies_are_hashed_on_the_way_through(origin, destination, monkeypatch, mode):
+    hashed = []
+    real_hash_file = main.ContentStore.hash_file.__func__
+    monkeypatch.setattr(main.ContentStore, "hash_file",
+                        classmethod(lambda cls, path: hashed.append(path) or real_hash_file(cls, path)))
+    version = main.SnapshotEngine(destination, storage_mode=mode).create_version([origin], "v1")
+
+    assert not [path for path in hashed if path.startswith(destination)]
+    checksums = main.load_version_checksums(version)
+    name = os.path.basename(origin)
+    assert checksums[f"{name}/sub/c.txt".replace("/", os.sep)] == real_hash_file(
+        main.ContentStore, os.path.join(origin, "sub", "c.txt"))
+    assert main.VersionScrubber(destination).scrub() == []
+
+
+def test_reflinked_copies_are_not_read(origin, destination, monkeypatch):
+    real_copy_with = main.CopyBackend._copy_with.__func__
+
+    def copy_with(cls, method, source_path, target_path):
+        if method == main.CopyBackend.METHOD_REFLINK:
+            shutil.copyfile(source_path, target_path)
+            return
+        real_copy_with(cls, method, source_path, target_path)
+
+    monkeypatch.setattr(main.CopyBackend, "probe", classmethod(lambda cls, probe_dir: cls.METHOD_REFLINK))
+    monkeypatch.setattr(main.CopyBackend, "_copy_with", classmethod(copy_with))
+    version = main.SnapshotEngine(destination).create_version([origin], "v1")
+
+    assert set(main.load_version_checksums(version).values()) == {None}
+    assert main.VersionScrubber(destination).scrub() == []
+    write(os.path.join(version, os.path.basename(origin), "a.txt"), "")
+    os.remove(os.path.join(version, os.path.basename(origin), "b.txt"))
+    assert [problem[2] for problem in main.VersionScrubber(destination).scrub()] == ["missing"]
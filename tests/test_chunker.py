@@ -0,0 +1,38 @@
+import io
+import random
+
+import main
+
+Chunker = main.ContentChunker
+
+
+def sample_text(size, seed=1):
+    rnd = random.Random(seed)
+    words = ["".join(rnd.choices("abcdefghijklmnopqrstuvwxyz", k=rnd.randint(2, 9))) for _ in range(3000)]
+    lines = (" ".join(rnd.choices(words, k=12)) for _ in range(size // 60 + 1))
+    return "\n".join(lines).encode()[:size]
+
+
+def chunk_sizes(data):
+    return [len(chunk) for chunk in Chunker.iter_chunks(io.BytesIO(data))]
+
+
+def test_text_cuts_near_average_size():
+    sizes = chunk_sizes(sample_text(24 * 1024 * 1024))
+    assert sum(sizes) == 24 * 1024 * 1024
+    assert Chunker.MAX_SIZE not in sizes[:-1]
+    assert Chunker.AVG_SIZE / 2 < sum(sizes) / len(sizes) < Chunker.AVG_SIZE * 2
+
+
+def test_utf16_text_cuts_near_average_size():
+    sizes = chunk_sizes(sample_text(12 * 1024 * 1024).decode().encode("utf-16-le"))
+    assert Chunker.MAX_SIZE not in sizes[:-1]
+    assert Chunker.AVG_SIZE / 2 < sum(sizes) / len(sizes) < Chunker.AVG_SIZE * 2
+
+
+def test_insertion_only_changes_nearby_chunks():
+    data = sample_text(16 * 1024 * 1024)
+    chunks = list(Chunker.iter_chunks(io.BytesIO(data)))
+    edited = list(Chunker.iter_chunks(io.BytesIO(b"inserted line\n" + data)))
+    assert chunks[1:] == edited[1:]
+    assert b"".join(edited) == b"inserted line\n" + data
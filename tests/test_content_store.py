@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import main
+from conftest import write
+
+
+def test_replaced_objects_are_flushed_before_removal(tmp_path, destination, monkeypatch):
+    old_text = "".join(f"line {i}\n" for i in range(3000))
+    write(str(tmp_path / "old.txt"), old_text)
+    write(str(tmp_path / "new.txt"), old_text.replace("line 1500\n", "changed\n"))
+    store = main.ContentStore(destination)
+    old, _ = store.put_file(str(tmp_path / "old.txt"))
+    new, _ = store.put_file(str(tmp_path / "new.txt"))
+
+    events = []
+    real_fsync_path = main.fsync_path
+    real_remove = os.remove
+
+    def fsync_path(path, is_dir=False):
+        events.append(("sync", path))
+        return real_fsync_path(path, is_dir)
+
+    def remove(path):
+        events.append(("remove", path))
+        real_remove(path)
+
+    monkeypatch.setattr(main, "fsync_path", fsync_path)
+    monkeypatch.setattr(main.os, "remove", remove)
+
+    assert store.store_as_delta(old, new)
+    delta_path = store.object_path(old) + store.DELTA_SUFFIX
+    assert events == [("sync", delta_path), ("sync", os.path.dirname(delta_path)),
+                      ("remove", store.object_path(old))]
+
+    events.clear()
+    store.make_full(old)
+    assert events == [("sync", store.object_path(old)), ("sync", os.path.dirname(delta_path)),
+                      ("remove", delta_path)]
+    assert store.read_object_bytes(old) == old_text.encode()
+
+
+def test_files_with_many_lines_are_left_full(tmp_path, destination, monkeypatch):
+    old_text = "".join(f"line {i}\n" for i in range(3000))
+    write(str(tmp_path / "old.txt"), old_text)
+    write(str(tmp_path / "new.txt"), old_text.replace("line 1500\n", "changed\n"))
+    store = main.ContentStore(destination)
+    old, _ = store.put_file(str(tmp_path / "old.txt"))
+    new, _ = store.put_file(str(tmp_path / "new.txt"))
+    monkeypatch.setattr(main.ContentStore, "DELTA_MAX_LINES", 2000)
+
+    assert not store.store_as_delta(old, new)
+    assert store.find_object(old)[1] != "delta"
+
+
+def test_previous_contents_become_deltas_only_once_committed(origin, destination, monkeypatch):
+    text = "".join(f"line {i}\n" for i in range(3000))
+    write(os.path.join(origin, "a.txt"), text)
+    store = main.ContentStore(destination)
+    old = store.hash_file(os.path.join(origin, "a.txt"))
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE,
+                        delta_older_versions=True).create_version([origin], "v1")
+    write(os.path.join(origin, "a.txt"), text.replace("line 1500\n", "changed\n"))
+
+    def fail(*args):
+        raise RuntimeError("disk gone")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(main.SnapshotEngine, "_commit_version", fail)
+        with pytest.raises(RuntimeError):
+            main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE,
+                                delta_older_versions=True).create_version([origin], "v2")
+    assert main.VersionReaper.shared().wait_idle(timeout=10)
+    assert store.find_object(old)[1] != "delta"
+
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE,
+                        delta_older_versions=True).create_version([origin], "v2")
+    assert main.VersionReaper.shared().wait_idle(timeout=10)
+    assert store.find_object(old)[1] == "delta"
+    assert store.read_object_bytes(old) == text.encode()
@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+import main
+
+LINES = b"".join(b"line %d\n" % i for i in range(200))
+
+
+@pytest.mark.parametrize("base, target", [
+    (LINES, LINES),
+    (LINES, LINES.replace(b"line 100\n", b"changed 100\n")),
+    (LINES, b"new first line\n" + LINES + b"new last line\n"),
+    (LINES, LINES[:500] + LINES[900:]),
+    (LINES.replace(b"\n", b"\r\n"), LINES.replace(b"\n", b"\r\n").replace(b"line 7\r\n", b"")),
+    (b"", LINES),
+    (LINES, b""),
+    (b"no newline at the end", b"no newline at the end, edited"),
+    (random.Random(1).randbytes(4096), random.Random(2).randbytes(4096)),
+])
+def test_round_trip(base, target):
+    assert main.DeltaCodec.apply(base, main.DeltaCodec.encode(base, target)) == target
+
+
+def test_small_edit_gives_small_delta():
+    target = LINES.replace(b"line 100\n", b"changed 100\n")
+    assert len(main.DeltaCodec.encode(LINES, target)) < len(target) // 10
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+import main
+
+
+def test_failed_save_keeps_previous_record(destination, monkeypatch):
+    os.mkdir(os.path.join(destination, "v1"))
+    record = main.TreeFingerprintRecord(destination)
+    record.save("fp-1", "v1")
+
+    def dump(data, f):
+        f.write('{"fingerprint": ')
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(main.json, "dump", dump)
+    with pytest.raises(OSError):
+        record.save("fp-2", "v2")
+    monkeypatch.undo()
+
+    assert record.matching_version("fp-1") == "v1"
@@ -0,0 +1,69 @@
+import os
+
+import main
+from conftest import write
+
+
+def ignored(patterns, rel_path, is_dir=False):
+    return main.IgnoreRules(patterns).ignores_path(rel_path, is_dir)
+
+
+def test_unanchored_patterns_match_at_any_depth():
+    assert ignored(["*.log"], "debug.log")
+    assert ignored(["*.log"], "sub/deeper/debug.log")
+    assert not ignored(["*.log"], "debug.log.txt")
+
+
+def test_slash_anchors_to_origin():
+    assert ignored(["/top.txt"], "top.txt")
+    assert not ignored(["/top.txt"], "sub/top.txt")
+    assert ignored(["docs/*.md"], "docs/a.md")
+    assert not ignored(["docs/*.md"], "other/docs/a.md")
+
+
+def test_trailing_slash_only_matches_folders():
+    assert ignored(["build/"], "build", is_dir=True)
+    assert ignored(["build/"], "src/build/out.o")
+    assert not ignored(["build/"], "build")
+
+
+def test_double_star():
+    assert ignored(["docs/**/*.md"], "docs/a.md")
+    assert ignored(["docs/**/*.md"], "docs/x/y/a.md")
+    assert ignored(["logs/**"], "logs/x/y.txt")
+    assert ignored(["**/cache"], "a/b/cache", is_dir=True)
+
+
+def test_character_classes_and_wildcards():
+    assert ignored(["file?.txt"], "file1.txt")
+    assert not ignored(["file?.txt"], "file12.txt")
+    assert ignored(["*.[oa]"], "lib.a")
+    assert not ignored(["*.[!oa]"], "lib.a")
+
+
+def test_last_match_wins_with_negation():
+    patterns = ["*.log", "!keep.log"]
+    assert ignored(patterns, "debug.log")
+    assert not ignored(patterns, "keep.log")
+    assert ignored(["!keep.log", "*.log"], "keep.log")
+
+
+def test_blanks_comments_and_escapes():
+    rules = main.IgnoreRules(["", "# comment", "   "])
+    assert not rules
+    assert ignored(["\\#notes"], "#notes")
+    assert ignored(["\\!important"], "!important")
+
+
+def test_gitignore_is_overridden_by_project_patterns(origin):
+    write(os.path.join(origin, ".gitignore"), "*.log\n")
+    rules = main.IgnoreRules.for_origins([origin], ["!keep.log"], use_gitignore=True)[origin]
+    assert rules.ignores_path("debug.log", False)
+    assert not rules.ignores_path("keep.log", False)
+    assert main.IgnoreRules.for_origins([origin], [], use_gitignore=False) == {}
+
+
+def test_rules_key_changes_with_patterns(origin):
+    first = main.IgnoreRules.rules_key(main.IgnoreRules.for_origins([origin], ["*.log"]))
+    second = main.IgnoreRules.rules_key(main.IgnoreRules.for_origins([origin], ["*.tmp"]))
+    assert first != second
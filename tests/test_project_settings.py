@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+from PyQt6.QtWidgets import QApplication
+
+import main
+
+
+class FakeWorker:
+    """Stands in for SnapshotWorker and keeps what it was started with"""
+    started = []
+
+    def __init__(self, destination_path, origin_paths, version_name, options, skip_if_unchanged, changes, parent):
+        self.options = options
+        self.version_name = version_name
+        for name in ("progress", "completed", "skipped", "failed", "cancelled"):
+            setattr(self, name, SimpleNamespace(connect=lambda slot: None))
+
+    def start(self):
+        FakeWorker.started.append(self)
+
+
+@pytest.fixture
+def window(monkeypatch, tmp_path):
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(main.VersionDivingApp, "load_recent_projects", lambda self: [])
+    monkeypatch.setattr(main.VersionDivingApp, "save_recent_projects", lambda self: None)
+    monkeypatch.setattr(main, "SnapshotWorker", FakeWorker)
+    FakeWorker.started = []
+    window = main.VersionDivingApp()
+    yield window
+    window.close()
+    app.processEvents()
+
+
+def test_background_project_uses_its_own_settings(window, origin, destination):
+    controls = window.project_tabs[0]['controls']
+    controls['storage_mode_combo'].setCurrentIndex(main.STORAGE_MODE_STORE)
+    controls['exclude_patterns_edit'].setPlainText("*.log")
+    controls['prefix_edit'].setText("background")
+
+    # A second tab replaces the widgets on screen
+    window.add_project_tab("On Screen")
+    window.storage_mode_combo.setCurrentIndex(main.STORAGE_MODE_HARDLINK)
+    window.exclude_patterns_edit.setPlainText("build/")
+    window.prefix_edit.setText("screen")
+    window.project_tabs[0]['origin_paths'] = [origin]
+    window.project_tabs[0]['destination_path'] = destination
+
+    window.auto_create_snapshot(0)
+
+    worker = FakeWorker.started[-1]
+    assert worker.options['storage_mode'] == main.STORAGE_MODE_STORE
+    assert worker.options['exclude_patterns'] == ["*.log"]
+    assert worker.version_name.startswith("background_")
@@ -0,0 +1,60 @@
+import os
+import threading
+
+import main
+from conftest import write
+
+
+def test_deleting_versions_collects_garbage_in_background(origin, destination, monkeypatch):
+    store = main.ContentStore(destination)
+    write(os.path.join(origin, "a.txt"), "only in v1")
+    old_digest = store.hash_file(os.path.join(origin, "a.txt"))
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE).create_version([origin], "v1")
+    write(os.path.join(origin, "a.txt"), "only in v2")
+    new_digest = store.hash_file(os.path.join(origin, "a.txt"))
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE).create_version([origin], "v2")
+
+    threads = []
+    real_collect = main.ContentStore.collect_garbage
+
+    def collect_garbage(self):
+        threads.append(threading.current_thread())
+        return real_collect(self)
+
+    monkeypatch.setattr(main.ContentStore, "collect_garbage", collect_garbage)
+    catalog = main.VersionCatalog(destination).load()
+    assert main.delete_versions(destination, catalog, ["v1"]) == 1
+    assert main.VersionReaper.shared().wait_collected(destination, timeout=10)
+    assert main.VersionReaper.shared().wait_idle(timeout=10)
+
+    assert threads and threading.current_thread() not in threads
+    assert not store.has_object(old_digest)
+    assert store.has_object(new_digest)
+    assert not os.path.exists(os.path.join(destination, "v1"))
+    assert os.listdir(main.trash_path(destination)) == []
+
+
+def test_collection_waits_for_snapshot_writing_to_destination(origin, destination, monkeypatch):
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE).create_version([origin], "v1")
+    write(os.path.join(origin, "a.txt"), "written while collecting")
+    write(os.path.join(origin, "b.txt"), "also written while collecting")
+    reaper = main.VersionReaper.shared()
+    collected_during_snapshot = []
+    real_put_file = main.ContentStore.put_file
+
+    def put_file(self, *args, **kwargs):
+        result = real_put_file(self, *args, **kwargs)
+        if not collected_during_snapshot:
+            # Another deletion queues a collection while this object is not referenced by anything yet
+            reaper.collect_garbage(destination)
+            collected_during_snapshot.append(reaper.wait_collected(destination, timeout=0.5))
+        return result
+
+    monkeypatch.setattr(main.ContentStore, "put_file", put_file)
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE).create_version([origin], "v2")
+    assert reaper.wait_collected(destination, timeout=10)
+
+    assert collected_during_snapshot and not any(collected_during_snapshot)
+    store = main.ContentStore(destination)
+    for name in ("a.txt", "b.txt"):
+        assert store.has_object(store.hash_file(os.path.join(origin, name)))
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+import main
+from conftest import read
+
+
+@pytest.mark.parametrize("mode", [main.STORAGE_MODE_FULL_COPY, main.STORAGE_MODE_STORE, main.STORAGE_MODE_HARDLINK])
+def test_restore_leaves_only_the_version_files(origin, destination, tmp_path, mode):
+    version = main.SnapshotEngine(destination, storage_mode=mode).create_version([origin], "v1")
+    target = str(tmp_path / "restored")
+
+    main.restore_version(version, target)
+
+    name = os.path.basename(origin)
+    restored = sorted(os.path.relpath(os.path.join(folder, file_name), target)
+                      for folder, _, file_names in os.walk(target) for file_name in file_names)
+    assert restored == sorted(os.path.join(name, rel_path) for rel_path in ("a.txt", "b.txt", os.path.join("sub", "c.txt")))
+    assert read(os.path.join(target, name, "sub", "c.txt")) == b"C-v1" * 100
+    assert os.path.abspath(target) not in main.CopyBackend._probe_cache
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import main
+from conftest import read, write
+
+
+def interrupt_on(monkeypatch, name):
+    """Make copying the file called name fail like a locked file"""
+    real_copy = main.CopyBackend._copy_replacing
+
+    def copy_replacing(self, source_path, target_path, copy):
+        if os.path.basename(source_path) == name:
+            raise PermissionError(13, "Permission denied")
+        return real_copy(self, source_path, target_path, copy)
+
+    monkeypatch.setattr(main.CopyBackend, "_copy_replacing", copy_replacing)
+
+
+def test_hardlink_resume_keeps_older_versions(origin, destination, monkeypatch):
+    engine = main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_HARDLINK)
+    v1 = engine.create_version([origin], "v1")
+    write(os.path.join(origin, "b.txt"), "B-v2")
+
+    with monkeypatch.context() as patch:
+        interrupt_on(patch, "b.txt")
+        with pytest.raises(main.SnapshotIncomplete):
+            main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_HARDLINK).create_version([origin], "v2")
+
+    # a.txt was linked into the interrupted stage, now it changes before the resume
+    write(os.path.join(origin, "a.txt"), "A-v3-EDITED")
+    v3 = main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_HARDLINK).create_version([origin], "v3")
+
+    origin_name = os.path.basename(origin)
+    assert read(os.path.join(v1, origin_name, "a.txt")) == b"A-v1"
+    assert read(os.path.join(v1, origin_name, "b.txt")) == b"B-v1"
+    assert read(os.path.join(v3, origin_name, "a.txt")) == b"A-v3-EDITED"
+    assert read(os.path.join(v3, origin_name, "b.txt")) == b"B-v2"
+
+
+@pytest.mark.parametrize("mode", [main.STORAGE_MODE_FULL_COPY, main.STORAGE_MODE_STORE, main.STORAGE_MODE_HARDLINK])
+def test_resume_copies_only_missing_files(origin, destination, monkeypatch, mode):
+    with monkeypatch.context() as patch:
+        interrupt_on(patch, "b.txt")
+        if mode == main.STORAGE_MODE_STORE:
+            real_put = main.ContentStore.put_file
+
+            def put_file(self, source, size=None):
+                if os.path.basename(source) == "b.txt":
+                    raise PermissionError(13, "Permission denied")
+                return real_put(self, source, size)
+
+            patch.setattr(main.ContentStore, "put_file", put_file)
+        with pytest.raises(main.SnapshotIncomplete):
+            main.SnapshotEngine(destination, storage_mode=mode).create_version([origin], "v1")
+    assert main.SnapshotCheckpoint.find_resumable(destination, [origin], mode)
+
+    copied = []
+    real_copy = main.CopyBackend._copy_replacing
+    monkeypatch.setattr(main.CopyBackend, "_copy_replacing",
+                        lambda self, source, target, copy: copied.append(os.path.basename(source))
+                        or real_copy(self, source, target, copy))
+    version = main.SnapshotEngine(destination, storage_mode=mode).create_version([origin], "v2")
+
+    if mode != main.STORAGE_MODE_STORE:
+        assert copied == ["b.txt"]
+    restored = os.path.join(os.path.dirname(destination), "restored")
+    main.restore_version(version, restored)
+    origin_name = os.path.basename(origin)
+    assert read(os.path.join(restored, origin_name, "b.txt")) == b"B-v1"
+    assert read(os.path.join(restored, origin_name, "sub", "c.txt")) == b"C-v1" * 100
+    assert not os.listdir(main.staging_path(destination))
@@ -0,0 +1,40 @@
+import datetime
+
+import main
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+# Local noon, so the hour and day buckets below don't straddle midnight
+NOW = datetime.datetime(2024, 6, 12, 12, 0).timestamp()
+TIERS = main.retention_tiers(24, 7, 30, 8)
+
+
+def versions(*ages):
+    """Catalog entries created the given seconds ago, oldest first"""
+    return [[f"v{i}", NOW - age] for i, age in enumerate(sorted(ages, reverse=True))]
+
+
+def test_recent_versions_are_all_kept():
+    assert main.select_expired_versions(versions(60, 120, 3 * HOUR, 20 * HOUR), TIERS, NOW) == []
+
+
+def test_one_version_per_hour_then_day():
+    # v0 and v1 fall in the same day ten days ago, v2 and v3 in the same hour two days ago
+    catalog = versions(10 * DAY + HOUR, 10 * DAY, 2 * DAY + 20 * 60, 2 * DAY + 10 * 60, 60)
+    assert main.select_expired_versions(catalog, TIERS, NOW) == ["v0", "v2"]
+
+
+def test_versions_older_than_all_tiers_expire():
+    catalog = versions(80 * 7 * DAY, 9 * 7 * DAY, 60)
+    assert main.select_expired_versions(catalog, TIERS, NOW) == ["v0", "v1"]
+
+
+def test_weekly_versions_kept_forever_without_weekly_limit():
+    tiers = main.retention_tiers(24, 7, 30, 0)
+    catalog = versions(400 * DAY, 200 * DAY, 60)
+    assert main.select_expired_versions(catalog, tiers, NOW) == []
+
+
+def test_newest_version_is_always_kept():
+    catalog = versions(100 * 7 * DAY, 90 * 7 * DAY)
+    assert main.select_expired_versions(catalog, TIERS, NOW) == ["v0"]
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import main
+from conftest import read, write
+
+MODES = [
+    pytest.param(main.STORAGE_MODE_FULL_COPY, {}, id="full"),
+    pytest.param(main.STORAGE_MODE_STORE, {}, id="store"),
+    pytest.param(main.STORAGE_MODE_STORE, {"compression": "zlib", "pack_small_files": True,
+                                           "delta_older_versions": True}, id="store-packed"),
+    pytest.param(main.STORAGE_MODE_HARDLINK, {}, id="hardlink"),
+    pytest.param(main.STORAGE_MODE_ARCHIVE, {}, id="archive"),
+]
+
+
+def restored_tree(version, tmp_path, name):
+    target = str(tmp_path / name)
+    main.restore_version(version, target)
+    tree = {}
+    for folder, _, file_names in os.walk(target):
+        for file_name in file_names:
+            path = os.path.join(folder, file_name)
+            tree[os.path.relpath(path, target).replace(os.sep, "/")] = read(path)
+    return tree
+
+
+@pytest.mark.parametrize("mode, options", MODES)
+def test_versions_restore_their_own_contents(origin, destination, tmp_path, mode, options):
+    v1 = main.SnapshotEngine(destination, storage_mode=mode, **options).create_version([origin], "v1")
+    write(os.path.join(origin, "a.txt"), "A-v2")
+    os.remove(os.path.join(origin, "b.txt"))
+    write(os.path.join(origin, "sub", "d.txt"), "D-v2")
+    v2 = main.SnapshotEngine(destination, storage_mode=mode, **options).create_version([origin], "v2")
+
+    name = os.path.basename(origin)
+    assert restored_tree(v1, tmp_path, "r1") == {
+        f"{name}/a.txt": b"A-v1", f"{name}/b.txt": b"B-v1", f"{name}/sub/c.txt": b"C-v1" * 100}
+    assert restored_tree(v2, tmp_path, "r2") == {
+        f"{name}/a.txt": b"A-v2", f"{name}/sub/c.txt": b"C-v1" * 100, f"{name}/sub/d.txt": b"D-v2"}
+    assert main.VersionCatalog(destination).load().names() == ["v1", "v2"]
+    assert os.listdir(main.staging_path(destination)) == []
+
+
+@pytest.mark.parametrize("mode, options", MODES)
+def test_unchanged_origin_is_skipped(origin, destination, mode, options):
+    main.SnapshotEngine(destination, storage_mode=mode, **options).create_version([origin], "v1")
+    with pytest.raises(main.SnapshotUnchanged):
+        main.SnapshotEngine(destination, storage_mode=mode, **options).create_version(
+            [origin], "v2", skip_if_unchanged=True)
+    assert main.VersionCatalog(destination).load().names() == ["v1"]
+
+
+@pytest.mark.parametrize("mode, options", MODES)
+def test_excluded_files_are_left_out(origin, destination, tmp_path, mode, options):
+    write(os.path.join(origin, "debug.log"), "log")
+    write(os.path.join(origin, "build", "out.bin"), "out")
+    version = main.SnapshotEngine(destination, storage_mode=mode, exclude_patterns=["*.log", "build/"],
+                                  **options).create_version([origin], "v1")
+
+    name = os.path.basename(origin)
+    assert sorted(restored_tree(version, tmp_path, "r1")) == [f"{name}/a.txt", f"{name}/b.txt", f"{name}/sub/c.txt"]
+
+
+def test_unchanged_files_share_storage(origin, destination):
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_HARDLINK).create_version([origin], "v1")
+    write(os.path.join(origin, "a.txt"), "A-v2")
+    main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_HARDLINK).create_version([origin], "v2")
+
+    name = os.path.basename(origin)
+    c1 = os.stat(os.path.join(destination, "v1", name, "sub", "c.txt"))
+    c2 = os.stat(os.path.join(destination, "v2", name, "sub", "c.txt"))
+    a1 = os.stat(os.path.join(destination, "v1", name, "a.txt"))
+    a2 = os.stat(os.path.join(destination, "v2", name, "a.txt"))
+    assert (c1.st_dev, c1.st_ino) == (c2.st_dev, c2.st_ino)
+    assert (a1.st_dev, a1.st_ino) != (a2.st_dev, a2.st_ino)
+
+
+def test_cancelled_snapshot_leaves_no_version(origin, destination):
+    cancel_event = main.threading.Event()
+    cancel_event.set()
+    with pytest.raises(main.SnapshotCancelled):
+        main.SnapshotEngine(destination, cancel_event=cancel_event).create_version([origin], "v1")
+    assert not os.path.exists(os.path.join(destination, "v1"))
+    assert main.VersionCatalog(destination).load().names() == []
@@ -0,0 +1,59 @@
+import os
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from conftest import write
+
+
+def fake_free_space(monkeypatch, free):
+    monkeypatch.setattr(main.shutil, "disk_usage", lambda path: SimpleNamespace(total=10 ** 12, used=0, free=free))
+
+
+def test_no_budget_only_warns(origin, destination, monkeypatch, capsys):
+    main.SnapshotEngine(destination).create_version([origin], "v1")
+
+    def sizes(self):
+        raise AssertionError("version sizes are not needed without a budget")
+
+    monkeypatch.setattr(main.VersionCatalog, "sizes", sizes)
+    fake_free_space(monkeypatch, 10)
+    version = main.SnapshotEngine(destination).create_version([origin], "v2")
+
+    assert os.path.isdir(version)
+    assert "Warning" in capsys.readouterr().out
+    assert main.VersionCatalog(destination).load().names() == ["v1", "v2"]
+
+
+def test_budget_deletes_oldest_versions(origin, destination):
+    budget = main.SpaceBudget(max_bytes=1000)
+    for name in ("v1", "v2", "v3"):
+        write(os.path.join(origin, "a.txt"), name)
+        main.SnapshotEngine(destination, space_budget=budget).create_version([origin], name)
+    main.VersionReaper.shared().wait_idle()
+
+    assert main.VersionCatalog(destination).load().names() == ["v2", "v3"]
+    assert not os.path.exists(os.path.join(destination, "v1"))
+
+
+def test_budget_refuses_version_that_cannot_fit(origin, destination):
+    with pytest.raises(main.InsufficientSpace):
+        main.SnapshotEngine(destination, space_budget=main.SpaceBudget(max_bytes=10)).create_version([origin], "v1")
+
+
+def test_store_budget_counts_shared_objects(origin, destination):
+    # Every version shares one big file and adds a small one of its own
+    write(os.path.join(origin, "shared.bin"), random.Random(0).randbytes(40 * 1024))
+    budget = main.SpaceBudget(max_bytes=60 * 1024)
+    for index in range(8):
+        write(os.path.join(origin, "own.bin"), random.Random(index + 1).randbytes(5 * 1024))
+        main.SnapshotEngine(destination, storage_mode=main.STORAGE_MODE_STORE,
+                            space_budget=budget).create_version([origin], f"v{index}")
+    main.VersionReaper.shared().wait_idle()
+
+    names = main.VersionCatalog(destination).load().names()
+    manifests = sum(main.measure_version_size(os.path.join(destination, name)) for name in names)
+    assert main.ContentStore(destination).disk_usage() + manifests <= budget.max_bytes
+    assert names[-1] == "v7" and "v0" not in names
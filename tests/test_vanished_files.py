@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+import main
+from conftest import read
+
+
+@pytest.mark.parametrize("mode", [main.STORAGE_MODE_FULL_COPY, main.STORAGE_MODE_STORE,
+                                  main.STORAGE_MODE_HARDLINK, main.STORAGE_MODE_ARCHIVE])
+def test_file_deleted_after_scan_is_left_out(origin, destination, tmp_path, monkeypatch, mode):
+    real_scan = main.scan_origins
+
+    def scan_then_delete(*args, **kwargs):
+        scanned = real_scan(*args, **kwargs)
+        os.remove(os.path.join(origin, "b.txt"))
+        return scanned
+
+    def no_waiting(self, seconds):
+        raise AssertionError("a deleted file is not retried")
+
+    monkeypatch.setattr(main, "scan_origins", scan_then_delete)
+    monkeypatch.setattr(main.SnapshotEngine, "RETRY_DELAYS", (1,))
+    monkeypatch.setattr(main.SnapshotEngine, "_wait", no_waiting)
+    engine = main.SnapshotEngine(destination, storage_mode=mode)
+    version = engine.create_version([origin], "v1")
+
+    assert engine.failures == []
+    assert main.load_version_skipped(version) is None
+    target = str(tmp_path / "restored")
+    main.restore_version(version, target)
+    name = os.path.basename(origin)
+    assert not os.path.exists(os.path.join(target, name, "b.txt"))
+    assert read(os.path.join(target, name, "a.txt")) == b"A-v1"
@@ -0,0 +1,13 @@
+from types import SimpleNamespace
+
+import main
+
+
+def test_watchdog_forwarder_ignores_reads():
+    changed = []
+    forwarder = main._WatchdogForwarder(changed.append)
+    for event_type in ("opened", "closed_no_write", "closed"):
+        forwarder.dispatch(SimpleNamespace(event_type=event_type, src_path="/origin/read.txt"))
+    forwarder.dispatch(SimpleNamespace(event_type="modified", src_path="/origin/a.txt"))
+    forwarder.dispatch(SimpleNamespace(event_type="moved", src_path="/origin/b.txt", dest_path="/origin/c.txt"))
+    assert changed == ["/origin/a.txt", "/origin/b.txt", "/origin/c.txt"]